@@ -0,0 +1,243 @@
+"""
+Command line entry point.
+
+    python -m discharge_agent run --input data/synthetic_notes.csv --out runs/out.jsonl \\
+        --provider local --model gpt-oss:20b --discharge
+
+For a local OpenAI-compatible server with continuous batching (vLLM,
+llama.cpp server --parallel N), use --provider openai_compat
+--base-url http://localhost:8000/v1 and raise --workers.
+
+Add --warmup --keep-alive 30m to load local models up front and keep them
+resident between requests.
+
+Serve extraction and discharge checks over HTTP (see pipelines.service):
+
+    python -m discharge_agent serve --port 8080 --provider local --model gpt-oss:20b
+
+Re-running the same command resumes: notes already written to --out are skipped.
+
+Spread a corpus over N machines with --shard i/N, then merge and evaluate:
+
+    python -m discharge_agent run ... --out runs/gpt-oss.jsonl --shard 0/4
+    python -m discharge_agent merge "runs/*.shard-*.jsonl" --out runs/merged.jsonl --evaluate
+"""
+
+import argparse
+import sys
+
+from discharge_agent.config import env
+
+PROVIDERS = ["local", "openai", "openai_compat", "anthropic"]
+
+
+def build_extractor(args):
+    from discharge_agent.llm.llm_utils import LLMProvider, MedicalDataExtractor
+
+    provider = LLMProvider(args.provider)
+    kwargs = {}
+    if args.model:
+        kwargs["model"] = args.model
+    if provider == LLMProvider.LOCAL:
+        if args.api_url:
+            kwargs["api_url"] = args.api_url
+        if args.keep_alive:
+            kwargs["keep_alive"] = args.keep_alive
+    elif provider == LLMProvider.OPENAI:
+        kwargs["api_key"] = env("OPENAI_API_KEY")
+        if args.base_url:
+            kwargs["base_url"] = args.base_url
+    elif provider == LLMProvider.OPENAI_COMPAT:
+        if args.base_url:
+            kwargs["base_url"] = args.base_url
+    elif provider == LLMProvider.ANTHROPIC:
+        kwargs["api_key"] = env("ANTHROPIC_API_KEY")
+    return MedicalDataExtractor(provider, **kwargs)
+
+
+def cmd_run(args):
+    from discharge_agent.pipelines.batch import (
+        load_notes,
+        make_discharge_fn,
+        parse_shard,
+        run_batch,
+        select_shard,
+        shard_path,
+        write_run_metrics,
+    )
+
+    notes = load_notes(args.input, id_col=args.id_col, text_col=args.text_col)
+    out = args.out
+    if args.shard:
+        index, n_shards = parse_shard(args.shard)
+        notes = select_shard(notes, index, n_shards)
+        out = shard_path(args.out, index, n_shards)
+        print(f"Shard {index}/{n_shards}: {len(notes)} notes -> {out}")
+    extractor = build_extractor(args)
+    discharge_fn = None
+    if args.compact:
+        from discharge_agent.extractions.compact import CompactExtractor
+
+        extractor = CompactExtractor(extractor)
+    warm = []
+    if extractor.provider.value == "local":
+        warm.append((extractor.model, extractor.api_url))
+    if args.discharge:
+        # an OpenAI-compatible extraction server also runs the agent, unless --chat-url is given
+        compat = extractor.provider.value == "openai_compat" and not args.chat_url
+        chat_url = extractor.base_url if compat else args.chat_url or env("LLM_API")
+        discharge_model = args.discharge_model or env("MODEL") or extractor.model
+        discharge_fn = make_discharge_fn(
+            chat_url, discharge_model, keep_alive=args.keep_alive, openai_compat=compat
+        )
+        if not compat:
+            warm.append((discharge_model, chat_url))
+    if args.warmup:
+        from discharge_agent.llm.warmup import DEFAULT_KEEP_ALIVE, warm_up
+
+        by_url = {}
+        for model, url in warm:
+            models = by_url.setdefault(url, [])
+            if model not in models:
+                models.append(model)
+        for url, models in by_url.items():
+            warm_up(models, url, keep_alive=args.keep_alive or DEFAULT_KEEP_ALIVE)
+    summary = run_batch(
+        notes,
+        extractor,
+        out,
+        discharge_fn=discharge_fn,
+        max_retries=args.max_retries,
+        workers=args.workers,
+        progress=not args.quiet,
+    )
+    write_run_metrics(out, summary, shard=args.shard)
+    return 1 if summary["failed"] else 0
+
+
+def cmd_serve(args):
+    from discharge_agent.pipelines.service import DischargeService, parse_limits, start_service
+
+    extractor = build_extractor(args)
+    if args.compact:
+        from discharge_agent.extractions.compact import CompactExtractor
+
+        extractor = CompactExtractor(extractor)
+    chat, discharge_model = None, None
+    if args.discharge:
+        from discharge_agent.pipelines.discharge_checker import make_chat, make_openai_chat
+
+        if extractor.provider.value == "openai_compat" and not args.chat_url:
+            chat = make_openai_chat(extractor.base_url, api_key=extractor.api_key)
+        else:
+            chat = make_chat(args.chat_url or env("LLM_API"), keep_alive=args.keep_alive)
+        discharge_model = args.discharge_model or env("MODEL") or extractor.model
+    if args.warmup and extractor.provider.value == "local":
+        from discharge_agent.llm.warmup import DEFAULT_KEEP_ALIVE, warm_up
+
+        warm_up([extractor.model], extractor.api_url, keep_alive=args.keep_alive or DEFAULT_KEEP_ALIVE)
+    service = DischargeService(
+        extractor,
+        chat=chat,
+        model=discharge_model,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        batch_wait_ms=args.batch_wait_ms,
+        limits=parse_limits(args.max_queue),
+        default_deadline_ms=args.deadline_ms,
+        attempts=args.attempts,
+    )
+    server, url = start_service(service, args.host, args.port, background=False)
+    print(f"Serving on {url} (POST /extract, POST /check, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_merge(args):
+    from discharge_agent.pipelines.batch import merge_shards
+
+    model_names = dict(a.split("=", 1) for a in args.name)
+    keys, data = merge_shards(args.inputs, args.out, model_names)
+    if args.evaluate:
+        from discharge_agent.evaluation.consensus import consensus_gold_all
+        from discharge_agent.evaluation.evaluate_accuracy import run_evaluation
+
+        gold = consensus_gold_all(data, quorum=args.quorum)
+        summary = run_evaluation(data, gold)
+        print(summary.to_string(index=False))
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m discharge_agent")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="extract (and check) a corpus of notes")
+    run.add_argument("--input", required=True, help="notes CSV or JSONL")
+    run.add_argument("--out", required=True, help="results JSONL (appended, resumable)")
+    run.add_argument("--id-col", default="noteid")
+    run.add_argument("--text-col", default="note_text")
+    run.add_argument("--provider", default="local", choices=PROVIDERS)
+    run.add_argument("--model", default=None)
+    run.add_argument("--api-url", default=None, help="defaults to LLM_API")
+    run.add_argument("--base-url", default=None, help="OpenAI-compatible base URL")
+    run.add_argument("--discharge", action="store_true", help="also run the discharge check")
+    run.add_argument("--chat-url", default=None, help="Ollama /api/chat for the discharge agent")
+    run.add_argument("--discharge-model", default=None)
+    run.add_argument("--max-retries", type=int, default=3)
+    run.add_argument("--workers", type=int, default=1)
+    run.add_argument("--quiet", action="store_true")
+    run.add_argument("--shard", default=None, help="i/N: process only shard i of N")
+    run.add_argument("--compact", action="store_true", help="compact output schema (fewer tokens)")
+    run.add_argument("--keep-alive", default=None, help="Ollama keep_alive per request, e.g. 30m")
+    run.add_argument("--warmup", action="store_true", help="preload and prime local models first")
+    run.set_defaults(func=cmd_run)
+
+    serve = sub.add_parser("serve", help="HTTP service for extraction and discharge checks")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--provider", default="local", choices=PROVIDERS)
+    serve.add_argument("--model", default=None)
+    serve.add_argument("--api-url", default=None, help="defaults to LLM_API")
+    serve.add_argument("--base-url", default=None, help="OpenAI-compatible base URL")
+    serve.add_argument("--discharge", action="store_true", help="enable POST /check")
+    serve.add_argument("--chat-url", default=None, help="Ollama /api/chat for the discharge agent")
+    serve.add_argument("--discharge-model", default=None)
+    serve.add_argument("--attempts", type=int, default=3, help="tries per request")
+    serve.add_argument("--concurrency", type=int, default=4, help="backend requests in flight")
+    serve.add_argument("--batch-size", type=int, default=8)
+    serve.add_argument("--batch-wait-ms", type=float, default=20.0)
+    serve.add_argument(
+        "--max-queue", default="", metavar="PRIORITY=N,...",
+        help="queue-length limits, e.g. urgent=256,normal=128,backfill=64",
+    )
+    serve.add_argument("--deadline-ms", type=float, default=None, help="default per-request deadline")
+    serve.add_argument("--compact", action="store_true", help="compact output schema (fewer tokens)")
+    serve.add_argument("--keep-alive", default=None, help="Ollama keep_alive per request, e.g. 30m")
+    serve.add_argument("--warmup", action="store_true", help="preload and prime the local model first")
+    serve.set_defaults(func=cmd_serve)
+
+    merge = sub.add_parser("merge", help="merge run/shard outputs for evaluation")
+    merge.add_argument("inputs", nargs="+", help="result JSONL files or globs")
+    merge.add_argument("--out", required=True, help="{model: extraction} JSONL, one note per line")
+    merge.add_argument(
+        "--name", action="append", default=[], metavar="MODEL=NAME",
+        help="rename a model id for evaluation (repeatable)",
+    )
+    merge.add_argument("--evaluate", action="store_true", help="run consensus + run_evaluation")
+    merge.add_argument("--quorum", type=float, default=0.5)
+    merge.set_defaults(func=cmd_merge)
+
+    args = ap.parse_args(argv)
+    if getattr(args, "api_url", "") is None:
+        args.api_url = env("LLM_API")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+"""
+Reproducible throughput/latency benchmark for extraction and discharge checking.
+
+Replaces the single wall-clock number per model in timings.json with a sweep
+over concurrency levels and input sizes, with warmup, percentiles and a
+machine-readable results file that can be diffed across runs.
+
+    python -m discharge_agent.benchmarks.bench run \\
+        --provider local --model gpt-oss:20b \\
+        --api-url http://localhost:11434/api/chat \\
+        --tasks extract,discharge --concurrency 1,2,4 --sizes 0.5,1.0 \\
+        --warmup 2 --requests 20 --out bench_results/gpt-oss.json
+
+    python -m discharge_agent.benchmarks.bench compare base.json new.json --threshold 0.10
+
+    python -m discharge_agent.benchmarks.bench backends --mock --mock-ollama-parallel 1 \
+        --tasks extract,discharge --concurrency 1,4,8
+
+Input size is a factor applied to the note text: <1 truncates the note,
+>1 repeats it. The discharge task runs the tool-calling agent loop on the
+extractions in data/processed_notes/tool_evaluation_samples_v2.jsonl and needs
+an Ollama-compatible chat endpoint. --mock starts the offline mock server
+(benchmarks/mock_server.py) in-process and points both paths at it, which
+isolates client-side overhead from inference time.
+
+`backends` runs the same sweep through the Ollama path (local: /api/chat)
+and an OpenAI-compatible server (openai_compat: --base-url, e.g. vLLM or
+llama.cpp server) and prints the throughput ratio per level. Against the
+mock, --mock-ollama-parallel / --mock-openai-parallel cap how many requests
+each API serves at once (see mock_server.py).
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from discharge_agent.config import env
+from discharge_agent.monitoring.metrics import REGISTRY, Histogram
+
+# repo data, resolved from the package so runs work from any directory
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+DEFAULT_NOTES = str(DATA_DIR / "synthetic_notes.csv")
+DEFAULT_CASES = str(DATA_DIR / "processed_notes" / "tool_evaluation_samples_v2.jsonl")
+MOCK_RESPONSES = str(DATA_DIR / "processed_notes" / "all_extractions_multiple_providers.jsonl")
+
+
+def resize_note(note: str, factor: float) -> str:
+    if factor >= 1.0:
+        reps = int(factor)
+        frac = factor - reps
+        return "\n\n".join([note] * reps) + (note[: int(len(note) * frac)] if frac else "")
+    return note[: max(1, int(len(note) * factor))]
+
+
+def _is_json(text) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except Exception:
+        return False
+
+
+def run_level(
+    fn: Callable[[object], str], inputs: List, concurrency: int, n_requests: int
+) -> Dict:
+    """Fire n_requests calls of fn over inputs (round-robin) at a fixed concurrency."""
+    items = [inputs[i % len(inputs)] for i in range(n_requests)]
+    tokens_out0 = REGISTRY.counter("tokens_out_total")
+    tokens_in0 = REGISTRY.counter("tokens_in_total")
+
+    def one(x):
+        start = time.perf_counter()
+        try:
+            out = fn(x)
+            return (time.perf_counter() - start) * 1000.0, _is_json(out), None
+        except Exception as e:
+            return (time.perf_counter() - start) * 1000.0, False, repr(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, items))
+    wall_s = time.perf_counter() - start
+
+    hist = Histogram()
+    for ms, _, err in outcomes:
+        if err is None:
+            hist.record(ms)
+    errors = [err for _, _, err in outcomes if err is not None]
+    tokens_out = REGISTRY.counter("tokens_out_total") - tokens_out0
+    tokens_in = REGISTRY.counter("tokens_in_total") - tokens_in0
+    return {
+        "requests": n_requests,
+        "errors": len(errors),
+        "error_examples": sorted(set(errors))[:3],
+        "wall_s": wall_s,
+        "throughput_rps": n_requests / wall_s if wall_s > 0 else 0.0,
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "tokens_per_s": tokens_out / wall_s if wall_s > 0 else 0.0,
+        "json_success_rate": sum(ok for _, ok, _ in outcomes) / max(1, n_requests),
+        **{f"{k}_ms": v for k, v in hist.summary().items() if k != "count"},
+    }
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return ""
+
+
+def build_extractor(args):
+    from discharge_agent.llm.llm_utils import LLMProvider, MedicalDataExtractor
+
+    provider = LLMProvider(args.provider)
+    kwargs = {"model": args.model}
+    if args.api_url:
+        kwargs["api_url"] = args.api_url
+    if provider == LLMProvider.OPENAI:
+        kwargs["api_key"] = env("OPENAI_API_KEY") or "unused"
+        if args.base_url:
+            kwargs["base_url"] = args.base_url
+    elif provider == LLMProvider.OPENAI_COMPAT:
+        if args.base_url:
+            kwargs["base_url"] = args.base_url
+    elif provider == LLMProvider.ANTHROPIC:
+        kwargs["api_key"] = env("ANTHROPIC_API_KEY")
+    return MedicalDataExtractor(provider, **kwargs)
+
+
+def task_functions(args):
+    """{task: (fn(input) -> text, [inputs for size factor])}"""
+    tasks = {}
+    names = args.tasks.split(",")
+    if "extract" in names:
+        extractor = build_extractor(args)
+        notes = pd.read_csv(args.notes)["note_text"].tolist()
+        tasks["extract"] = (extractor.extract_clinical_information, notes)
+    if "discharge" in names:
+        from discharge_agent.llm.prompts import get_messages
+        from discharge_agent.llm.tool_specs import TOOLS
+        from discharge_agent.pipelines.discharge_checker import (
+            check_discharge_safety,
+            make_chat,
+            make_openai_chat,
+        )
+
+        if args.provider == "openai_compat":
+            chat = make_openai_chat(args.base_url or "http://localhost:8000/v1")
+        else:
+            chat = make_chat(args.api_url or "http://localhost:11434/api/chat")
+        with open(args.cases) as f:
+            cases = [json.loads(line)["result_json"] for line in f if line.strip()]
+
+        def discharge(result_json):
+            return check_discharge_safety(
+                get_messages(result_json), chat=chat, MODEL=args.model, TOOLS=TOOLS
+            )
+
+        tasks["discharge"] = (discharge, cases)
+    return tasks
+
+
+def start_mock(args):
+    """Point the run at an in-process mock server (see benchmarks/mock_server.py)."""
+    from discharge_agent.benchmarks.mock_server import MockConfig, start_mock_server
+
+    cfg = MockConfig(
+        ttft=args.mock_ttft,
+        tokens_per_s=args.mock_tokens_per_s,
+        responses=args.mock_responses,
+        # umls_normalize needs the UMLS API; keep the mock run offline
+        call_tools=["flag_labs", "followup_gap"],
+        seed=0,
+        ollama_parallel=args.mock_ollama_parallel,
+        openai_parallel=args.mock_openai_parallel,
+    )
+    server, url = start_mock_server(cfg)
+    args.api_url = f"{url}/api/chat"
+    args.base_url = f"{url}/v1"
+    print(f"Using mock LLM server at {url}")
+    return server
+
+
+def sweep(args) -> List[Dict]:
+    """One row per (task, size, concurrency) for the provider in args."""
+    levels = [int(c) for c in args.concurrency.split(",")]
+    sizes = [float(s) for s in args.sizes.split(",")]
+    results = []
+    for task, (fn, inputs) in task_functions(args).items():
+        for size in sizes:
+            if task == "extract":
+                sized = [resize_note(n, size) for n in inputs]
+            else:
+                # discharge inputs are extraction JSON; size does not apply
+                if size != sizes[0]:
+                    continue
+                sized = inputs
+            for _ in range(args.warmup):
+                try:
+                    fn(sized[0])
+                except Exception as e:
+                    print(f"warmup failed: {e!r}")
+            for c in levels:
+                n = args.requests or max(len(sized), 2 * c)
+                row = {"task": task, "size": size, "concurrency": c}
+                row.update(run_level(fn, sized, c, n))
+                results.append(row)
+                print(
+                    f"{task:<10} size={size:<5} c={c:<3} "
+                    f"p50={row['p50_ms']:8.0f}ms p95={row['p95_ms']:8.0f}ms "
+                    f"p99={row['p99_ms']:8.0f}ms {row['throughput_rps']:6.2f} req/s "
+                    f"{row['tokens_per_s']:7.1f} tok/s json={100 * row['json_success_rate']:.0f}% "
+                    f"err={row['errors']}"
+                )
+    return results
+
+
+def _meta(args) -> Dict:
+    return {
+        "provider": args.provider,
+        "model": args.model,
+        "api_url": args.api_url,
+        "base_url": args.base_url,
+        "mock": args.mock_ttft if args.mock else None,
+        "tasks": args.tasks,
+        "warmup": args.warmup,
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run_benchmark(args) -> Dict:
+    server = start_mock(args) if args.mock else None
+    try:
+        results = sweep(args)
+    finally:
+        if server is not None:
+            server.shutdown()
+    return {"meta": _meta(args), "results": results}
+
+
+def compare_backends(args) -> Dict:
+    """
+    The same sweep through each provider in --backends; rows carry a
+    `backend` column, and the summary prints each backend's throughput
+    relative to the first one.
+    """
+    server = start_mock(args) if args.mock else None
+    backends = args.backends.split(",")
+    results = []
+    try:
+        for backend in backends:
+            print(f"\n--- {backend} ---")
+            args.provider = backend
+            results += [dict(r, backend=backend) for r in sweep(args)]
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    base = {(r["task"], r["size"], r["concurrency"]): r for r in results if r["backend"] == backends[0]}
+    print(f"\n=== Throughput vs {backends[0]} ===")
+    for r in results:
+        b = base.get((r["task"], r["size"], r["concurrency"]))
+        if r["backend"] == backends[0] or b is None or not b["throughput_rps"]:
+            continue
+        print(
+            f"{r['backend']:<14} {r['task']:<10} size={r['size']:<5} c={r['concurrency']:<3} "
+            f"{b['throughput_rps']:6.2f} -> {r['throughput_rps']:6.2f} req/s "
+            f"({r['throughput_rps'] / b['throughput_rps']:.2f}x), "
+            f"p95 {b['p95_ms']:.0f} -> {r['p95_ms']:.0f} ms"
+        )
+    return {"meta": dict(_meta(args), provider=None, backends=backends), "results": results}
+
+
+def compare(base: Dict, new: Dict, threshold: float = 0.10) -> List[Dict]:
+    """Rows where latency rose, or throughput/JSON success fell, by more than threshold."""
+    key = lambda r: (r["task"], r["size"], r["concurrency"])
+    base_rows = {key(r): r for r in base["results"]}
+    regressions = []
+    for r in new["results"]:
+        b = base_rows.get(key(r))
+        if b is None:
+            continue
+        checks = [
+            ("p50_ms", +1),
+            ("p95_ms", +1),
+            ("p99_ms", +1),
+            ("throughput_rps", -1),
+            ("json_success_rate", -1),
+        ]
+        for metric, direction in checks:
+            old, cur = b.get(metric) or 0.0, r.get(metric) or 0.0
+            if old <= 0:
+                continue
+            change = (cur - old) / old
+            if change * direction > threshold:
+                regressions.append(
+                    {
+                        "task": r["task"],
+                        "size": r["size"],
+                        "concurrency": r["concurrency"],
+                        "metric": metric,
+                        "base": old,
+                        "new": cur,
+                        "change_pct": 100.0 * change,
+                    }
+                )
+    return regressions
+
+
+def add_sweep_args(p):
+    p.add_argument("--provider", default="local")
+    p.add_argument("--model", default=env("MODEL", "gpt-oss:20b"))
+    p.add_argument("--api-url", default=env("LLM_API"))
+    p.add_argument("--base-url", default=None, help="OpenAI-compatible base URL")
+    p.add_argument("--mock", action="store_true", help="run against a local mock server")
+    p.add_argument("--mock-ttft", default="fixed:0.05")
+    p.add_argument("--mock-tokens-per-s", type=float, default=200.0)
+    p.add_argument("--mock-responses", default=MOCK_RESPONSES, help="canned extractions JSONL")
+    p.add_argument("--mock-ollama-parallel", type=int, default=None)
+    p.add_argument("--mock-openai-parallel", type=int, default=None)
+    p.add_argument("--tasks", default="extract")
+    p.add_argument("--notes", default=DEFAULT_NOTES)
+    p.add_argument("--cases", default=DEFAULT_CASES)
+    p.add_argument("--concurrency", default="1,2,4")
+    p.add_argument("--sizes", default="1.0")
+    p.add_argument("--warmup", type=int, default=2)
+    p.add_argument("--requests", type=int, default=0, help="requests per level")
+    p.add_argument("--out", default="bench_results.json")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m discharge_agent.benchmarks.bench")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="run a benchmark sweep")
+    backends = sub.add_parser("backends", help="compare providers (e.g. Ollama vs vLLM) on one sweep")
+    backends.add_argument("--backends", default="local,openai_compat")
+    for p in (run, backends):
+        add_sweep_args(p)
+
+    cmp_ = sub.add_parser("compare", help="compare two result files")
+    cmp_.add_argument("base")
+    cmp_.add_argument("new")
+    cmp_.add_argument("--threshold", type=float, default=0.10)
+
+    args = ap.parse_args(argv)
+    if args.cmd in ("run", "backends"):
+        out = run_benchmark(args) if args.cmd == "run" else compare_backends(args)
+        d = os.path.dirname(args.out)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(out, f, indent=2)
+        print(f"\nWrote {len(out['results'])} rows to {args.out}")
+        return 0
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(base, new, args.threshold)
+    if not regressions:
+        print(f"No regressions above {100 * args.threshold:.0f}%")
+        return 0
+    print(f"{len(regressions)} regression(s) above {100 * args.threshold:.0f}%:")
+    for r in regressions:
+        print(
+            f"  {r['task']:<10} size={r['size']:<5} c={r['concurrency']:<3} "
+            f"{r['metric']:<18} {r['base']:.3f} -> {r['new']:.3f} ({r['change_pct']:+.1f}%)"
+        )
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
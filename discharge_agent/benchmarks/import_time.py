@@ -0,0 +1,135 @@
+"""
+Import-time guard for the package's entry modules.
+
+Each module is imported in a fresh interpreter with `-X importtime`; the run
+fails if a module pulls in a heavy dependency it should load lazily (provider
+SDKs, requests, pandas) or if its cumulative import time exceeds its budget.
+
+    python -m discharge_agent.benchmarks.import_time --runs 5
+    python -m discharge_agent.benchmarks.import_time --json import_times.json --scale 2
+
+Budgets are deliberately loose (slow CI machines): the forbidden-module check
+is what catches an eager `import openai` creeping back in.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+HEAVY = ["openai", "anthropic", "requests", "pandas", "numpy", "dotenv"]
+
+# module -> (budget ms, modules it must not import)
+GUARDS = {
+    "discharge_agent.config": (20, HEAVY),
+    "discharge_agent.llm.llm_utils": (50, HEAVY),
+    "discharge_agent.pipelines.discharge_checker": (100, HEAVY),
+    "discharge_agent.extractions.extraction": (50, HEAVY),
+    "discharge_agent.__main__": (50, HEAVY),
+}
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Rows of `import time: self | cumulative | name` (microseconds)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:") :].split("|", 2)
+        rows.append(
+            {
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cum_us),
+            }
+        )
+    return rows
+
+
+def subtree(rows: List[Dict], module: str) -> List[Dict]:
+    """Rows imported under `module` (children are printed before their parent)."""
+    idx = max(i for i, r in enumerate(rows) if r["module"] == module)
+    depth = rows[idx]["depth"]
+    start = idx
+    while start > 0 and rows[start - 1]["depth"] > depth:
+        start -= 1
+    return rows[start : idx + 1]
+
+
+def measure(module: str, runs: int = 5) -> Dict:
+    """Median cumulative import time (ms) of `module` plus what it imported."""
+    times, rows = [], []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+        rows = subtree(parse_importtime(proc.stderr), module)
+        times.append(rows[-1]["cumulative_us"] / 1000.0)
+    imported = {r["module"].split(".")[0] for r in rows}
+    heaviest = sorted(
+        (r for r in rows if r["module"] != module and not r["module"].startswith("discharge_agent")),
+        key=lambda r: r["cumulative_us"],
+        reverse=True,
+    )[:5]
+    return {
+        "module": module,
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "imported_top_level": sorted(imported),
+        "heaviest": [(r["module"], r["cumulative_us"] / 1000.0) for r in heaviest],
+    }
+
+
+def check(guards: Dict = None, runs: int = 5, scale: float = 1.0) -> List[Dict]:
+    """Measure every guarded module; each result carries its list of failures."""
+    results = []
+    for module, (budget_ms, forbidden) in (guards or GUARDS).items():
+        res = measure(module, runs)
+        res["budget_ms"] = budget_ms * scale
+        res["failures"] = [
+            f"imports {m} eagerly" for m in forbidden if m in res["imported_top_level"]
+        ]
+        if res["median_ms"] > res["budget_ms"]:
+            res["failures"].append(
+                f"{res['median_ms']:.1f} ms exceeds budget {res['budget_ms']:.0f} ms"
+            )
+        results.append(res)
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m discharge_agent.benchmarks.import_time")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--scale", type=float, default=1.0, help="multiply every budget")
+    ap.add_argument("--json", default=None, help="write results to this file")
+    args = ap.parse_args(argv)
+
+    results = check(runs=args.runs, scale=args.scale)
+    failed = False
+    for r in results:
+        status = "FAIL" if r["failures"] else "ok"
+        print(
+            f"{status:<4} {r['module']:<45} {r['median_ms']:7.1f} ms "
+            f"(budget {r['budget_ms']:.0f} ms)"
+        )
+        for f in r["failures"]:
+            print(f"     - {f}")
+        if r["failures"]:
+            failed = True
+            for name, ms in r["heaviest"]:
+                print(f"       {name:<40} {ms:7.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
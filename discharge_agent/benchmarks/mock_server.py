@@ -0,0 +1,434 @@
+"""
+Mock LLM server for offline load testing.
+
+Speaks the Ollama /api/chat and OpenAI /v1/chat/completions wire formats
+(streaming and non-streaming, including tool_calls) with configurable
+latency, decode speed, error/429 rates, model load/keep_alive (Ollama
+/api/generate and /api/ps), per-API parallelism and scripted responses,
+so client-side overhead and concurrency behaviour can be measured without
+real inference.
+
+--ollama-parallel N serves at most N /api/chat requests at a time (like
+OLLAMA_NUM_PARALLEL); the rest wait for a slot. --openai-parallel does the
+same for /v1/chat/completions (llama.cpp --parallel); unset, every request
+decodes concurrently, as with vLLM's continuous batching. Per-request decode
+speed does not drop with the batch size, so the OpenAI-path numbers are an
+upper bound on batching gains.
+
+    python -m discharge_agent.benchmarks.mock_server --port 11435 \\
+        --ttft lognormal:-0.7,0.4 --tokens-per-s 40 --error-rate 0.01 --rate-429 0.02 \\
+        --responses data/processed_notes/all_extractions_multiple_providers.jsonl
+
+    MedicalDataExtractor(LLMProvider.LOCAL, api_url="http://localhost:11435/api/chat")
+    MedicalDataExtractor(LLMProvider.OPENAI, api_key="x", base_url="http://localhost:11435/v1")
+    make_chat("http://localhost:11435/api/chat")
+
+Responses:
+- extraction prompts get a canned extraction from --responses (the one whose
+  discharge_date appears in the note, else round-robin), or a minimal JSON,
+  restricted to the schema keys the prompt asks for, in the compact wire
+  form for compact-schema prompts
+- requests carrying `tools` get tool_calls for every offered tool (or the
+  --call-tools subset) on the first turn (arguments built from the "Data:" JSON in the user message), then a
+  final {ready, reasons, summary} JSON once tool results are present
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from discharge_agent.extractions.compact import compact
+from discharge_agent.llm.warmup import parse_keep_alive
+
+
+def parse_dist(spec: str, rng: random.Random = None):
+    """'fixed:0.5' | 'uniform:0.2,1.0' | 'lognormal:mu,sigma' (seconds) -> sampler()."""
+    rng = rng or random.Random()
+    kind, _, params = spec.partition(":")
+    vals = [float(x) for x in params.split(",")] if params else []
+    if kind == "fixed":
+        return lambda: vals[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(vals[0], vals[1])
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(vals[0], vals[1])
+    raise ValueError(f"unknown latency distribution {spec!r}")
+
+
+def count_tokens(text: str) -> int:
+    """Rough token estimate (~4 chars/token), good enough for pacing and usage."""
+    return max(1, len(text) // 4)
+
+
+class MockConfig:
+    def __init__(
+        self,
+        ttft: str = "fixed:0.05",
+        tokens_per_s: float = 200.0,
+        error_rate: float = 0.0,
+        rate_429: float = 0.0,
+        responses: str = None,
+        response_model: str = None,
+        call_tools: List[str] = None,
+        seed: int = None,
+        load_s: float = 0.0,
+        ollama_parallel: int = None,
+        openai_parallel: int = None,
+    ):
+        # private generator: seeding must not reseed the process-wide random module
+        self.rng = random.Random(seed)
+        self.ttft = parse_dist(ttft, self.rng)
+        self.tokens_per_s = tokens_per_s
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.call_tools = call_tools  # None = call every offered tool
+        self.load_s = load_s  # Ollama paths: model load paid when not resident
+        self._loaded: Dict[str, float] = {}  # model -> unload time
+        # concurrent requests served per API; None = unlimited
+        self.slots = {
+            "ollama": threading.BoundedSemaphore(ollama_parallel) if ollama_parallel else None,
+            "openai": threading.BoundedSemaphore(openai_parallel) if openai_parallel else None,
+        }
+        self.canned: List[Dict] = []
+        if responses:
+            with open(responses) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    row = json.loads(line)
+                    # all_extractions_* rows are {model: extraction}; pick one model
+                    if "discharge_date" not in row:
+                        row = row.get(response_model) or next(iter(row.values()))
+                    self.canned.append(row)
+        self._rr = itertools.count()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+
+    def load_for(self, model: str, keep_alive=None) -> float:
+        """Load seconds this request pays; renews the model's keep_alive like Ollama."""
+        now = time.monotonic()
+        with self._lock:
+            resident = self._loaded.get(model, 0.0) > now
+            ka = parse_keep_alive(keep_alive)
+            if ka == 0:
+                self._loaded.pop(model, None)
+            else:
+                self._loaded[model] = now + ka
+        return 0.0 if resident else self.load_s
+
+    def resident(self) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            return [m for m, t in self._loaded.items() if t > now]
+
+    def extraction_for(self, prompt: str) -> Dict:
+        for c in self.canned:
+            d = c.get("discharge_date")
+            if d and d in prompt:
+                return c
+        if self.canned:
+            return self.canned[next(self._rr) % len(self.canned)]
+        return {"discharge_date": "", "most_recent_labs": [], "follow_up_appointments": []}
+
+
+def _data_json(messages: List[Dict]):
+    for m in messages:
+        if m.get("role") == "user" and "Data:" in (m.get("content") or ""):
+            raw = m["content"].split("Data:", 1)[1].strip()
+            try:
+                return json.JSONDecoder().raw_decode(raw)[0]
+            except ValueError:
+                return {}
+    return {}
+
+
+def _tool_args(name: str, data: Dict) -> Dict:
+    if name == "flag_labs":
+        return {"labs": data.get("most_recent_labs") or []}
+    if name == "followup_gap":
+        return {
+            "discharge_date": data.get("discharge_date") or "",
+            "appts": data.get("follow_up_appointments") or [],
+        }
+    if name == "umls_normalize":
+        dx = data.get("primary_discharge_diagnosis") or ""
+        return {"terms": [t.strip() for t in re.split(r",|;| 2/2 | s/p ", dx) if t.strip()]}
+    return {}
+
+
+def script_reply(cfg: MockConfig, req: Dict):
+    """(content, tool_calls) for a chat request."""
+    messages = req.get("messages") or []
+    tools = req.get("tools") or []
+    if tools:
+        if not any(m.get("role") == "tool" for m in messages):
+            data = _data_json(messages)
+            names = [t["function"]["name"] for t in tools]
+            if cfg.call_tools is not None:
+                names = [n for n in names if n in cfg.call_tools]
+            calls = [{"function": {"name": n, "arguments": _tool_args(n, data)}} for n in names]
+            return "", calls
+        final = {"ready": True, "reasons": ["mock"], "summary": {"labs": {}, "followup": {}, "meds": {}, "diagnoses": []}}
+        return json.dumps(final), []
+    prompt = "\n".join(m.get("content") or "" for m in messages)
+    extraction = cfg.extraction_for(prompt)
+    if '"labs": [[' in prompt:
+        return json.dumps(compact(extraction)), []  # compact wire schema
+    # field-group prompts ask for a slice of the schema: answer only that
+    asked = {k: v for k, v in extraction.items() if f'"{k}"' in prompt}
+    return json.dumps(asked or extraction), []
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockLLM/1.0"
+    cfg: MockConfig = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, code: int, body: Dict, headers: Dict = None):
+        raw = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        if self.path in ("/health", "/"):
+            self._send_json(200, {"status": "ok", **self.cfg.stats})
+        elif self.path == "/api/ps":
+            self._send_json(200, {"models": [{"name": m, "model": m} for m in self.cfg.resident()]})
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "mock"}]})
+        elif self.path == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        cfg = self.cfg
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "invalid JSON body"})
+        with cfg._lock:
+            cfg.stats["requests"] += 1
+
+        r = cfg.rng.random()
+        if r < cfg.rate_429:
+            with cfg._lock:
+                cfg.stats["rate_limited"] += 1
+            return self._send_json(429, {"error": "rate limited"}, {"Retry-After": "1"})
+        if r < cfg.rate_429 + cfg.error_rate:
+            with cfg._lock:
+                cfg.stats["errors"] += 1
+            return self._send_json(500, {"error": "mock server error"})
+
+        if self.path.startswith("/api/generate"):
+            return self._ollama_load(req)
+
+        api = "openai" if self.path.startswith("/v1/") else "ollama"
+        with cfg.slots[api] or contextlib.nullcontext():
+            self._reply(req)
+
+    def _reply(self, req):
+        cfg = self.cfg
+        content, tool_calls = script_reply(cfg, req)
+        prompt_tokens = count_tokens(json.dumps(req.get("messages") or []))
+        out_tokens = count_tokens(content) if content else 8 * max(1, len(tool_calls))
+        ttft = cfg.ttft()
+        decode = out_tokens / cfg.tokens_per_s if cfg.tokens_per_s > 0 else 0.0
+
+        if self.path.startswith("/api/chat"):
+            load = cfg.load_for(req.get("model", "mock"), req.get("keep_alive"))
+            self._ollama(req, content, tool_calls, prompt_tokens, out_tokens, ttft, decode, load)
+        elif self.path.startswith("/v1/chat/completions"):
+            self._openai(req, content, tool_calls, prompt_tokens, out_tokens, ttft, decode)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    # ---- Ollama ----
+    def _ollama_load(self, req):
+        """/api/generate without a prompt: load (or with keep_alive=0, unload) the model."""
+        model = req.get("model", "mock")
+        unload = parse_keep_alive(req.get("keep_alive")) == 0
+        load = 0.0 if unload else self.cfg.load_for(model, req.get("keep_alive"))
+        if unload:
+            self.cfg.load_for(model, 0)
+        time.sleep(load)
+        self._send_json(
+            200,
+            {
+                "model": model,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "response": "",
+                "done": True,
+                "done_reason": "unload" if unload else "load",
+                "load_duration": int(load * 1e9),
+            },
+        )
+
+    def _ollama(self, req, content, tool_calls, p_tok, o_tok, ttft, decode, load=0.0):
+        model = req.get("model", "mock")
+        ttft += load
+        final = {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((ttft + decode) * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": p_tok,
+            "prompt_eval_duration": int((ttft - load) * 1e9),
+            "eval_count": o_tok,
+            "eval_duration": int(decode * 1e9),
+        }
+        message = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        if not req.get("stream", True):
+            time.sleep(ttft + decode)
+            return self._send_json(200, dict(final, message=message))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        time.sleep(ttft)
+        for piece, delay in _pieces(content, decode):
+            chunk = {"model": model, "message": {"role": "assistant", "content": piece}, "done": False}
+            self.wfile.write((json.dumps(chunk) + "\n").encode())
+            self.wfile.flush()
+            time.sleep(delay)
+        last = dict(final, message={"role": "assistant", "content": ""})
+        if tool_calls:
+            last["message"]["tool_calls"] = tool_calls
+        self.wfile.write((json.dumps(last) + "\n").encode())
+
+    # ---- OpenAI ----
+    def _openai(self, req, content, tool_calls, p_tok, o_tok, ttft, decode):
+        model = req.get("model", "mock")
+        cid = "chatcmpl-" + uuid.uuid4().hex[:12]
+        oa_calls = [
+            {
+                "id": f"call_{i}",
+                "type": "function",
+                "function": {"name": c["function"]["name"], "arguments": json.dumps(c["function"]["arguments"])},
+            }
+            for i, c in enumerate(tool_calls)
+        ]
+        usage = {"prompt_tokens": p_tok, "completion_tokens": o_tok, "total_tokens": p_tok + o_tok}
+        finish = "tool_calls" if oa_calls else "stop"
+        if not req.get("stream"):
+            time.sleep(ttft + decode)
+            message = {"role": "assistant", "content": content or None}
+            if oa_calls:
+                message["tool_calls"] = oa_calls
+            return self._send_json(
+                200,
+                {
+                    "id": cid,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+                    "usage": usage,
+                },
+            )
+
+        def event(delta, finish_reason=None, **extra):
+            body = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            self.wfile.write(f"data: {json.dumps(body)}\n\n".encode())
+            self.wfile.flush()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        time.sleep(ttft)
+        event({"role": "assistant", "content": ""})
+        for piece, delay in _pieces(content, decode):
+            event({"content": piece})
+            time.sleep(delay)
+        if oa_calls:
+            event({"tool_calls": [dict(c, index=i) for i, c in enumerate(oa_calls)]})
+        event({}, finish, usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def _pieces(content: str, decode_s: float, chunk_chars: int = 32):
+    """Split content into streamed pieces with the per-piece decode delay."""
+    if not content:
+        return []
+    parts = [content[i : i + chunk_chars] for i in range(0, len(content), chunk_chars)]
+    delay = decode_s / len(parts)
+    return [(p, delay) for p in parts]
+
+
+def start_mock_server(config: MockConfig = None, host: str = "127.0.0.1", port: int = 0):
+    """Start in a daemon thread; returns (server, base_url). port=0 picks a free port."""
+    handler = type("BoundMockHandler", (MockHandler,), {"cfg": config or MockConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m discharge_agent.benchmarks.mock_server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--ttft", default="fixed:0.05", help="fixed:S | uniform:A,B | lognormal:MU,SIGMA")
+    ap.add_argument("--tokens-per-s", type=float, default=200.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--responses", default=None, help="JSONL of canned extractions")
+    ap.add_argument("--response-model", default=None, help="model key in all_extractions_* rows")
+    ap.add_argument("--call-tools", default=None, help="comma-separated subset of tools to call")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--load-s", type=float, default=0.0, help="model load time when not resident")
+    ap.add_argument("--ollama-parallel", type=int, default=None, help="concurrent /api/chat requests")
+    ap.add_argument("--openai-parallel", type=int, default=None, help="concurrent /v1 requests")
+    args = ap.parse_args(argv)
+
+    cfg = MockConfig(
+        ttft=args.ttft,
+        tokens_per_s=args.tokens_per_s,
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+        responses=args.responses,
+        response_model=args.response_model,
+        call_tools=args.call_tools.split(",") if args.call_tools else None,
+        seed=args.seed,
+        load_s=args.load_s,
+        ollama_parallel=args.ollama_parallel,
+        openai_parallel=args.openai_parallel,
+    )
+    handler = type("BoundMockHandler", (MockHandler,), {"cfg": cfg})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Mock LLM server on http://{args.host}:{args.port} (Ollama /api/chat, OpenAI /v1/chat/completions)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Lazily resolved settings.
+
+.env is loaded on the first settings lookup instead of at import time, so
+importing a module costs nothing until a setting is actually read. Modules
+that used to expose settings as constants (API, MODEL, ...) keep them through
+a module-level __getattr__:
+
+    __getattr__ = module_settings(__name__, {"API": "LLM_API", "MODEL": "MODEL"})
+"""
+
+import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _load_dotenv():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def env(name: str, default=None):
+    """os.getenv after loading .env once."""
+    _load_dotenv()
+    return os.getenv(name, default)
+
+
+def module_settings(module: str, names: dict):
+    """Module __getattr__ resolving {attribute: env var} on access."""
+
+    def __getattr__(attr):
+        if attr in names:
+            return env(names[attr])
+        raise AttributeError(f"module {module!r} has no attribute {attr!r}")
+
+    return __getattr__
@@ -0,0 +1,292 @@
+"""
+Columnar scoring engine for run_evaluation.
+
+All predictions and gold items are canonicalized once into NoteRecords
+(records.py), flattened into long tables, and matches plus P/R/F1 are
+computed with joins and group-bys instead of a note x model Python loop.
+Results are identical to the row-by-row path in evaluate_accuracy.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from discharge_agent.evaluation.evaluation_utils import (
+    SCALAR_FIELDS,
+    agg_mean,
+    tok_jacc,
+)
+from discharge_agent.evaluation.records import Canonicalizer, NoteRecord
+
+LIST_KINDS = ["labs", "meds", "followups", "procedures"]
+_SEP = "\x1f"
+
+
+class _Flattener:
+    """Accumulates columnar tables from NoteRecords (scoring/tidy text forms)."""
+
+    def __init__(self):
+        self.canon = Canonicalizer()
+        self.scalars = defaultdict(list)
+        self.labs = defaultdict(list)
+        self.keys = defaultdict(list)
+        self.lab_counts = defaultdict(list)
+
+    def record(self, note) -> NoteRecord:
+        return note if isinstance(note, NoteRecord) else self.canon(note)
+
+    def add(self, side: str, owner: int, rec: NoteRecord):
+        """side: 'pred' (owner = pair id) or 'gold' (owner = note idx)."""
+        self.lab_counts[side + "_owner"].append(owner)
+        self.lab_counts[side + "_n"].append(len(rec.labs))
+        for pos, lab in enumerate(rec.labs):
+            self.labs[side + "_owner"].append(owner)
+            self.labs[side + "_pos"].append(pos)
+            self.labs[side + "_name"].append(lab.key)
+            self.labs[side + "_value"].append(lab.value)
+            self.labs[side + "_vtext"].append(lab.vtext_t)
+            self.labs[side + "_ok"].append(lab.num is not None)
+            self.labs[side + "_num"].append(np.nan if lab.num is None else lab.num)
+        for kind, keys in (
+            ("meds", rec.meds_t),
+            ("followups", rec.fups_t),
+            ("procedures", rec.procs_t),
+        ):
+            for k in keys:
+                self.keys["side"].append(side)
+                self.keys["owner"].append(owner)
+                self.keys["kind"].append(kind)
+                self.keys["key"].append(_SEP.join(k))
+
+    def add_scalars(self, pair: int, pred: NoteRecord, gold: NoteRecord):
+        self.scalars["pair"].append(pair)
+        for f, p, g in zip(SCALAR_FIELDS, pred.scalars_t, gold.scalars_t):
+            self.scalars[f + "_p"].append(p)
+            self.scalars[f + "_g"].append(g)
+
+    def lab_table(self, side):
+        dtypes = {
+            "owner": int,
+            "pos": int,
+            "name": object,
+            "value": object,
+            "vtext": object,
+            "ok": bool,
+            "num": float,
+        }
+        return pd.DataFrame(
+            {
+                c: np.asarray(self.labs.get(f"{side}_{c}", []), dtype=t)
+                for c, t in dtypes.items()
+            }
+        )
+
+
+def _prf(tp, fp, fn):
+    """Vectorized precision/recall/F1 with the same zero-division rules as f1_list."""
+    tp = tp.astype(float)
+    fp = fp.astype(float)
+    fn = fn.astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prec = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        rec = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(prec + rec > 0, 2 * prec * rec / (prec + rec), 0.0)
+    return prec, rec, f1
+
+
+def _scalar_frame(flat: _Flattener, pairs: pd.DataFrame) -> pd.DataFrame:
+    s = pd.DataFrame(flat.scalars)
+    out = {}
+    for f in SCALAR_FIELDS:
+        p, g = s[f + "_p"], s[f + "_g"]
+        has_gold = g != ""
+        out[f + "_exact"] = ((p == g) & has_gold).astype(float)
+        # token Jaccard computed once per distinct (pred, gold) pair
+        uniq = pd.unique(pd.Series(list(zip(p, g)), dtype=object))
+        jac = {pg: tok_jacc(*pg) for pg in uniq}
+        soft = np.fromiter((jac[pg] >= 0.8 for pg in zip(p, g)), dtype=bool, count=len(s))
+        out[f + "_soft"] = (soft & has_gold.to_numpy()).astype(float)
+    df = pd.DataFrame(out)
+    exact = df[SCALAR_FIELDS[0] + "_exact"]
+    soft = df[SCALAR_FIELDS[0] + "_soft"]
+    for f in SCALAR_FIELDS[1:]:
+        exact = exact + df[f + "_exact"]
+        soft = soft + df[f + "_soft"]
+    df["scalar_exact_acc"] = exact / len(SCALAR_FIELDS)
+    df["scalar_soft_acc"] = soft / len(SCALAR_FIELDS)
+    df["model"] = pairs["model"].to_numpy()
+    df["note_idx"] = pairs["note_idx"].to_numpy()
+    return df
+
+
+def _set_counts(flat: _Flattener, pairs: pd.DataFrame) -> pd.DataFrame:
+    """TP/FP/FN per (pair, kind) for meds, followups and procedures (set semantics)."""
+    keys = pd.DataFrame(flat.keys, columns=["side", "owner", "kind", "key"])
+    pred = keys[keys["side"] == "pred"].drop_duplicates(["owner", "kind", "key"])
+    gold = keys[keys["side"] == "gold"].drop_duplicates(["owner", "kind", "key"])
+    pred = pred.rename(columns={"owner": "pair"}).merge(
+        pairs[["pair", "note_idx"]], on="pair"
+    )
+    gold = gold.rename(columns={"owner": "note_idx"})
+
+    joined = pred.merge(
+        gold[["note_idx", "kind", "key"]],
+        on=["note_idx", "kind", "key"],
+        how="left",
+        indicator=True,
+    )
+    joined["tp"] = joined["_merge"] == "both"
+    per_pair = joined.groupby(["pair", "kind"]).agg(
+        n_pred=("key", "size"), tp=("tp", "sum")
+    )
+    n_gold = gold.groupby(["note_idx", "kind"]).size().rename("n_gold")
+
+    grid = pd.MultiIndex.from_product(
+        [pairs["pair"], ["meds", "followups", "procedures"]], names=["pair", "kind"]
+    ).to_frame(index=False)
+    grid = grid.merge(pairs[["pair", "note_idx"]], on="pair")
+    grid = grid.merge(per_pair.reset_index(), on=["pair", "kind"], how="left")
+    grid = grid.merge(n_gold.reset_index(), on=["note_idx", "kind"], how="left")
+    grid[["n_pred", "tp", "n_gold"]] = grid[["n_pred", "tp", "n_gold"]].fillna(0).astype(int)
+    grid["fp"] = grid["n_pred"] - grid["tp"]
+    grid["fn"] = grid["n_gold"] - grid["tp"]
+    return grid[["pair", "kind", "tp", "fp", "fn"]]
+
+
+def _greedy_lab_tp(hard: pd.DataFrame) -> pd.Series:
+    """
+    Exact replay of f1_list's greedy matching for ambiguous (pair, name) groups.
+
+    Rows must be sorted by (pair, name, pos_p, pos_g): each pred takes the first
+    unused matching gold entry. Single pass over plain arrays.
+    """
+    pair = hard["pair"].to_numpy()
+    name = hard["name"].to_numpy()
+    pos_p = hard["pos_p"].to_numpy()
+    pos_g = hard["pos_g"].to_numpy()
+    match = hard["match"].to_numpy()
+    tp = defaultdict(int)
+    group = pred = None
+    used = set()
+    done = False
+    for i in range(len(hard)):
+        g = (pair[i], name[i])
+        if g != group:
+            group, pred, used, done = g, None, set(), False
+        if pos_p[i] != pred:
+            pred, done = pos_p[i], False
+        if done or not match[i] or pos_g[i] in used:
+            continue
+        used.add(pos_g[i])
+        tp[pair[i]] += 1
+        done = True
+    return pd.Series(tp, dtype=int)
+
+
+def _lab_counts(flat: _Flattener, pairs: pd.DataFrame) -> pd.DataFrame:
+    """TP/FP/FN per pair for labs (name join + numeric tolerance, greedy 1:1)."""
+    pred = flat.lab_table("pred").rename(columns={"owner": "pair"})
+    pred = pred.merge(pairs[["pair", "note_idx"]], on="pair")
+    gold = flat.lab_table("gold").rename(columns={"owner": "note_idx"})
+    # f1_list tracks used gold entries by (name, value): duplicates match only once
+    gold = gold.drop_duplicates(["note_idx", "name", "value"], keep="first")
+
+    cand = pred.merge(gold, on=["note_idx", "name"], suffixes=("_p", "_g"))
+    both_num = cand["ok_p"] & cand["ok_g"]
+    diff = (cand["num_p"] - cand["num_g"]).abs()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rel_ok = (cand["num_g"] != 0) & (diff / cand["num_g"].abs() <= 0.05)
+    num_match = (diff <= 1.0) | rel_ok
+    cand["match"] = np.where(both_num, num_match, cand["vtext_p"] == cand["vtext_g"])
+
+    tp = pd.Series(0, index=pairs["pair"], dtype=int)
+    if not cand.empty:
+        grp = cand.groupby(["pair", "name"])
+        n_p = grp["pos_p"].transform("nunique")
+        n_g = grp["pos_g"].transform("nunique")
+        # one pred or one distinct gold value: tp is simply "any candidate matches"
+        simple = (n_p == 1) | (n_g == 1)
+        easy = cand[simple].groupby(["pair", "name"])["match"].any().astype(int)
+        tp_easy = easy.groupby(level="pair").sum()
+        hard = cand[~simple].sort_values(["pair", "name", "pos_p", "pos_g"])
+        tp_hard = _greedy_lab_tp(hard)
+        tp = tp.add(tp_easy, fill_value=0).add(tp_hard, fill_value=0).astype(int)
+
+    n_pred = pd.Series(flat.lab_counts["pred_n"], index=flat.lab_counts["pred_owner"])
+    n_gold = pd.Series(flat.lab_counts["gold_n"], index=flat.lab_counts["gold_owner"])
+    out = pairs[["pair", "note_idx"]].copy()
+    out["kind"] = "labs"
+    out["tp"] = tp.reindex(out["pair"]).to_numpy()
+    out["fp"] = n_pred.reindex(out["pair"]).to_numpy() - out["tp"]
+    out["fn"] = n_gold.reindex(out["note_idx"]).to_numpy() - out["tp"]
+    return out[["pair", "kind", "tp", "fp", "fn"]]
+
+
+def _list_frame(flat: _Flattener, pairs: pd.DataFrame) -> pd.DataFrame:
+    counts = pd.concat([_lab_counts(flat, pairs), _set_counts(flat, pairs)])
+    wide = counts.pivot(index="pair", columns="kind", values=["tp", "fp", "fn"])
+    wide = wide.reindex(pairs["pair"])
+
+    df = pd.DataFrame({"model": pairs["model"].to_numpy(), "note_idx": pairs["note_idx"].to_numpy()})
+    for kind in LIST_KINDS:
+        prec, rec, f1 = _prf(
+            wide[("tp", kind)].to_numpy(),
+            wide[("fp", kind)].to_numpy(),
+            wide[("fn", kind)].to_numpy(),
+        )
+        df[f"{kind}_p"], df[f"{kind}_r"], df[f"{kind}_f1"] = prec, rec, f1
+
+    TP = sum(wide[("tp", k)].to_numpy() for k in LIST_KINDS)
+    FP = sum(wide[("fp", k)].to_numpy() for k in LIST_KINDS)
+    FN = sum(wide[("fn", k)].to_numpy() for k in LIST_KINDS)
+    df["all_lists_p"], df["all_lists_r"], df["all_lists_f1"] = _prf(TP, FP, FN)
+    return df
+
+
+def score_tables(data, gold_consensus):
+    """
+    Per-(note, model) scalar and list score tables, same rows as the loop path.
+    Predictions may be raw extraction dicts or NoteRecords (records.canonicalize_all).
+    """
+    flat = _Flattener()
+    pair_rows = []
+    for note_idx, (note_preds, gold_note_raw) in enumerate(zip(data, gold_consensus)):
+        # the canonicalizer accepts string or dict procedures, like normalize_gold_proc
+        gold_rec = flat.record(gold_note_raw)
+        flat.add("gold", note_idx, gold_rec)
+        for model, pred in note_preds.items():
+            pair = len(pair_rows)
+            pair_rows.append((pair, note_idx, model))
+            pred_rec = flat.record(pred)
+            flat.add("pred", pair, pred_rec)
+            flat.add_scalars(pair, pred_rec, gold_rec)
+
+    pairs = pd.DataFrame(pair_rows, columns=["pair", "note_idx", "model"])
+    if pairs.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    return _scalar_frame(flat, pairs), _list_frame(flat, pairs)
+
+
+def summarize_tables(df_scalar, df_lists):
+    """Per-model means of the score tables, sorted like run_evaluation."""
+    scalar_cols = (
+        [f"{f}_exact" for f in SCALAR_FIELDS]
+        + [f"{f}_soft" for f in SCALAR_FIELDS]
+        + ["scalar_exact_acc", "scalar_soft_acc"]
+    )
+    list_cols = [
+        f"{k}_{m}" for k in LIST_KINDS for m in ("p", "r", "f1")
+    ] + ["all_lists_p", "all_lists_r", "all_lists_f1"]
+    agg_scalar = agg_mean(df_scalar, scalar_cols)
+    agg_lists = agg_mean(df_lists, list_cols)
+    summary = agg_scalar.merge(agg_lists, on="model", how="outer").sort_values(
+        "all_lists_f1", ascending=False
+    )
+    return summary
+
+
+def run_evaluation_columnar(data, gold_consensus):
+    """Drop-in replacement for evaluate_accuracy.run_evaluation."""
+    df_scalar, df_lists = score_tables(data, gold_consensus)
+    return summarize_tables(df_scalar, df_lists)
@@ -1,50 +1,15 @@
-import re
-from collections import Counter, defaultdict
+import json
+import os
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from statistics import median
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List
 
 
-# ---- Normalizers ----
-def ntext(x: Any) -> str:
-    s = "" if x is None else str(x).strip().lower()
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-
-def ndate(x: Any) -> str:
-    if not x:
-        return ""
-    s = str(x).strip()
-    m = re.match(r"^(\d{4})[-/](\d{2})[-/](\d{2})$", s)
-    if m:
-        return f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
-    m = re.match(r"^(\d{2})/(\d{2})/(\d{4})$", s)
-    if m:
-        return f"{m.group(3)}-{m.group(1)}-{m.group(2)}"
-    m = re.match(r"^(\d{2})/(\d{2})$", s)
-    if m:
-        return f"0000-{m.group(1)}-{m.group(2)}"
-    return s  # keep other formats as-is (e.g., "03/01 0600")
-
-
-def ntime(x: Any) -> str:
-    if not x:
-        return ""
-    s = str(x).strip().lower().replace(" ", "")
-    m = re.search(r"(\d{1,2}):(\d{2})(am|pm)", s)
-    if m:
-        h = int(m.group(1))
-        mi = int(m.group(2))
-        ap = m.group(3)
-        if ap == "pm" and h != 12:
-            h += 12
-        if ap == "am" and h == 12:
-            h = 0
-        return f"{h:02d}:{mi:02d}"
-    m = re.search(r"^(\d{1,2}):(\d{2})$", s)
-    if m:
-        return f"{int(m.group(1)):02d}:{int(m.group(2)):02d}"
-    return s
+# ---- Normalizers (shared with evaluation_utils) ----
+from discharge_agent.evaluation.normalizers import ntext, ndate, ntime
+from discharge_agent.evaluation.records import Canonicalizer, NoteRecord
 
 
 # Optional: simple lab synonym map for better merge (extend as needed)
@@ -106,8 +71,25 @@ def majority_value(values: List[str]) -> str:
 
 # ---- Consensus for a single note ----
 def consensus_for_note(note_outputs: Dict[str, Dict], quorum: float = 0.5) -> Dict:
-    models = list(note_outputs.values())
-    mcount = max(1, len(models))
+    canon = Canonicalizer()
+    records = {
+        m: out if isinstance(out, NoteRecord) else canon(out)
+        for m, out in note_outputs.items()
+    }
+    return consensus_for_records(records, quorum=quorum)
+
+
+def consensus_for_records(
+    note_records: Dict[str, NoteRecord], quorum: float = 0.5, n_models: int = None
+) -> Dict:
+    """
+    Consensus over pre-normalized records (see records.canonicalize).
+
+    n_models: ensemble size the quorum is taken over when only some models
+              have answered (online ensemble); defaults to len(note_records).
+    """
+    models = list(note_records.values())
+    mcount = max(1, n_models or len(models))
     need = max(1, int(round(quorum * mcount)))
 
     gold = {
@@ -122,99 +104,75 @@ def consensus_for_note(note_outputs: Dict[str, Dict], quorum: float = 0.5) -> Di
         "most_recent_labs": [],
     }
 
-    # Scalars (majority)
+    # Scalars (majority); records hold ndate/ntext values in SCALAR_FIELDS order
     scalar_fields = [
         "discharge_date",
         "chief_complaint",
         "primary_discharge_diagnosis",
         "discharge_disposition",
     ]
-    for f in scalar_fields:
-        vals = []
-        for out in models:
-            v = out.get(f, "")
-            vals.append(ndate(v) if f == "discharge_date" else ntext(v))
-        gold[f] = majority_value(vals)
+    for i, f in enumerate(scalar_fields):
+        gold[f] = majority_value([rec.scalars[i] for rec in models])
 
     # Labs (per name; numeric -> median; else mode). Require quorum on *name* presence.
-    name_to_vals = defaultdict(list)
-    for out in models:
-        for lab in out.get("most_recent_labs") or []:
-            name = lab.get("name", "")
-            if not name:
+    name_to_labs = defaultdict(list)
+    for rec in models:
+        for lab in rec.labs:
+            if not lab.name:
                 continue
-            value = str(lab.get("value", "")).strip()
-            name_to_vals[name].append(value)
+            name_to_labs[lab.name].append(lab)
 
     labs_consensus = []
-    for name, vals in name_to_vals.items():
-        if len(vals) < need:
+    for name, labs in name_to_labs.items():
+        if len(labs) < need:
             continue
-        # numeric median if possible, else mode
-        nums = []
-        for v in vals:
-            m = re.findall(r"-?\d+\.?\d*", v)
-            nums.append(float(m[0])) if m else None
-        if sum(1 for v in vals if re.search(r"-?\d+\.?\d*", v)) >= need:
+        num_vals = [lab.num for lab in labs if lab.num is not None]
+        if len(num_vals) >= need:
             # enough numeric reports -> median
-            num_vals = [
-                float(re.findall(r"-?\d+\.?\d*", v)[0])
-                for v in vals
-                if re.search(r"-?\d+\.?\d*", v)
-            ]
             val = str(median(num_vals))
         else:
-            val = Counter([ntext(v) for v in vals if v]).most_common(1)[0][0]
+            val = Counter([lab.vtext for lab in labs if lab.value]).most_common(1)[0][0]
         labs_consensus.append({"name": name, "value": val})
     gold["most_recent_labs"] = labs_consensus
 
     # New medications (quorum on exact triple)
     med_counts = Counter()
-    med_example = {}
-    for out in models:
-        for m in (out.get("medication_changes") or {}).get("new_medications") or []:
-            k = meds_key(m)
+    for rec in models:
+        for k in rec.meds:
             med_counts[k] += 1
-            med_example[k] = {"name": k[0], "dose": k[1], "frequency": k[2]}
     gold["medication_changes"]["new_medications"] = [
-        med_example[k] for k, c in med_counts.items() if c >= need
+        {"name": k[0], "dose": k[1], "frequency": k[2]}
+        for k, c in med_counts.items()
+        if c >= need
     ]
 
     # Follow-ups (quorum on tuple)
     fup_counts = Counter()
-    fup_example = {}
-    for out in models:
-        for fu in out.get("follow_up_appointments") or []:
-            k = fup_key(fu)
+    for rec in models:
+        for k in rec.fups:
             fup_counts[k] += 1
-            fup_example[k] = {
-                "provider": k[0],
-                "specialty": k[1],
-                "date": k[2],
-                "time": k[3],
-            }
     gold["follow_up_appointments"] = [
-        fup_example[k] for k, c in fup_counts.items() if c >= need
+        {"provider": k[0], "specialty": k[1], "date": k[2], "time": k[3]}
+        for k, c in fup_counts.items()
+        if c >= need
     ]
 
-    # Procedures (string or dict; quorum on tuple)
+    # Procedures (string or dict; quorum on tuple, last raw spelling wins)
     proc_counts = Counter()
     proc_example = {}
-    for out in models:
-        for p in out.get("procedures_performed") or []:
-            k = proc_key(p)
+    for rec in models:
+        for k, (name, date) in zip(rec.procs, rec.proc_raw):
             proc_counts[k] += 1
-            d = proc_to_dict(p)
-            proc_example[k] = {"name": d["name"], "date": d["date"]}
+            proc_example[k] = {"name": name, "date": date}
     gold["procedures_performed"] = [
         proc_example[k] for k, c in proc_counts.items() if c >= need
     ]
 
     # (optional) Discharge condition: naive union of most common keys/values
     dc_kv = defaultdict(list)
-    for out in models:
-        for k, v in (out.get("discharge_condition") or {}).items():
-            dc_kv[k].append(ntext(v))
+    for rec in models:
+        for k, v in rec.condition:
+            dc_kv[k].append(v)
     gold["discharge_condition"] = {
         k: Counter(vs).most_common(1)[0][0]
         for k, vs in dc_kv.items()
@@ -227,3 +185,81 @@ def consensus_for_note(note_outputs: Dict[str, Dict], quorum: float = 0.5) -> Di
 # ---- Build consensus for all notes ----
 def consensus_gold_all(data: List[Dict[str, Dict]], quorum: float = 0.5) -> List[Dict]:
     return [consensus_for_note(note_models, quorum=quorum) for note_models in data]
+
+
+# ---- Streaming / parallel consensus for large corpora ----
+def iter_note_outputs(path: str) -> Iterator[Dict[str, Dict]]:
+    """Lazily read all_extractions_multiple_providers.jsonl-style input, one note per line."""
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _consensus_chunk(chunk: List[Dict[str, Dict]], quorum: float) -> List[Dict]:
+    return [consensus_for_note(note_models, quorum=quorum) for note_models in chunk]
+
+
+def _chunks(it: Iterable, size: int) -> Iterator[List]:
+    it = iter(it)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def consensus_gold_stream(
+    data: Iterable[Dict[str, Dict]],
+    quorum: float = 0.5,
+    workers: int = None,
+    chunksize: int = 64,
+    max_pending: int = None,
+) -> Iterator[Dict]:
+    """
+    Streaming consensus_gold_all: yields gold records in input order.
+
+    data: any iterable of per-note model outputs (e.g. iter_note_outputs(path)).
+    workers: process pool size (default os.cpu_count(); 0 or 1 runs in-process).
+    chunksize: notes sent to a worker per task.
+    max_pending: chunks in flight (default 2 * workers). Input is only pulled
+                 as results are consumed, so memory stays bounded by
+                 max_pending * chunksize notes regardless of corpus size.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for note_models in data:
+            yield consensus_for_note(note_models, quorum=quorum)
+        return
+
+    max_pending = max_pending or 2 * workers
+    chunks = _chunks(data, chunksize)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in islice(chunks, max_pending):
+            pending.append(pool.submit(_consensus_chunk, chunk, quorum))
+        while pending:
+            done = pending.popleft().result()
+            nxt = next(chunks, None)
+            if nxt is not None:
+                pending.append(pool.submit(_consensus_chunk, nxt, quorum))
+            yield from done
+
+
+def write_consensus_gold(
+    in_path: str,
+    out_path: str,
+    quorum: float = 0.5,
+    workers: int = None,
+    chunksize: int = 64,
+) -> int:
+    """Read model outputs from in_path, stream gold records to out_path (JSONL). Returns count."""
+    n = 0
+    with open(out_path, "w") as f:
+        for gold in consensus_gold_stream(
+            iter_note_outputs(in_path), quorum=quorum, workers=workers, chunksize=chunksize
+        ):
+            f.write(json.dumps(gold) + "\n")
+            n += 1
+    return n
@@ -0,0 +1,209 @@
+"""
+Incremental evaluation store.
+
+Consensus gold and per-(note, model) scores are persisted in a SQLite file,
+keyed by content hashes:
+
+- gold:   hash of the note's model outputs + quorum + SCORER_VERSION
+- scores: hash of (prediction, gold, SCORER_VERSION)
+
+Re-running after adding one provider recomputes consensus per note from the
+cache where the outputs hash is unchanged, and only rescores (note, model)
+pairs whose prediction is new/changed or whose note's gold changed. Rows for
+notes whose gold changed are invalidated for every model of that note.
+
+Usage:
+    store = EvalStore("eval_cache.sqlite")
+    gold = store.consensus_gold_all(data, quorum=0.5)
+    summary = store.run_evaluation(data, gold)
+    store.stats
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+from discharge_agent.evaluation.columnar import score_tables, summarize_tables
+from discharge_agent.evaluation.consensus import consensus_for_note
+from discharge_agent.monitoring.metrics import REGISTRY
+
+# Bump whenever consensus or scoring logic changes: every cached row is then stale.
+SCORER_VERSION = "1"
+
+
+def content_hash(obj) -> str:
+    """Stable hash of a JSON-serializable object (key order independent)."""
+    raw = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EvalStore:
+    def __init__(self, path: str = "eval_cache.sqlite"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS gold (
+                note_key TEXT PRIMARY KEY,
+                inputs_hash TEXT NOT NULL,
+                gold_hash TEXT NOT NULL,
+                gold_json TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS scores (
+                note_key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                score_hash TEXT NOT NULL,
+                scalar_json TEXT NOT NULL,
+                lists_json TEXT NOT NULL,
+                PRIMARY KEY (note_key, model)
+            );
+            """
+        )
+        self.stats = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            "gold_hits": 0,
+            "gold_misses": 0,
+            "gold_changed": 0,
+            "score_hits": 0,
+            "score_misses": 0,
+            "invalidated": 0,
+            "consensus_s": 0.0,
+            "scoring_s": 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
+
+    # ---- Consensus ----
+    def consensus_gold_all(
+        self, data: List[Dict[str, Dict]], quorum: float = 0.5, note_keys=None
+    ) -> List[Dict]:
+        """consensus_gold_all with per-note caching on the hash of the model outputs."""
+        t0 = time.perf_counter()
+        hits0, misses0 = self.stats["gold_hits"], self.stats["gold_misses"]
+        note_keys = note_keys or [str(i) for i in range(len(data))]
+        cached = dict(
+            (k, (ih, gh, gj))
+            for k, ih, gh, gj in self.conn.execute(
+                "SELECT note_key, inputs_hash, gold_hash, gold_json FROM gold"
+            )
+        )
+        gold_all = []
+        for key, note_models in zip(note_keys, data):
+            inputs_hash = content_hash([note_models, quorum, SCORER_VERSION])
+            hit = cached.get(key)
+            if hit and hit[0] == inputs_hash:
+                self.stats["gold_hits"] += 1
+                gold_all.append(json.loads(hit[2]))
+                continue
+            self.stats["gold_misses"] += 1
+            gold = consensus_for_note(note_models, quorum=quorum)
+            gold_hash = content_hash(gold)
+            if hit and hit[1] != gold_hash:
+                # gold moved: every cached score for this note is stale
+                self.stats["gold_changed"] += 1
+                cur = self.conn.execute("DELETE FROM scores WHERE note_key = ?", (key,))
+                self.stats["invalidated"] += cur.rowcount
+            self.conn.execute(
+                "INSERT OR REPLACE INTO gold VALUES (?, ?, ?, ?)",
+                (key, inputs_hash, gold_hash, json.dumps(gold)),
+            )
+            gold_all.append(gold)
+        self.conn.commit()
+        self.stats["consensus_s"] += time.perf_counter() - t0
+        REGISTRY.inc("cache_hits_total", self.stats["gold_hits"] - hits0, cache="eval_gold")
+        REGISTRY.inc(
+            "cache_misses_total", self.stats["gold_misses"] - misses0, cache="eval_gold"
+        )
+        return gold_all
+
+    # ---- Scoring ----
+    def score_tables(self, data, gold_consensus, note_keys=None):
+        """Score tables for all pairs; only new/changed pairs are scored."""
+        t0 = time.perf_counter()
+        hits0, misses0 = self.stats["score_hits"], self.stats["score_misses"]
+        note_keys = note_keys or [str(i) for i in range(len(data))]
+        cached = {
+            (k, m): (h, s, l)
+            for k, m, h, s, l in self.conn.execute(
+                "SELECT note_key, model, score_hash, scalar_json, lists_json FROM scores"
+            )
+        }
+
+        rows = {}
+        todo_data, todo_gold, todo_keys = [], [], []
+        for key, note_preds, gold in zip(note_keys, data, gold_consensus):
+            gold_hash = content_hash(gold)
+            missing = {}
+            for model, pred in note_preds.items():
+                h = content_hash([pred, gold_hash, SCORER_VERSION])
+                hit = cached.get((key, model))
+                if hit and hit[0] == h:
+                    self.stats["score_hits"] += 1
+                    rows[(key, model)] = (json.loads(hit[1]), json.loads(hit[2]))
+                else:
+                    self.stats["score_misses"] += 1
+                    missing[model] = (pred, h)
+            if missing:
+                todo_data.append({m: p for m, (p, _) in missing.items()})
+                todo_gold.append(gold)
+                todo_keys.append((key, {m: h for m, (_, h) in missing.items()}))
+
+        if todo_data:
+            df_s, df_l = score_tables(todo_data, todo_gold)
+            for rec_s, rec_l in zip(
+                df_s.to_dict(orient="records"), df_l.to_dict(orient="records")
+            ):
+                key, hashes = todo_keys[rec_s["note_idx"]]
+                model = rec_s["model"]
+                rows[(key, model)] = (rec_s, rec_l)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)",
+                    (key, model, hashes[model], json.dumps(rec_s), json.dumps(rec_l)),
+                )
+            self.conn.commit()
+
+        # reassemble in loop order so the per-model means are bit-identical
+        scalar_rows, list_rows = [], []
+        for note_idx, (key, note_preds) in enumerate(zip(note_keys, data)):
+            for model in note_preds:
+                s, l = rows[(key, model)]
+                scalar_rows.append(dict(s, note_idx=note_idx))
+                list_rows.append(dict(l, note_idx=note_idx))
+        self.stats["scoring_s"] += time.perf_counter() - t0
+        REGISTRY.inc("cache_hits_total", self.stats["score_hits"] - hits0, cache="eval_scores")
+        REGISTRY.inc(
+            "cache_misses_total", self.stats["score_misses"] - misses0, cache="eval_scores"
+        )
+        return pd.DataFrame(scalar_rows), pd.DataFrame(list_rows)
+
+    def run_evaluation(self, data, gold_consensus, note_keys=None):
+        """Incremental run_evaluation: same summary, only changed pairs rescored."""
+        df_scalar, df_lists = self.score_tables(data, gold_consensus, note_keys)
+        return summarize_tables(df_scalar, df_lists)
+
+    def invalidate(self, note_keys=None, models=None):
+        """Drop cached scores (all, per note and/or per model) and, per note, gold."""
+        where, params = [], []
+        if note_keys is not None:
+            where.append(f"note_key IN ({','.join('?' * len(note_keys))})")
+            params += list(note_keys)
+        if models is not None:
+            where.append(f"model IN ({','.join('?' * len(models))})")
+            params += list(models)
+        clause = (" WHERE " + " AND ".join(where)) if where else ""
+        cur = self.conn.execute("DELETE FROM scores" + clause, params)
+        self.stats["invalidated"] += cur.rowcount
+        if models is None:
+            gclause = (" WHERE " + where[0]) if note_keys is not None else ""
+            self.conn.execute(
+                "DELETE FROM gold" + gclause, list(note_keys) if note_keys else []
+            )
+        self.conn.commit()
@@ -5,10 +5,22 @@ from discharge_agent.evaluation.evaluation_utils import (
     SCALAR_FIELDS,
     agg_mean,
 )
+from discharge_agent.evaluation.columnar import run_evaluation_columnar
 import pandas as pd
 
 
-def run_evaluation(data, gold_consensus):
+def run_evaluation(data, gold_consensus, engine="columnar"):
+    """
+    Per-model accuracy summary against the consensus gold.
+
+    engine: "columnar" (vectorized, default) or "loop" (reference note x model loop).
+    Both return the same DataFrame.
+    """
+    if engine == "columnar":
+        return run_evaluation_columnar(data, gold_consensus)
+    if engine != "loop":
+        raise ValueError(f"unknown engine {engine!r}")
+
     scalar_rows = []
     list_rows = []
 
@@ -1,20 +1,14 @@
 # examples/evaluate_tool_use.py
 import json, time, statistics
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
-import requests
 
-from discharge_agent.tools.labs import flag_labs
-from discharge_agent.tools.followup import followup_gap
-from discharge_agent.tools.umls_client import normalize_terms_to_cui
 from discharge_agent.llm.tool_specs import TOOLS
-from discharge_agent.pipelines.discharge_checker import check_discharge_safety, chat
-from dotenv import load_dotenv
-import os
+from discharge_agent.pipelines.discharge_checker import check_discharge_safety, chat, run_tool
+from discharge_agent.monitoring.metrics import MetricsRegistry
+from discharge_agent.config import env, module_settings
 
-load_dotenv()
-
-API = os.getenv("LLM_API")
-MODEL = os.getenv("MODEL")
+__getattr__ = module_settings(__name__, {"API": "LLM_API", "MODEL": "MODEL"})
 
 
 # Heuristics: simple rules to determine when a tool SHOULD be used
@@ -39,29 +33,20 @@ class ToolLogger:
 
     def runner(self, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
         start = time.perf_counter()
-        ok = True
-        error = None
-        try:
-            if name == "flag_labs":
-                out = flag_labs(**args)
-            elif name == "followup_gap":
-                out = followup_gap(**args)
-            elif name == "umls_normalize":
-                out = normalize_terms_to_cui(**args)
-            else:
-                ok = False
-                out = {"error": f"unknown tool {name}"}
-        except Exception as e:
-            ok = False
-            out, error = {"error": str(e)}, str(e)
+        raw_keys = sorted(list(args.keys())) if isinstance(args, dict) else []
+        info = {}
+        out = run_tool(name, args, info)
         dur_ms = (time.perf_counter() - start) * 1000.0
         self.events.append(
             {
                 "tool": name,
-                "args_keys": sorted(list(args.keys())),
-                "ok": ok,
+                "args_keys": raw_keys,
+                "ok": info["error"] is None,
                 "latency_ms": dur_ms,
-                "error": error,
+                "validation_ms": info["validation_ms"],
+                "coercions": info["coercions"],
+                "arg_errors": info["arg_errors"],
+                "error": info["error"],
             }
         )
         return out
@@ -76,9 +61,11 @@ def build_messages(system_text: str, user_text: str) -> List[Dict[str, str]]:
 
 
 # Summarize tool usage across cases
-def summarize(all_case_logs: List[Dict[str, Any]]):
+def summarize(all_case_logs: List[Dict[str, Any]], wall_s: float = None, workers: int = 1):
     tools = ["flag_labs", "followup_gap", "umls_normalize"]
-    totals = {t: {"should": 0, "used": 0, "ok": 0, "lat": []} for t in tools}
+    totals = {t: {"should": 0, "used": 0, "ok": 0} for t in tools}
+    # per-run latency histograms (the global REGISTRY holds process-wide totals)
+    run_metrics = MetricsRegistry()
 
     for log in all_case_logs:
         should = log["should"]
@@ -93,7 +80,9 @@ def summarize(all_case_logs: List[Dict[str, Any]]):
                     if e["tool"] == t:
                         if e["ok"]:
                             totals[t]["ok"] += 1
-                            totals[t]["lat"].append(e["latency_ms"])
+                            run_metrics.observe("tool", e["latency_ms"], tool=t)
+        if "case_ms" in log:
+            run_metrics.observe("case_e2e", log["case_ms"])
 
     # Print table
     print("\n=== Tool Use Evaluation ===")
@@ -104,21 +93,78 @@ def summarize(all_case_logs: List[Dict[str, Any]]):
         sh = totals[t]["should"]
         us = totals[t]["used"]
         ok = totals[t]["ok"]
-        p50 = statistics.median(totals[t]["lat"]) if totals[t]["lat"] else 0.0
-        p95 = (
-            sorted(totals[t]["lat"])[max(0, int(0.95 * len(totals[t]["lat"])) - 1)]
-            if totals[t]["lat"]
-            else 0.0
-        )
+        lat = run_metrics.histogram("tool", tool=t)
+        p50 = lat.quantile(0.50)
+        p95 = lat.quantile(0.95)
         use_pct = (100.0 * us / sh) if sh else 0.0
         ok_pct = (100.0 * ok / us) if us else 0.0
         print(
             f"{t:<16}{sh:>8}{us:>8}{use_pct:>7.0f}%{ok:>8}{ok_pct:>7.0f}%{p50:>10.1f}{p95:>10.1f}"
         )
 
+    print()
+    if wall_s is not None:
+        n = len(all_case_logs)
+        rate = n / wall_s if wall_s > 0 else 0.0
+        print(f"Cases: {n}, workers: {workers}, wall: {wall_s:.2f}s, {rate:.2f} cases/s")
+    case = run_metrics.histogram("case_e2e")
+    if case.count:
+        print(
+            f"Case latency: p50 {case.quantile(0.5):.0f} ms, "
+            f"p95 {case.quantile(0.95):.0f} ms, p99 {case.quantile(0.99):.0f} ms"
+        )
+
+    # Argument validation overhead and outcomes
+    events = [e for log in all_case_logs for e in log["events"]]
+    val_ms = [e["validation_ms"] for e in events if "validation_ms" in e]
+    if val_ms:
+        coerced = sum(1 for e in events if e.get("coercions"))
+        rejected = sum(1 for e in events if e.get("arg_errors"))
+        print(
+            f"Arg validation: {len(val_ms)} calls, "
+            f"mean {statistics.mean(val_ms) * 1000:.1f} us/call, "
+            f"coerced {coerced}, rejected {rejected}"
+        )
+
+
+# Run one case with its own ToolLogger (safe to call from worker threads)
+def run_case(case: Dict[str, Any], chat_fn, model):
+    messages = build_messages(case["system"], case["user"])
+    result_json = case["result_json"]
+
+    # Heuristic expectations
+    should = {
+        "flag_labs": should_use_flag_labs(result_json),
+        "followup_gap": should_use_followup_gap(result_json),
+        "umls_normalize": should_use_umls(result_json),
+    }
+
+    # Log tool calls
+    tlog = ToolLogger()
+    start = time.perf_counter()
+    result = check_discharge_safety(
+        messages=messages,
+        chat=chat_fn,
+        MODEL=model,
+        TOOLS=TOOLS,
+        tool_runner=tlog.runner,
+    )
+    case_ms = (time.perf_counter() - start) * 1000.0
+    return result, {"events": tlog.events, "should": should, "case_ms": case_ms}
+
 
 # Main tool evaluation pipeline
-def run_tool_eval(eval_path: str):
+def run_tool_eval(eval_path: str, chat_fn=None, model=None, workers: int = 1):
+    """
+    chat_fn: optional chat(payload) -> response; defaults to discharge_checker.chat.
+             Pass Cassette(...).wrap_chat(chat) to record/replay LLM turns.
+    model: defaults to the MODEL env setting.
+    workers: number of cases run concurrently (threads; each case keeps its own log).
+
+    Returns the final answer of every case, in input order.
+    """
+    chat_fn = chat_fn or chat
+    model = model or env("MODEL")
 
     # Load cases
     cases = []
@@ -126,38 +172,23 @@ def run_tool_eval(eval_path: str):
         for line in f:
             cases.append(json.loads(line))
 
-    all_logs = []
-    for i, case in enumerate(cases, 1):
-        system = case["system"]
-        user = case["user"]
-        result_json = case["result_json"]
-        messages = build_messages(system, user)
-
-        # Heuristic expectations
-        should = {
-            "flag_labs": should_use_flag_labs(result_json),
-            "followup_gap": should_use_followup_gap(result_json),
-            "umls_normalize": should_use_umls(result_json),
-        }
-
-        # Log tool calls
-        tlog = ToolLogger()
-        results = []
-        try:
-            result = check_discharge_safety(
-                messages=messages,
-                chat=chat,
-                MODEL=MODEL,
-                TOOLS=TOOLS,
-                tool_runner=tlog.runner,
-            )
-            results.append(result)
-        except NotImplementedError:
-            print("Replace chat() stub with your real API call.")
-            return
-
-        all_logs.append({"events": tlog.events, "should": should})
+    start = time.perf_counter()
+    try:
+        if workers <= 1:
+            outputs = [run_case(case, chat_fn, model) for case in cases]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outputs = list(
+                    pool.map(lambda case: run_case(case, chat_fn, model), cases)
+                )
+    except NotImplementedError:
+        print("Replace chat() stub with your real API call.")
+        return
+    wall_s = time.perf_counter() - start
+
+    results = [result for result, _ in outputs]
+    all_logs = [log for _, log in outputs]
 
     # summarize tool use and print stats
-    summarize(all_logs)
+    summarize(all_logs, wall_s=wall_s, workers=workers)
     return results
@@ -3,55 +3,14 @@ from typing import Any, Dict, List, Tuple
 from collections import Counter, defaultdict
 import pandas as pd
 
-SCALAR_FIELDS = [
-    "discharge_date",
-    "chief_complaint",
-    "primary_discharge_diagnosis",
-    "discharge_disposition",
-]
-
-
-def ntext(x: Any) -> str:
-    s = "" if x is None else str(x).strip().lower()
-    s = re.sub(r"\s+", " ", s)
-    s = s.replace(" ;", ";").replace(" ,", ",")
-    return s
-
-
-def ndate(x: Any) -> str:
-    if not x:
-        return ""
-    s = str(x).strip()
-    m = re.match(r"^(\d{4})[-/](\d{2})[-/](\d{2})$", s)
-    if m:
-        return f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
-    m = re.match(r"^(\d{2})/(\d{2})/(\d{4})$", s)
-    if m:
-        return f"{m.group(3)}-{m.group(1)}-{m.group(2)}"
-    m = re.match(r"^(\d{2})/(\d{2})$", s)
-    if m:
-        return f"0000-{m.group(1)}-{m.group(2)}"
-    return s
-
-
-def ntime(x: Any) -> str:
-    if not x:
-        return ""
-    s = str(x).strip().lower().replace(" ", "")
-    m = re.search(r"(\d{1,2}):(\d{2})(am|pm)", s)
-    if m:
-        h = int(m.group(1))
-        mi = int(m.group(2))
-        ap = m.group(3)
-        if ap == "pm" and h != 12:
-            h += 12
-        if ap == "am" and h == 12:
-            h = 0
-        return f"{h:02d}:{mi:02d}"
-    m = re.search(r"^(\d{1,2}):(\d{2})$", s)
-    if m:
-        return f"{int(m.group(1)):02d}:{int(m.group(2)):02d}"
-    return s
+# Shared normalizers; scoring uses the tidy text form (" ;" / " ," squashed)
+from discharge_agent.evaluation.normalizers import (
+    ndate,
+    ntime,
+    first_number,
+    ntext_tidy as ntext,
+)
+from discharge_agent.evaluation.records import SCALAR_FIELDS
 
 
 def tok_jacc(a: str, b: str) -> float:
@@ -65,10 +24,8 @@ def tok_jacc(a: str, b: str) -> float:
 
 
 def parse_float(s: str):
-    try:
-        return True, float(re.findall(r"-?\d+\.?\d*", str(s))[0])
-    except Exception:
-        return False, float("nan")
+    v = first_number(s)
+    return (False, float("nan")) if v is None else (True, v)
 
 
 def norm_scalar(field, v):
@@ -0,0 +1,70 @@
+import re
+from typing import Any
+
+# Shared by consensus.py and evaluation_utils.py; records.py applies them once
+# per raw extraction so downstream code works on pre-normalized values.
+
+_WS = re.compile(r"\s+")
+_ISO = re.compile(r"^(\d{4})[-/](\d{2})[-/](\d{2})$")
+_US = re.compile(r"^(\d{2})/(\d{2})/(\d{4})$")
+_MD = re.compile(r"^(\d{2})/(\d{2})$")
+_AMPM = re.compile(r"(\d{1,2}):(\d{2})(am|pm)")
+_HM = re.compile(r"^(\d{1,2}):(\d{2})$")
+_NUM = re.compile(r"-?\d+\.?\d*")
+
+
+def ntext(x: Any) -> str:
+    s = "" if x is None else str(x).strip().lower()
+    s = _WS.sub(" ", s)
+    return s
+
+
+def tidy(s: str) -> str:
+    """Scoring form of an already ntext-normalized string."""
+    return s.replace(" ;", ";").replace(" ,", ",")
+
+
+def ntext_tidy(x: Any) -> str:
+    return tidy(ntext(x))
+
+
+def ndate(x: Any) -> str:
+    if not x:
+        return ""
+    s = str(x).strip()
+    m = _ISO.match(s)
+    if m:
+        return f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
+    m = _US.match(s)
+    if m:
+        return f"{m.group(3)}-{m.group(1)}-{m.group(2)}"
+    m = _MD.match(s)
+    if m:
+        return f"0000-{m.group(1)}-{m.group(2)}"
+    return s  # keep other formats as-is (e.g., "03/01 0600")
+
+
+def ntime(x: Any) -> str:
+    if not x:
+        return ""
+    s = str(x).strip().lower().replace(" ", "")
+    m = _AMPM.search(s)
+    if m:
+        h = int(m.group(1))
+        mi = int(m.group(2))
+        ap = m.group(3)
+        if ap == "pm" and h != 12:
+            h += 12
+        if ap == "am" and h == 12:
+            h = 0
+        return f"{h:02d}:{mi:02d}"
+    m = _HM.search(s)
+    if m:
+        return f"{int(m.group(1)):02d}:{int(m.group(2)):02d}"
+    return s
+
+
+def first_number(s: Any):
+    """First numeric token in s as float, or None."""
+    m = _NUM.search(str(s))
+    return float(m.group(0)) if m else None
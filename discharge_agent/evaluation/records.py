@@ -0,0 +1,236 @@
+"""
+Compact, pre-normalized extraction records.
+
+canonicalize() converts one raw extraction dict into a NoteRecord exactly once:
+strings are normalized and interned, lab values are parsed to floats, and the
+set-matching keys for meds/follow-ups/procedures are built up front. Consensus
+(consensus.consensus_for_records) and scoring (columnar engine) both consume
+these records instead of re-running the normalizers on raw dicts.
+
+Two text forms are kept where the consumers differ: consensus votes on ntext
+values, scoring compares ntext_tidy values (" ;" / " ," squashed). When both
+forms are equal they share the same interned object.
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from discharge_agent.evaluation.normalizers import (
+    first_number,
+    ndate,
+    ntext,
+    ntime,
+    tidy,
+)
+
+SCALAR_FIELDS = [
+    "discharge_date",
+    "chief_complaint",
+    "primary_discharge_diagnosis",
+    "discharge_disposition",
+]
+
+
+class LabItem:
+    __slots__ = ("name", "key", "value", "vtext", "vtext_t", "num")
+
+    def __init__(self, name, key, value, vtext, vtext_t, num):
+        self.name = name  # raw name (consensus groups on it)
+        self.key = key  # ntext_tidy(name) (scoring joins on it)
+        self.value = value  # str(value).strip()
+        self.vtext = vtext  # ntext(value)
+        self.vtext_t = vtext_t  # ntext_tidy(value)
+        self.num = num  # first numeric token, or None
+
+
+class NoteRecord:
+    __slots__ = (
+        "scalars",
+        "scalars_t",
+        "labs",
+        "meds",
+        "meds_t",
+        "fups",
+        "fups_t",
+        "procs",
+        "procs_t",
+        "proc_raw",
+        "condition",
+    )
+
+    def __init__(self, **kw):
+        for k in self.__slots__:
+            setattr(self, k, kw[k])
+
+
+def _intern(s):
+    return sys.intern(s) if type(s) is str else s
+
+
+class Canonicalizer:
+    """Builds NoteRecords; memoizes normalizers per distinct raw string."""
+
+    def __init__(self):
+        self._memo = {ntext: {}, ndate: {}, ntime: {}, tidy: {}, first_number: {}}
+
+    def _n(self, fn, x):
+        if type(x) is not str:
+            return _intern(fn(x))
+        memo = self._memo[fn]
+        try:
+            return memo[x]
+        except KeyError:
+            v = memo[x] = _intern(fn(x))
+            return v
+
+    def _pair(self, key):
+        """(ntext key, tidy key); the same tuple when tidy changes nothing."""
+        key = tuple(key)
+        key_t = tuple(self._n(tidy, s) for s in key)
+        return key, (key if key_t == key else key_t)
+
+    def labs(self, items) -> tuple:
+        out = []
+        for x in items or []:
+            name = x.get("name", "")
+            value = _intern(str(x.get("value", "")).strip())
+            vtext = self._n(ntext, value)
+            out.append(
+                LabItem(
+                    name=_intern(name),
+                    key=self._n(tidy, self._n(ntext, name)),
+                    value=value,
+                    vtext=vtext,
+                    vtext_t=self._n(tidy, vtext),
+                    num=self._n(first_number, value),
+                )
+            )
+        return tuple(out)
+
+    def __call__(self, note: Dict[str, Any]) -> NoteRecord:
+        n = self._n
+        scalars = tuple(
+            n(ndate, note.get(f, "")) if f == "discharge_date" else n(ntext, note.get(f, ""))
+            for f in SCALAR_FIELDS
+        )
+        scalars_t = tuple(n(tidy, s) for s in scalars)
+
+        meds, meds_t = [], []
+        for m in (note.get("medication_changes") or {}).get("new_medications") or []:
+            k, kt = self._pair(
+                (
+                    n(ntext, m.get("name", "")),
+                    n(ntext, m.get("dose", "")),
+                    n(ntext, m.get("frequency", "")),
+                )
+            )
+            meds.append(k)
+            meds_t.append(kt)
+
+        fups, fups_t = [], []
+        for fu in note.get("follow_up_appointments") or []:
+            k, kt = self._pair(
+                (
+                    n(ntext, fu.get("provider", "")),
+                    n(ntext, fu.get("specialty", "")),
+                    n(ndate, fu.get("date", "")),
+                    n(ntime, fu.get("time", "")),
+                )
+            )
+            fups.append(k)
+            fups_t.append(kt)
+
+        procs, procs_t, proc_raw = [], [], []
+        for p in note.get("procedures_performed") or []:
+            if isinstance(p, str):
+                name, date = p, ""
+            else:
+                name = p.get("name") or p.get("procedure") or ""
+                date = p.get("date", "")
+            k, kt = self._pair((n(ntext, name), n(ndate, date)))
+            procs.append(k)
+            procs_t.append(kt)
+            proc_raw.append((_intern(name), _intern(date)))
+
+        condition = tuple(
+            (_intern(k), n(ntext, v))
+            for k, v in (note.get("discharge_condition") or {}).items()
+        )
+
+        return NoteRecord(
+            scalars=scalars,
+            scalars_t=scalars if scalars_t == scalars else scalars_t,
+            labs=self.labs(note.get("most_recent_labs")),
+            meds=tuple(meds),
+            meds_t=tuple(meds_t),
+            fups=tuple(fups),
+            fups_t=tuple(fups_t),
+            procs=tuple(procs),
+            procs_t=tuple(procs_t),
+            proc_raw=tuple(proc_raw),
+            condition=condition,
+        )
+
+
+def canonicalize(note: Dict[str, Any], canon: Canonicalizer = None) -> NoteRecord:
+    """Convert one raw extraction dict into a NoteRecord."""
+    return (canon or Canonicalizer())(note)
+
+
+def canonicalize_all(data: List[Dict[str, Dict]]) -> List[Dict[str, NoteRecord]]:
+    """[{model: extraction}] -> [{model: NoteRecord}] sharing one memo."""
+    canon = Canonicalizer()
+    return [{m: canon(out) for m, out in note.items()} for note in data]
+
+
+def benchmark_records(data: List[Dict[str, Dict]], quorum: float = 0.5) -> Dict:
+    """
+    Time and memory per note for consensus + scoring on raw dicts (reference
+    loop) vs on records (canonicalize once, then consensus + columnar scoring).
+    Memory is what each representation keeps alive, measured with tracemalloc.
+    """
+    # local imports: consensus/columnar import this module
+    from discharge_agent.evaluation.consensus import consensus_for_note, consensus_for_records
+    from discharge_agent.evaluation.columnar import run_evaluation_columnar
+    from discharge_agent.evaluation.evaluate_accuracy import run_evaluation
+
+    n = max(1, len(data))
+
+    t0 = time.perf_counter()
+    gold = [consensus_for_note(note, quorum=quorum) for note in data]
+    run_evaluation(data, gold, engine="loop")
+    dict_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    recs = canonicalize_all(data)
+    canon_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    gold_r = [consensus_for_records(note, quorum=quorum) for note in recs]
+    run_evaluation_columnar(recs, gold_r)
+    rec_s = canon_s + time.perf_counter() - t0
+
+    raw = json.dumps(data)
+    tracemalloc.start()
+    parsed = json.loads(raw)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    kept = canonicalize_all(parsed)
+    del parsed
+    rec_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+
+    out = {
+        "notes": len(data),
+        "dict_ms_per_note": 1000.0 * dict_s / n,
+        "records_ms_per_note": 1000.0 * rec_s / n,
+        "canonicalize_ms_per_note": 1000.0 * canon_s / n,
+        "dict_kb_per_note": dict_bytes / 1024.0 / n,
+        "records_kb_per_note": rec_bytes / 1024.0 / n,
+    }
+    print("=== Record format benchmark (per note) ===")
+    for k, v in out.items():
+        print(f"{k:<28}{v:>10.2f}" if isinstance(v, float) else f"{k:<28}{v:>10}")
+    return out
@@ -0,0 +1,208 @@
+"""
+Compact wire schema for extraction output.
+
+Output tokens are the main latency cost on local hardware, and the full
+schema repeats long keys ("primary_discharge_diagnosis", and "name"/"value"/
+"date" on every lab). The compact schema (prompts.get_compact_prompt) uses
+short top-level keys and positional arrays for list items:
+
+    {"dd": "2024-03-18", "dx": "...", "labs": [["WBC", "8.9", "03/18"]], ...}
+
+expand() turns it back into the current dict shape before anything
+downstream (evaluation, discharge agent) sees it. compact() is the inverse.
+expand(compact(x)) == x for any extraction: an item whose keys don't match
+the positional layout exactly is kept as a dict, and expand passes dicts
+and full-length keys through, so a model that falls back to the full
+schema still round-trips.
+
+    compact_ex = CompactExtractor(MedicalDataExtractor(LLMProvider.LOCAL, model="gpt-oss:20b"))
+    compact_ex.extract_clinical_information(note)  # -> full-schema JSON string
+"""
+
+import json
+import time
+from typing import Dict, List
+
+from discharge_agent.extractions.prompts import SCHEMA_KEYS, get_compact_prompt
+
+SHORT_KEYS = {
+    "discharge_date": "dd",
+    "chief_complaint": "cc",
+    "primary_discharge_diagnosis": "dx",
+    "procedures_performed": "px",
+    "discharge_condition": "dc",
+    "discharge_disposition": "dispo",
+    "medication_changes": "meds",
+    "follow_up_appointments": "fu",
+    "most_recent_labs": "labs",
+}
+LONG_KEYS = {v: k for k, v in SHORT_KEYS.items()}
+
+# positional layouts of dict items
+CONDITION_FIELDS = ["mental_status", "consciousness_level", "activity_status"]
+ITEM_FIELDS = {
+    "follow_up_appointments": ["provider", "specialty", "date", "time"],
+    "most_recent_labs": ["name", "value", "date"],
+    "new_medications": ["name", "dose", "frequency"],
+    "dose_changes": ["name", "old_dose", "new_dose", "frequency"],
+}
+MED_KEYS = {"new_medications": "new", "dose_changes": "chg"}
+MED_LONG = {v: k for k, v in MED_KEYS.items()}
+
+
+def _pack(item, fields: List[str]):
+    if isinstance(item, dict) and set(item) == set(fields):
+        return [item[f] for f in fields]
+    return item
+
+
+def _unpack(item, fields: List[str]):
+    if isinstance(item, list):
+        values = list(item) + [""] * (len(fields) - len(item))
+        return dict(zip(fields, values))
+    return item
+
+
+def compact(extraction: Dict) -> Dict:
+    """Full-schema extraction -> compact wire form."""
+    out = {}
+    for key, value in extraction.items():
+        if key == "discharge_condition" and isinstance(value, dict):
+            value = _pack(value, CONDITION_FIELDS)
+        elif key in ("follow_up_appointments", "most_recent_labs") and isinstance(value, list):
+            value = [_pack(x, ITEM_FIELDS[key]) for x in value]
+        elif key == "medication_changes" and isinstance(value, dict) and set(value) <= set(MED_KEYS):
+            value = {
+                MED_KEYS[k]: [_pack(x, ITEM_FIELDS[k]) for x in v] if isinstance(v, list) else v
+                for k, v in value.items()
+            }
+        out[SHORT_KEYS.get(key, key)] = value
+    return out
+
+
+def expand(wire: Dict) -> Dict:
+    """Compact wire form (or full schema, or a mix) -> full-schema extraction."""
+    out = {}
+    for key, value in wire.items():
+        key = LONG_KEYS.get(key, key)
+        if key == "discharge_condition":
+            value = _unpack(value, CONDITION_FIELDS)
+        elif key in ("follow_up_appointments", "most_recent_labs") and isinstance(value, list):
+            value = [_unpack(x, ITEM_FIELDS[key]) for x in value]
+        elif key == "medication_changes" and isinstance(value, dict):
+            meds = {}
+            for k, v in value.items():
+                k = MED_LONG.get(k, k)
+                if k in ITEM_FIELDS and isinstance(v, list):
+                    v = [_unpack(x, ITEM_FIELDS[k]) for x in v]
+                meds[k] = v
+            value = meds
+        out[key] = value
+    # schema order first, like the single-shot answer
+    return {**{k: out[k] for k in SCHEMA_KEYS if k in out}, **out}
+
+
+class CompactExtractor:
+    def __init__(self, extractor):
+        """extractor: MedicalDataExtractor used with the compact prompt"""
+        self.extractor = extractor
+
+    def __getattr__(self, name):
+        return getattr(self.extractor, name)
+
+    @property
+    def last_usage(self):
+        return self.extractor.last_usage
+
+    def extract_clinical_information(self, note: str, temperature: float = 0.1) -> str:
+        raw = self.extractor.complete(
+            self.extractor._get_system_prompt(),
+            get_compact_prompt(note),
+            temperature,
+            stage="extract_compact",
+        )
+        try:
+            wire = json.loads(raw)
+        except ValueError:
+            return raw  # callers retry on invalid JSON as with the full schema
+        if not isinstance(wire, dict):
+            return raw
+        return json.dumps(expand(wire))
+
+
+def _tokens(text: str) -> int:
+    """Rough token count (~4 chars/token), enough to compare the two encodings."""
+    return max(1, len(text) // 4)
+
+
+def wire_savings(data: List[Dict[str, Dict]]) -> Dict:
+    """
+    Offline estimate over existing extractions ({model: extraction} per note):
+    serialized size of full vs compact form, and whether each round-trips.
+    """
+    full = short = lossless = n = 0
+    for note_outputs in data:
+        for extraction in note_outputs.values():
+            wire = compact(extraction)
+            full += _tokens(json.dumps(extraction))
+            short += _tokens(json.dumps(wire))
+            lossless += expand(wire) == extraction
+            n += 1
+    res = {
+        "extractions": n,
+        "full_tokens": full,
+        "compact_tokens": short,
+        "saved_frac": 1 - short / full if full else 0.0,
+        "lossless": lossless,
+    }
+    print("\n=== Compact wire schema (offline) ===")
+    print(
+        f"{n} extractions: ~{full} -> ~{short} output tokens "
+        f"({100 * res['saved_frac']:.0f}% fewer), round-trip exact for {lossless}/{n}"
+    )
+    return res
+
+
+def compare_compact(notes: List[str], extractor, gold_consensus: List[Dict] = None):
+    """
+    Full vs compact schema on the same notes: provider-reported output
+    tokens, per-note latency and run_evaluation accuracy.
+    """
+    import pandas as pd
+
+    compact_ex = CompactExtractor(extractor)
+    rows, data = [], []
+    for i, note in enumerate(notes):
+        outs = {}
+        row = {"note_idx": i}
+        for name, ex in (("full_schema", extractor), ("compact_schema", compact_ex)):
+            start = time.perf_counter()
+            raw = ex.extract_clinical_information(note)
+            row[f"{name}_ms"] = (time.perf_counter() - start) * 1000.0
+            row[f"{name}_tokens_out"] = (ex.last_usage or {}).get("tokens_out") or 0
+            try:
+                outs[name] = json.loads(raw)
+            except ValueError:
+                outs[name] = {}
+        rows.append(row)
+        data.append(outs)
+    df = pd.DataFrame(rows)
+
+    full_tok, short_tok = df["full_schema_tokens_out"].sum(), df["compact_schema_tokens_out"].sum()
+    print("\n=== Full vs compact output schema ===")
+    print(
+        f"Output tokens: {full_tok} -> {short_tok} "
+        f"({100 * (1 - short_tok / full_tok) if full_tok else 0:.0f}% fewer)"
+    )
+    print(
+        f"Per-note latency: full mean {df['full_schema_ms'].mean():.0f} ms, "
+        f"compact mean {df['compact_schema_ms'].mean():.0f} ms"
+    )
+    summary = None
+    if gold_consensus is not None:
+        from discharge_agent.evaluation.evaluate_accuracy import run_evaluation
+
+        summary = run_evaluation(data, gold_consensus[: len(data)])
+        cols = ["model", "scalar_exact_acc", "scalar_soft_acc", "all_lists_f1"]
+        print(summary[cols].to_string(index=False))
+    return df, summary
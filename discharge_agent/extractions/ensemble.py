@@ -0,0 +1,246 @@
+"""
+Online multi-model ensemble extraction.
+
+The offline benchmark runs every model to completion and then calls
+consensus_for_note. EnsembleExtractor fires the same note at all extractors
+concurrently, folds responses into the consensus as they arrive, and returns
+as soon as the consensus is settled, so latency follows the fastest quorum
+instead of the slowest model.
+
+Settled means: at least `need = round(quorum * n_models)` valid responses,
+and for every field `need` of them agree with the current consensus value
+(scalars: same normalized value; labs / new meds / follow-ups / procedures:
+same item set). Lab values (median) and discharge_condition don't gate the
+stop. The quorum is always taken over the full ensemble size, so an item
+needs the same number of votes as offline.
+
+Requests still running at that point are cancelled if not started yet and
+otherwise abandoned (their results are dropped). A model with an abandoned
+request still in flight is skipped for the next note instead of being handed
+another request, so a slow model can't build up a backlog.
+
+    ens = EnsembleExtractor({"gpt_oss": ex1, "mistral": ex2, "sonnet": ex3}, quorum=0.5)
+    out = ens.extract(note)
+    out["consensus"], out["responded"], out["cancelled"], out["latency_ms"]
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List
+
+from discharge_agent.evaluation.consensus import consensus_for_records
+from discharge_agent.evaluation.records import Canonicalizer, NoteRecord
+from discharge_agent.monitoring.metrics import REGISTRY
+
+SET_FIELDS = ("labs", "meds", "fups", "procs")
+
+
+def _item_set(rec: NoteRecord, field: str) -> frozenset:
+    if field == "labs":
+        return frozenset(lab.name for lab in rec.labs if lab.name)
+    return frozenset(getattr(rec, field))
+
+
+class IncrementalConsensus:
+    """Field-level consensus over the responses received so far."""
+
+    def __init__(self, n_models: int, quorum: float = 0.5):
+        self.n_models = n_models
+        self.quorum = quorum
+        self.need = max(1, int(round(quorum * n_models)))
+        self.records: Dict[str, NoteRecord] = {}
+        self.failed = 0
+        self.canon = Canonicalizer()
+
+    @property
+    def pending(self) -> int:
+        return self.n_models - len(self.records) - self.failed
+
+    def add(self, model: str, output: Dict):
+        self.records[model] = self.canon(output)
+
+    def fail(self, model: str):
+        self.failed += 1
+
+    def agreement(self) -> Dict[str, int]:
+        """Per field, how many received responses match the current consensus."""
+        recs = list(self.records.values())
+        out = {}
+        n_scalars = len(recs[0].scalars) if recs else 0
+        for i in range(n_scalars):
+            votes = Counter(r.scalars[i] for r in recs if r.scalars[i])
+            top = votes.most_common(1)[0][1] if votes else len(recs)
+            out[f"scalar_{i}"] = top
+        for field in SET_FIELDS:
+            sets = [_item_set(r, field) for r in recs]
+            counts = Counter(item for s in sets for item in s)
+            gold = frozenset(k for k, c in counts.items() if c >= self.need)
+            out[field] = sum(s == gold for s in sets)
+        return out
+
+    def settled(self) -> bool:
+        if self.pending == 0:
+            return True
+        if len(self.records) < self.need:
+            return False
+        return all(v >= self.need for v in self.agreement().values())
+
+    def gold(self) -> Dict:
+        return consensus_for_records(self.records, self.quorum, n_models=self.n_models)
+
+
+class EnsembleExtractor:
+    def __init__(
+        self,
+        extractors: Dict[str, object],
+        quorum: float = 0.5,
+        timeout: float = None,
+        skip_busy: bool = True,
+    ):
+        """
+        extractors: {model name: MedicalDataExtractor (or anything with
+                    extract_clinical_information(note) -> str)}
+        timeout: seconds to wait for quorum before returning what has arrived
+        skip_busy: don't send a note to a model whose abandoned request from
+                   an earlier note is still running
+        """
+        self.extractors = extractors
+        self.quorum = quorum
+        self.timeout = timeout
+        self.skip_busy = skip_busy
+        self.pool = ThreadPoolExecutor(max_workers=2 * len(extractors))
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _call(self, model: str, note: str):
+        start = time.perf_counter()
+        try:
+            raw = self.extractors[model].extract_clinical_information(note)
+            return json.loads(raw), (time.perf_counter() - start) * 1000.0, None
+        except Exception as e:
+            return None, (time.perf_counter() - start) * 1000.0, repr(e)
+        finally:
+            with self._lock:
+                self._busy.discard(model)
+
+    def extract(self, note: str, wait_all: bool = False) -> Dict:
+        """
+        Consensus extraction for one note.
+
+        wait_all: keep collecting after the consensus settles (for
+                  benchmarking early-stop against the full ensemble); the
+                  returned consensus is still the one at the settle point.
+        """
+        start = time.perf_counter()
+        state = IncrementalConsensus(len(self.extractors), self.quorum)
+        futures, skipped = {}, []
+        for model in self.extractors:
+            with self._lock:
+                if self.skip_busy and model in self._busy:
+                    skipped.append(model)
+                    continue
+                self._busy.add(model)
+            futures[self.pool.submit(self._call, model, note)] = model
+        for model in skipped:
+            state.fail(model)
+
+        outputs, model_ms, failed = {}, {}, {}
+        settled_ms, gold = None, None
+        pending = set(futures)
+        deadline = start + self.timeout if self.timeout else None
+        while pending:
+            left = deadline - time.perf_counter() if deadline else None
+            if left is not None and left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for fut in done:
+                model = futures[fut]
+                parsed, ms, err = fut.result()
+                model_ms[model] = ms
+                if parsed is None:
+                    failed[model] = err or "invalid JSON"
+                    state.fail(model)
+                else:
+                    outputs[model] = parsed
+                    state.add(model, parsed)
+            if settled_ms is None and state.settled():
+                settled_ms = (time.perf_counter() - start) * 1000.0
+                gold = state.gold()
+                responded = list(state.records)
+                if not wait_all:
+                    break
+
+        if settled_ms is None:
+            # timeout or every model answered/failed: use whatever arrived
+            settled_ms = (time.perf_counter() - start) * 1000.0
+            gold = state.gold()
+            responded = list(state.records)
+
+        cancelled = []
+        for fut in pending:
+            if fut.cancel():
+                # never ran, so _call's finally won't free the model
+                with self._lock:
+                    self._busy.discard(futures[fut])
+            cancelled.append(futures[fut])
+        REGISTRY.observe("ensemble_e2e", settled_ms, quorum=self.quorum)
+        REGISTRY.inc("ensemble_cancelled_total", len(cancelled))
+
+        result = {
+            "consensus": gold,
+            "outputs": {m: outputs[m] for m in responded},
+            "responded": responded,
+            "cancelled": cancelled,
+            "skipped": skipped,
+            "failed": failed,
+            "model_ms": model_ms,
+            "latency_ms": settled_ms,
+        }
+        if wait_all:
+            full = IncrementalConsensus(len(self.extractors), self.quorum)
+            for m, out in outputs.items():
+                full.add(m, out)
+            result["all_ms"] = (time.perf_counter() - start) * 1000.0
+            result["full_consensus"] = full.gold()
+        return result
+
+
+def benchmark_ensemble(notes: List[str], ensemble: EnsembleExtractor) -> Dict:
+    """
+    Early-stop vs wait-for-all on the same requests: per-note latency of each
+    and how often the early consensus equals the full one.
+    """
+    rows = []
+    for note in notes:
+        r = ensemble.extract(note, wait_all=True)
+        rows.append(
+            {
+                "early_ms": r["latency_ms"],
+                "all_ms": r["all_ms"],
+                "responded": len(r["responded"]),
+                "same": r["consensus"] == r["full_consensus"],
+            }
+        )
+    n = max(1, len(rows))
+    summary = {
+        "notes": len(rows),
+        "mean_early_ms": sum(r["early_ms"] for r in rows) / n,
+        "mean_all_ms": sum(r["all_ms"] for r in rows) / n,
+        "mean_responded": sum(r["responded"] for r in rows) / n,
+        "identical_consensus": sum(r["same"] for r in rows) / n,
+    }
+    print("\n=== Ensemble early stop ===")
+    print(f"Notes: {summary['notes']}, models: {len(ensemble.extractors)}, quorum: {ensemble.quorum}")
+    print(
+        f"Mean latency: {summary['mean_early_ms']:.0f} ms early stop vs "
+        f"{summary['mean_all_ms']:.0f} ms waiting for all"
+    )
+    print(f"Mean responses used: {summary['mean_responded']:.1f}")
+    print(f"Consensus identical to full ensemble: {100 * summary['identical_consensus']:.0f}%")
+    return summary
@@ -1,25 +1,24 @@
-import requests, json
+import json, time
 from discharge_agent.extractions.prompts import system_prompt, get_user_prompt
 from discharge_agent.llm.llm_utils import MedicalDataExtractor
-import os
-from dotenv import load_dotenv
+from discharge_agent.monitoring.metrics import REGISTRY, MetricsRegistry
+from discharge_agent.config import env, module_settings
 
-load_dotenv()
-
-API = os.getenv("LLM_API")
-MODEL = os.getenv("MODEL")
+__getattr__ = module_settings(__name__, {"API": "LLM_API", "MODEL": "MODEL"})
 
 
 def extract_clinical_information(note):
+    import requests
+
     payload = {
-        "model": MODEL,
+        "model": env("MODEL"),
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": get_user_prompt(note)},
         ],
         "stream": False,
     }
-    r = requests.post(API, json=payload, timeout=120)
+    r = requests.post(env("LLM_API"), json=payload, timeout=120)
     return r.json()["message"]["content"]
 
 
@@ -37,21 +36,35 @@ def run_extraction_with_json_evaluation(
 
     Returns:
         results: list of successfully parsed JSON dicts
-        summary: dict with total, valid, invalid, success rate
+        summary: dict with total, valid, invalid, success rate, latency
+                 percentiles (also recorded in monitoring.metrics.REGISTRY)
+                 and token totals / output tokens per second
     """
     n_total = len(df)
     n_valid = 0
     n_invalid = 0
     results = []
+    labels = {"provider": extractor.provider.value, "model": extractor.model}
+    run_metrics = MetricsRegistry(parent=REGISTRY)
+    tokens_in = tokens_out = 0
+    llm_s = 0.0
 
     for i, row in df.iterrows():
         note = row[text_col]
         success = False
+        note_start = time.perf_counter()
 
         for attempt in range(max_retries):
+            if attempt:
+                run_metrics.inc("retries_total", **labels)
             result = extractor.extract_clinical_information(note)
+            usage = extractor.last_usage or {}
+            tokens_in += usage.get("tokens_in") or 0
+            tokens_out += usage.get("tokens_out") or 0
+            llm_s += (usage.get("wall_ms") or 0.0) / 1000.0
             try:
-                result_json = json.loads(result)
+                with run_metrics.timer("json_parse", **labels):
+                    result_json = json.loads(result)
                 results.append(result_json)
                 n_valid += 1
                 success = True
@@ -59,15 +72,26 @@ def run_extraction_with_json_evaluation(
             except Exception as e:
                 print(f"Note {i} attempt {attempt+1} failed: {e}")
 
+        run_metrics.observe(
+            "note_e2e", (time.perf_counter() - note_start) * 1000.0, **labels
+        )
         if not success:
             n_invalid += 1
 
+    e2e = run_metrics.histogram("note_e2e")
+
     summary = {
         "total": n_total,
         "valid": n_valid,
         "invalid": n_invalid,
         "success_rate": round(100.0 * n_valid / n_total, 1),
         "provider": extractor.provider.value,
+        "retries": int(run_metrics.counter("retries_total")),
+        "note_p50_ms": e2e.quantile(0.50),
+        "note_p95_ms": e2e.quantile(0.95),
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "tokens_per_s": tokens_out / llm_s if llm_s else 0.0,
     }
 
     print(f"\n=== {extractor.provider.value.upper()} Extraction Evaluation ===")
@@ -75,5 +99,14 @@ def run_extraction_with_json_evaluation(
     print(f"Valid JSON: {n_valid}")
     print(f"Invalid JSON (after retries): {n_invalid}")
     print(f"Success rate: {summary['success_rate']}%")
+    print(f"Retries: {summary['retries']}")
+    print(
+        f"Per-note latency: p50 {summary['note_p50_ms']:.0f} ms, "
+        f"p95 {summary['note_p95_ms']:.0f} ms"
+    )
+    print(
+        f"Tokens: {tokens_in} in, {tokens_out} out "
+        f"({summary['tokens_per_s']:.1f} tok/s)"
+    )
 
     return results, summary
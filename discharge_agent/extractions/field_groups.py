@@ -0,0 +1,172 @@
+"""
+Parallel per-field-group extraction.
+
+The single-shot prompt generates the whole nine-field schema in one
+sequential decode. GroupedExtractor splits the schema into independent field
+groups (prompts.FIELD_GROUPS: admin/scalars, medications, follow-ups, labs),
+sends one request per group concurrently over the same note, and merges the
+answers back into the single-shot JSON shape. Per-note latency becomes the
+slowest group's instead of the sum of all fields' decode time (the local
+server must allow parallel requests, e.g. OLLAMA_NUM_PARALLEL >= 4).
+
+GroupedExtractor is a drop-in for MedicalDataExtractor in
+run_extraction_with_json_evaluation and the batch pipeline:
+
+    grouped = GroupedExtractor(MedicalDataExtractor(LLMProvider.LOCAL, model="gpt-oss:20b"))
+    grouped.extract_clinical_information(note)  # -> JSON string
+
+compare_strategies runs both over the same notes and reports per-note
+latency and run_evaluation accuracy against a consensus gold.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pandas as pd
+
+from discharge_agent.extractions.prompts import (
+    FIELD_GROUPS,
+    SCHEMA_KEYS,
+    empty_field,
+    get_group_prompt,
+)
+from discharge_agent.monitoring.metrics import REGISTRY
+
+
+class GroupedExtractor:
+    def __init__(self, extractor, groups: List[str] = None, max_retries: int = 2):
+        """
+        extractor: MedicalDataExtractor used for every group request
+        groups: subset/order of FIELD_GROUPS (default: all)
+        max_retries: attempts per group before falling back to empty fields
+        """
+        self.extractor = extractor
+        self.groups = groups or list(FIELD_GROUPS)
+        self.max_retries = max_retries
+        self.pool = ThreadPoolExecutor(max_workers=len(self.groups))
+        self._tls = threading.local()
+
+    def __getattr__(self, name):
+        # provider, model, ... come from the wrapped extractor
+        return getattr(self.extractor, name)
+
+    @property
+    def last_group_ms(self) -> Dict[str, float]:
+        return getattr(self._tls, "group_ms", {})
+
+    @property
+    def last_usage(self):
+        """This thread's last note: group tokens summed, wall time of the slowest group."""
+        return getattr(self._tls, "usage", None)
+
+    def _run_group(self, note: str, group: str, temperature: float):
+        start = time.perf_counter()
+        keys = FIELD_GROUPS[group]
+        tokens_in = tokens_out = 0
+        fields = None
+        for _ in range(self.max_retries):
+            raw = self.extractor.complete(
+                self.extractor._get_system_prompt(),
+                get_group_prompt(note, group),
+                temperature,
+                stage=f"extract_{group}",
+            )
+            usage = self.extractor.last_usage or {}
+            tokens_in += usage.get("tokens_in") or 0
+            tokens_out += usage.get("tokens_out") or 0
+            try:
+                out = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(out, dict):
+                fields = {k: out[k] if k in out else empty_field(k) for k in keys}
+                break
+        if fields is None:
+            REGISTRY.inc("group_failures_total", group=group)
+            fields = {k: empty_field(k) for k in keys}
+        ms = (time.perf_counter() - start) * 1000.0
+        return fields, ms, tokens_in, tokens_out
+
+    def extract_fields(self, note: str, temperature: float = 0.1) -> Dict:
+        """Merged extraction dict in the single-shot key order."""
+        futures = {
+            g: self.pool.submit(self._run_group, note, g, temperature) for g in self.groups
+        }
+        merged, group_ms = {}, {}
+        tokens_in = tokens_out = 0
+        for g, fut in futures.items():
+            fields, ms, t_in, t_out = fut.result()
+            merged.update(fields)
+            group_ms[g] = ms
+            tokens_in += t_in
+            tokens_out += t_out
+            REGISTRY.observe("field_group", ms, group=g, model=self.extractor.model)
+        self._tls.group_ms = group_ms
+        self._tls.usage = {
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "wall_ms": max(group_ms.values()) if group_ms else 0.0,
+        }
+        return {k: merged[k] for k in SCHEMA_KEYS if k in merged}
+
+    def extract_clinical_information(self, note: str, temperature: float = 0.1) -> str:
+        return json.dumps(self.extract_fields(note, temperature))
+
+
+def compare_strategies(notes: List[str], extractor, gold_consensus: List[Dict] = None):
+    """
+    Single-shot vs grouped extraction on the same notes.
+
+    gold_consensus: per-note gold (e.g. consensus_gold_all over the
+                    multi-provider extractions, in the same note order);
+                    when given, accuracy is scored with run_evaluation.
+
+    Returns (latency DataFrame per note, run_evaluation summary or None).
+    """
+    grouped = GroupedExtractor(extractor)
+    rows, data = [], []
+    for i, note in enumerate(notes):
+        start = time.perf_counter()
+        single_raw = extractor.extract_clinical_information(note)
+        single_ms = (time.perf_counter() - start) * 1000.0
+
+        start = time.perf_counter()
+        grouped_out = grouped.extract_fields(note)
+        grouped_ms = (time.perf_counter() - start) * 1000.0
+
+        try:
+            single_out = json.loads(single_raw)
+        except ValueError:
+            single_out = {}
+        data.append({"single_shot": single_out, "grouped": grouped_out})
+        rows.append(
+            {
+                "note_idx": i,
+                "single_ms": single_ms,
+                "grouped_ms": grouped_ms,
+                "slowest_group": max(grouped.last_group_ms, key=grouped.last_group_ms.get),
+                "speedup": single_ms / grouped_ms if grouped_ms else 0.0,
+            }
+        )
+    latency = pd.DataFrame(rows)
+
+    print("\n=== Single-shot vs field-group extraction ===")
+    print(f"Notes: {len(notes)}, model: {extractor.model}, groups: {grouped.groups}")
+    print(
+        f"Per-note latency: single-shot mean {latency['single_ms'].mean():.0f} ms "
+        f"(p50 {latency['single_ms'].median():.0f}), grouped mean "
+        f"{latency['grouped_ms'].mean():.0f} ms (p50 {latency['grouped_ms'].median():.0f}), "
+        f"speedup {latency['single_ms'].sum() / latency['grouped_ms'].sum():.2f}x"
+    )
+
+    summary = None
+    if gold_consensus is not None:
+        from discharge_agent.evaluation.evaluate_accuracy import run_evaluation
+
+        summary = run_evaluation(data, gold_consensus[: len(data)])
+        cols = ["model", "scalar_exact_acc", "scalar_soft_acc", "all_lists_f1"]
+        print(summary[cols].to_string(index=False))
+    return latency, summary
@@ -1,3 +1,5 @@
+import copy
+
 system_prompt = "You are a clinical data extraction assistant. Extract information exactly as written. Return only valid JSON with no commentary and no markdown formatting."
 
 
@@ -34,3 +36,134 @@ INSTRUCTIONS:
 
 JSON:"""
     )
+
+
+# ---- Partial-schema prompts (field_groups.py, rules.py) ----
+# Per-field slices of the schema above, so a prompt can ask for any subset
+# of fields and the answers can be merged back into the same JSON shape.
+FIELD_SCHEMA = {
+    "discharge_date": '"discharge_date": ""',
+    "chief_complaint": '"chief_complaint": ""',
+    "primary_discharge_diagnosis": '"primary_discharge_diagnosis": ""',
+    "procedures_performed": '"procedures_performed": []',
+    "discharge_condition": '"discharge_condition": {"mental_status": "", "consciousness_level": "", "activity_status": ""}',
+    "discharge_disposition": '"discharge_disposition": ""',
+    "medication_changes": """"medication_changes": {
+    "new_medications": [{"name": "", "dose": "", "frequency": ""}],
+    "dose_changes": [{"name": "", "old_dose": "", "new_dose": "", "frequency": ""}]
+  }""",
+    "follow_up_appointments": '"follow_up_appointments": [{"provider": "", "specialty": "", "date": "", "time": ""}]',
+    "most_recent_labs": '"most_recent_labs": [{"name": "", "value": "", "date": ""}]',
+}
+
+FIELD_INSTRUCTIONS = {
+    "medication_changes": """- For medication_changes:
+  - new_medications: medications started during admission that were NOT on admission list
+  - dose_changes: medications that were on admission list but dose was modified
+""",
+    "most_recent_labs": "- For most_recent_labs: if multiple values reported for same lab, only include the LATEST value\n",
+    "follow_up_appointments": "- For follow_up_appointments: extract provider name, specialty, date and time if available\n",
+}
+
+EMPTY_FIELDS = {
+    "discharge_date": "",
+    "chief_complaint": "",
+    "primary_discharge_diagnosis": "",
+    "procedures_performed": [],
+    "discharge_condition": {},
+    "discharge_disposition": "",
+    "medication_changes": {"new_medications": [], "dose_changes": []},
+    "follow_up_appointments": [],
+    "most_recent_labs": [],
+}
+
+
+def empty_field(key):
+    """A fresh copy of a field's empty value (callers may mutate it)."""
+    return copy.deepcopy(EMPTY_FIELDS[key])
+
+
+# key order of the single-shot schema, used when merging partial answers
+SCHEMA_KEYS = list(FIELD_SCHEMA)
+
+# independent field groups generated concurrently by field_groups.GroupedExtractor
+FIELD_GROUPS = {
+    "admin": [
+        "discharge_date",
+        "chief_complaint",
+        "primary_discharge_diagnosis",
+        "procedures_performed",
+        "discharge_condition",
+        "discharge_disposition",
+    ],
+    "medications": ["medication_changes"],
+    "followups": ["follow_up_appointments"],
+    "labs": ["most_recent_labs"],
+}
+
+
+def get_fields_prompt(note, fields):
+    """get_user_prompt restricted to the given schema fields."""
+    fields = [f for f in SCHEMA_KEYS if f in fields]
+    schema = "{\n  " + ",\n  ".join(FIELD_SCHEMA[f] for f in fields) + "\n}"
+    instructions = "".join(FIELD_INSTRUCTIONS.get(f, "") for f in fields)
+    return (
+        "Extract the following from this discharge summary. Return ONLY JSON:\n\n"
+        + schema
+        + "\n\nINSTRUCTIONS:\n"
+        + instructions
+        + """- DO NOT ADD ANY MARKDOWN FORMATTING (no ```json or ```)
+- RETURN ONLY THE JSON OBJECT
+
+"""
+        + f"""Clinical note: \"\"\"{note}\"\"\"
+
+JSON:"""
+    )
+
+
+def get_group_prompt(note, group):
+    return get_fields_prompt(note, FIELD_GROUPS[group])
+
+
+# ---- Compact wire schema (compact.py) ----
+# Short keys and positional list items; compact.expand turns the answer back
+# into the schema above.
+def get_compact_prompt(note):
+    return (
+        """Extract the following from this discharge summary. Return ONLY JSON, using these short keys:
+
+{
+  "dd": "",
+  "cc": "",
+  "dx": "",
+  "px": [],
+  "dc": ["mental_status", "consciousness_level", "activity_status"],
+  "dispo": "",
+  "meds": {
+    "new": [["name", "dose", "frequency"]],
+    "chg": [["name", "old_dose", "new_dose", "frequency"]]
+  },
+  "fu": [["provider", "specialty", "date", "time"]],
+  "labs": [["name", "value", "date"]]
+}
+
+KEYS: dd = discharge date, cc = chief complaint, dx = primary discharge diagnosis,
+px = procedures performed, dc = discharge condition, dispo = discharge disposition,
+meds = medication changes, fu = follow-up appointments, labs = most recent labs.
+Each list item is an array of values in the order shown; use "" for a missing value.
+
+INSTRUCTIONS:
+- For meds:
+  - new: medications started during admission that were NOT on admission list
+  - chg: medications that were on admission list but dose was modified
+- For labs: if multiple values reported for same lab, only include the LATEST value
+- For fu: extract provider name, specialty, date and time if available
+- DO NOT ADD ANY MARKDOWN FORMATTING (no ```json or ```)
+- RETURN ONLY THE JSON OBJECT
+
+"""
+        + f"""Clinical note: \"\"\"{note}\"\"\"
+
+JSON:"""
+    )
@@ -0,0 +1,198 @@
+"""
+Complexity-aware routing between a fast and a large extraction model.
+
+timings.json shows a ~10x spread between models, while most notes are short
+and regular enough for a small model. ModelRouter scores each note cheaply
+(length, number of lab values, number of medication lines; no model call),
+sends simple notes to the small model and complex ones to the large model,
+and escalates a small-model answer to the large model when it:
+
+- isn't valid JSON (after small_retries attempts) or the call fails
+- fails the consistency check: schema keys missing, a discharge date
+  different from the note header, far fewer labs than the note's
+  "Pertinent Results" lines hold, or no follow-ups when the note lists them
+  (rules.pre_extract supplies the reference values)
+
+    router = ModelRouter(
+        small=MedicalDataExtractor(LLMProvider.LOCAL, model="mistral-small:22b"),
+        large=MedicalDataExtractor(LLMProvider.ANTHROPIC, api_key=..., model="claude-sonnet-4-20250514"),
+    )
+    router.extract_clinical_information(note)   # drop-in for MedicalDataExtractor
+    router.last_route                           # {"route": "small"|"large"|"escalated", ...}
+
+benchmark_router runs small-only, large-only and routed over the same notes
+and reports throughput next to run_evaluation accuracy.
+"""
+
+import json
+import re
+import threading
+import time
+from typing import Dict, List
+
+from discharge_agent.evaluation.normalizers import ndate
+from discharge_agent.extractions.prompts import SCHEMA_KEYS
+from discharge_agent.extractions.rules import HIGH, lab_pairs, pre_extract, sections
+from discharge_agent.monitoring.metrics import REGISTRY
+
+_MED_LINE_RE = re.compile(r"^\d+[.)]\s+\S")
+
+# reference sizes: a note at all three scores 1.0
+REF_CHARS = 3000
+REF_LABS = 20
+REF_MEDS = 10
+
+
+def note_complexity(note: str) -> Dict:
+    """Cheap complexity features and their combined score (mean of the ratios)."""
+    sec = sections(note)
+    labs = len(lab_pairs(note))
+    meds = sum(
+        bool(_MED_LINE_RE.match(line))
+        for name in ("Medications on Admission", "Discharge Medications")
+        for line in sec.get(name, [])
+    )
+    score = (len(note) / REF_CHARS + labs / REF_LABS + meds / REF_MEDS) / 3
+    return {"chars": len(note), "labs": labs, "meds": meds, "score": score}
+
+
+def check_extraction(note: str, out) -> List[str]:
+    """Problems found in an extraction; empty when it looks consistent with the note."""
+    if not isinstance(out, dict):
+        return ["not a JSON object"]
+    problems = [f"missing {k}" for k in SCHEMA_KEYS if k not in out]
+    ruled, conf = pre_extract(note)
+    if conf["discharge_date"] == HIGH and ndate(out.get("discharge_date")) != ruled["discharge_date"]:
+        problems.append("discharge_date differs from note header")
+
+    labs = out.get("most_recent_labs") or []
+    names = {name for name, _ in lab_pairs(note)}
+    if len(names) >= 4 and len(labs) < len(names) / 2:
+        problems.append(f"{len(labs)} labs for {len(names)} lab names in note")
+
+    if ruled.get("follow_up_appointments") and not out.get("follow_up_appointments"):
+        problems.append("no follow-ups but note lists appointments")
+    return problems
+
+
+def _add_usage(total: Dict, usage: Dict) -> Dict:
+    """Sum token counts and wall time of two usage records; other fields from the latest."""
+    if not usage:
+        return dict(total)
+    out = {**total, **usage}
+    for k in ("tokens_in", "tokens_out", "tokens_cached", "wall_ms"):
+        if k in total or k in usage:
+            out[k] = (total.get(k) or 0) + (usage.get(k) or 0)
+    return out
+
+
+class ModelRouter:
+    def __init__(self, small, large, threshold: float = 1.0, small_retries: int = 1, check: bool = True):
+        """
+        small, large: extractors (MedicalDataExtractor or any drop-in)
+        threshold: notes scoring above it go straight to the large model
+        small_retries: small-model attempts before escalating on invalid JSON
+        check: escalate on consistency problems, not just invalid JSON
+        """
+        self.small = small
+        self.large = large
+        self.threshold = threshold
+        self.small_retries = small_retries
+        self.check = check
+        self._tls = threading.local()
+
+    @property
+    def model(self) -> str:
+        return f"{self.small.model}|{self.large.model}"
+
+    @property
+    def provider(self):
+        return self.small.provider
+
+    @property
+    def last_route(self) -> Dict:
+        return getattr(self._tls, "route", None)
+
+    @property
+    def last_usage(self):
+        return getattr(self._tls, "usage", None)
+
+    def _try(self, extractor, note, temperature, attempts):
+        """(parsed output or None, raw text, error, usage summed over attempts)"""
+        raw, err, usage = None, "no attempt", {}
+        for _ in range(max(1, attempts)):
+            try:
+                raw = extractor.extract_clinical_information(note, temperature)
+            except Exception as e:
+                err = repr(e)  # last_usage isn't updated by a failed call
+                continue
+            usage = _add_usage(usage, getattr(extractor, "last_usage", None))
+            try:
+                return json.loads(raw), raw, None, usage
+            except ValueError:
+                err = "invalid JSON"
+        return None, raw, err, usage
+
+    def extract_clinical_information(self, note: str, temperature: float = 0.1) -> str:
+        cx = note_complexity(note)
+        route = {"score": cx["score"], "route": "large", "reason": "complex note"}
+        start = time.perf_counter()
+        if cx["score"] <= self.threshold:
+            out, raw, err, small_usage = self._try(
+                self.small, note, temperature, self.small_retries
+            )
+            problems = [err] if out is None else (check_extraction(note, out) if self.check else [])
+            if not problems:
+                route.update(route="small", reason="", small_ms=(time.perf_counter() - start) * 1000.0)
+                self._finish(route, small_usage)
+                return raw
+            route.update(route="escalated", reason="; ".join(problems))
+            route["small_ms"] = (time.perf_counter() - start) * 1000.0
+            route["small_usage"] = small_usage
+        raw = self.large.extract_clinical_information(note, temperature)
+        # an escalated note pays for both models
+        large_usage = getattr(self.large, "last_usage", None)
+        self._finish(route, _add_usage(route.get("small_usage") or {}, large_usage))
+        return raw
+
+    def _finish(self, route, usage):
+        REGISTRY.inc("router_routes_total", route=route["route"])
+        self._tls.route = route
+        self._tls.usage = usage or None
+
+
+def benchmark_router(notes: List[str], router: ModelRouter, gold_consensus: List[Dict] = None):
+    """
+    Small-only, large-only and routed extraction over the same notes:
+    notes/s, share of notes per route, and run_evaluation accuracy.
+    """
+    import pandas as pd
+
+    strategies = {"small_only": router.small, "large_only": router.large, "routed": router}
+    data = [{} for _ in notes]
+    rows, routes = [], []
+    for name, extractor in strategies.items():
+        start = time.perf_counter()
+        for i, note in enumerate(notes):
+            raw = extractor.extract_clinical_information(note)
+            try:
+                data[i][name] = json.loads(raw)
+            except (TypeError, ValueError):
+                data[i][name] = {}
+            if name == "routed":
+                routes.append(router.last_route["route"])
+        wall_s = time.perf_counter() - start
+        rows.append({"model": name, "wall_s": wall_s, "notes_per_s": len(notes) / wall_s if wall_s else 0.0})
+    report = pd.DataFrame(rows)
+
+    print("\n=== Complexity routing ===")
+    print(f"Notes: {len(notes)}, small: {router.small.model}, large: {router.large.model}, threshold {router.threshold}")
+    print("Routes: " + ", ".join(f"{r} {routes.count(r)}" for r in ("small", "escalated", "large")))
+    if gold_consensus is not None:
+        from discharge_agent.evaluation.evaluate_accuracy import run_evaluation
+
+        summary = run_evaluation(data, gold_consensus[: len(data)])
+        cols = ["model", "scalar_exact_acc", "scalar_soft_acc", "all_lists_f1"]
+        report = report.merge(summary[cols], on="model", how="left")
+    print(report.to_string(index=False))
+    return report
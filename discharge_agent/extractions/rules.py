@@ -0,0 +1,380 @@
+"""
+Rule/regex pre-extractor for the regular parts of a discharge note.
+
+Headers like "Discharge Date:", "Chief Complaint:", "Discharge Disposition:",
+"Discharge Diagnosis: Primary: ...", "Discharge Condition:", the lab lines
+under "Pertinent Results:" and the "Followup Instructions:" block follow the
+same layout in every note, so they can be read without a model.
+
+pre_extract(note) returns the fields it could read and a confidence per field:
+
+    high     the section was found and parsed completely
+    low      the section was found but something in it didn't parse
+    missing  no matching section
+
+HybridExtractor keeps the high-confidence fields and asks the LLM only for the
+rest (prompts.get_fields_prompt), which shrinks output tokens and usually the
+schema part of the prompt. medication_changes needs the admission/discharge
+lists compared semantically and is always left to the LLM.
+
+    hybrid = HybridExtractor(MedicalDataExtractor(LLMProvider.LOCAL, model="gpt-oss:20b"))
+    hybrid.extract_clinical_information(note)  # -> JSON string, same shape
+"""
+
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from discharge_agent.extractions.prompts import (
+    SCHEMA_KEYS,
+    empty_field,
+    get_fields_prompt,
+)
+from discharge_agent.monitoring.metrics import REGISTRY
+
+HIGH, LOW, MISSING = "high", "low", "missing"
+
+_SECTION_RE = re.compile(r"^([A-Z][A-Za-z /]+):[ \t]*(.*)$")
+_DISCHARGE_DATE_RE = re.compile(r"Discharge Date:\s*(\d{4}-\d{2}-\d{2})")
+_PRIMARY_RE = re.compile(r"^\s*Primary:\s*(.+?)\s*$", re.M)
+_CONDITION_RE = {
+    "mental_status": re.compile(r"^\s*Mental Status:\s*(.+?)\s*$", re.M),
+    "consciousness_level": re.compile(r"^\s*Level of Consciousness:\s*(.+?)\s*$", re.M),
+    "activity_status": re.compile(r"^\s*Activity Status:\s*(.+?)\s*$", re.M),
+}
+_LAB_LINE_RE = re.compile(r"^(\d{1,2}/\d{1,2})(?:/\d{2,4})?(?:\s+\d{4})?:\s*(.+)$")
+_LAB_PAIR_RE = re.compile(r"([A-Za-z][A-Za-z0-9]*)\s+(-?\d+(?:\.\d+)?)%?")
+# "BNP 1250 -> BNP 456 (06/08)": the value after the arrow is the latest
+_LAB_TREND_RE = re.compile(
+    r"^([A-Za-z][A-Za-z0-9]*)\s+-?\d+(?:\.\d+)?\s*->\s*(?:\1\s+)?(-?\d+(?:\.\d+)?)\s*\((\d{1,2}/\d{1,2})\)$"
+)
+_FUP_RE = re.compile(
+    r"^(?P<provider>Dr\.?\s[^(]+?)\s*\((?P<specialty>[^)]+)\)\s*[-–]\s*"
+    r"(?P<date>\d{1,2}/\d{1,2}/\d{4})(?:\s+at\s+(?P<time>\d{1,2}:\d{2}\s*[AP]M))?\s*$"
+)
+
+
+def sections(note: str) -> Dict[str, List[str]]:
+    """{header: lines} for 'Header:' blocks; text after the colon is the first line."""
+    out: Dict[str, List[str]] = {}
+    current = None
+    for raw in note.splitlines():
+        line = raw.rstrip()
+        m = _SECTION_RE.match(line.strip()) if line and not line.startswith(" ") else None
+        if m and m.group(1) in _KNOWN_SECTIONS:
+            current = m.group(1)
+            out[current] = [m.group(2).strip()] if m.group(2).strip() else []
+        elif current is not None:
+            out[current].append(line.strip())
+    return {k: [l for l in v if l] for k, v in out.items()}
+
+
+_KNOWN_SECTIONS = {
+    "Chief Complaint",
+    "Major Surgical or Invasive Procedure",
+    "Pertinent Results",
+    "Brief Hospital Course",
+    "Medications on Admission",
+    "Discharge Medications",
+    "Discharge Disposition",
+    "Discharge Diagnosis",
+    "Discharge Condition",
+    "Discharge Instructions",
+    "Followup Instructions",
+    "History of Present Illness",
+    "Past Medical History",
+    "Social History",
+    "Physical Exam",
+}
+
+
+def lab_pairs(note: str) -> List[Tuple[str, str]]:
+    """(name, value) pairs on the date-prefixed "Pertinent Results" lines, in note order."""
+    pairs = []
+    for line in sections(note).get("Pertinent Results", []):
+        m = _LAB_LINE_RE.match(line)
+        if m:
+            pairs.extend(_LAB_PAIR_RE.findall(m.group(2)))
+    return pairs
+
+
+def _labs(lines: List[str]) -> Tuple[List[Dict], str]:
+    latest: Dict[str, Dict] = {}
+    order: List[str] = []
+    complete, seen = True, False
+    for line in lines:
+        m = _LAB_LINE_RE.match(line)
+        if not m:
+            continue  # imaging/echo lines ("CXR 03/15: ...") aren't labs
+        seen = True
+        date, body = m.group(1), m.group(2)
+        trend = _LAB_TREND_RE.match(body)
+        if trend:
+            date, pairs = trend.group(3), [trend.group(1, 2)]
+        else:
+            pairs = _LAB_PAIR_RE.findall(body)
+        if not trend and _LAB_PAIR_RE.sub("", body).strip():
+            complete = False  # free text, arrows, units... let the LLM read it
+        for name, value in pairs:
+            if name not in latest:
+                order.append(name)
+            latest[name] = {"name": name, "value": value, "date": date}
+    if not seen:
+        return [], MISSING
+    return [latest[n] for n in order], HIGH if complete else LOW
+
+
+def _followups(lines: List[str]) -> Tuple[List[Dict], str]:
+    appts, complete = [], True
+    for line in lines:
+        if line.lower().startswith(("phone", "fax", "tel")):
+            continue
+        m = _FUP_RE.match(line)
+        if not m:
+            complete = False
+            continue
+        appts.append(
+            {
+                "provider": m.group("provider").strip(),
+                "specialty": m.group("specialty").strip(),
+                "date": m.group("date"),
+                "time": m.group("time") or "",
+            }
+        )
+    if not appts and complete:
+        return [], MISSING
+    return appts, HIGH if complete else LOW
+
+
+def pre_extract(note: str) -> Tuple[Dict, Dict[str, str]]:
+    """(fields read by rules, {field: high|low|missing}) for every schema field."""
+    sec = sections(note)
+    fields: Dict = {}
+    conf = {k: MISSING for k in SCHEMA_KEYS}
+
+    m = _DISCHARGE_DATE_RE.search(note)
+    if m:
+        fields["discharge_date"], conf["discharge_date"] = m.group(1), HIGH
+
+    cc = sec.get("Chief Complaint")
+    if cc:
+        fields["chief_complaint"] = " ".join(cc)
+        conf["chief_complaint"] = HIGH if len(cc) == 1 else LOW
+
+    dx = sec.get("Discharge Diagnosis")
+    if dx:
+        m = _PRIMARY_RE.search("\n".join(dx))
+        if m:
+            fields["primary_discharge_diagnosis"] = m.group(1)
+            conf["primary_discharge_diagnosis"] = HIGH
+        else:
+            fields["primary_discharge_diagnosis"] = dx[0]
+            conf["primary_discharge_diagnosis"] = HIGH if len(dx) == 1 else LOW
+
+    dispo = sec.get("Discharge Disposition")
+    if dispo:
+        fields["discharge_disposition"] = " ".join(dispo)
+        conf["discharge_disposition"] = HIGH if len(dispo) == 1 else LOW
+
+    cond = sec.get("Discharge Condition")
+    if cond:
+        text = "\n".join(cond)
+        found = {k: r.search(text) for k, r in _CONDITION_RE.items()}
+        fields["discharge_condition"] = {k: m.group(1) for k, m in found.items() if m}
+        conf["discharge_condition"] = HIGH if all(found.values()) else LOW
+
+    procs = sec.get("Major Surgical or Invasive Procedure")
+    if procs is not None and [p.lower() for p in procs] in (["none"], []):
+        fields["procedures_performed"], conf["procedures_performed"] = [], HIGH
+    elif procs:
+        # models add dates and detail from the hospital course: leave to the LLM
+        conf["procedures_performed"] = LOW
+
+    if "Pertinent Results" in sec:
+        labs, c = _labs(sec["Pertinent Results"])
+        if c != MISSING:
+            fields["most_recent_labs"], conf["most_recent_labs"] = labs, c
+
+    if "Followup Instructions" in sec:
+        appts, c = _followups(sec["Followup Instructions"])
+        if c != MISSING:
+            fields["follow_up_appointments"], conf["follow_up_appointments"] = appts, c
+
+    return fields, conf
+
+
+class HybridExtractor:
+    def __init__(self, extractor, accept=(HIGH,)):
+        """
+        extractor: MedicalDataExtractor for the fields rules can't fill
+        accept: confidence levels whose rule values are kept
+        """
+        self.extractor = extractor
+        self.accept = set(accept)
+        self._tls = threading.local()
+
+    def __getattr__(self, name):
+        return getattr(self.extractor, name)
+
+    @property
+    def last_usage(self):
+        return getattr(self._tls, "usage", None)
+
+    @property
+    def last_confidence(self) -> Dict[str, str]:
+        return getattr(self._tls, "confidence", {})
+
+    def _extract(self, note: str, temperature: float):
+        """(merged fields, raw LLM text or None, whether the LLM answer parsed)"""
+        start = time.perf_counter()
+        ruled, conf = pre_extract(note)
+        kept = {k: v for k, v in ruled.items() if conf[k] in self.accept}
+        remaining = [k for k in SCHEMA_KEYS if k not in kept]
+        for k in SCHEMA_KEYS:
+            REGISTRY.inc("rule_fields_total", 1, field=k, source="rules" if k in kept else "llm")
+
+        self._tls.confidence = {k: conf[k] if k in kept else "llm" for k in SCHEMA_KEYS}
+        self._tls.usage = {"tokens_in": 0, "tokens_out": 0}
+        llm, raw, parsed = {}, None, True
+        if remaining:
+            raw = self.extractor.complete(
+                self.extractor._get_system_prompt(),
+                get_fields_prompt(note, remaining),
+                temperature,
+                stage="extract_hybrid",
+            )
+            self._tls.usage = dict(self.extractor.last_usage or {})
+            try:
+                llm = json.loads(raw)
+            except ValueError:
+                llm = None
+            if not isinstance(llm, dict):
+                llm, parsed = {}, False
+        merged = {
+            k: kept[k] if k in kept else llm[k] if k in llm else empty_field(k) for k in SCHEMA_KEYS
+        }
+        self._tls.usage["wall_ms"] = (time.perf_counter() - start) * 1000.0
+        return merged, raw, parsed
+
+    def extract_fields(self, note: str, temperature: float = 0.1) -> Dict:
+        """Merged dict; fields the LLM didn't answer in valid JSON are left empty."""
+        return self._extract(note, temperature)[0]
+
+    def extract_clinical_information(self, note: str, temperature: float = 0.1) -> str:
+        merged, raw, parsed = self._extract(note, temperature)
+        if not parsed:
+            return raw  # callers retry on invalid JSON as with single-shot
+        return json.dumps(merged)
+
+
+def coverage_report(notes: List[str], gold: List[Dict] = None):
+    """
+    Per-field share of notes filled at high/low confidence by rules alone, and
+    (with gold, e.g. the multi-model consensus) how often high-confidence
+    values agree with it after the evaluation normalizers.
+    """
+    import pandas as pd
+
+    from discharge_agent.evaluation.normalizers import ndate, ntext
+    from discharge_agent.evaluation.consensus import fup_key
+
+    def same(field, value, ref):
+        if field == "discharge_date":
+            return ndate(value) == ndate(ref)
+        if field == "most_recent_labs":
+            return {(l["name"], float(l["value"])) for l in value} == {
+                (l["name"], float(l["value"])) for l in ref
+            }
+        if field == "follow_up_appointments":
+            return {fup_key(a) for a in value} == {fup_key(a) for a in ref}
+        if field == "discharge_condition":
+            return {k: ntext(v) for k, v in value.items()} == {
+                k: ntext(v) for k, v in ref.items()
+            }
+        if field == "procedures_performed":
+            return list(value) == list(ref)
+        return ntext(value) == ntext(ref)
+
+    rows = {k: {"field": k, "high": 0, "low": 0, "missing": 0, "agree": 0} for k in SCHEMA_KEYS}
+    start = time.perf_counter()
+    results = [pre_extract(n) for n in notes]
+    rules_ms = (time.perf_counter() - start) * 1000.0 / max(1, len(notes))
+    for i, (fields, conf) in enumerate(results):
+        for k, c in conf.items():
+            rows[k][c] += 1
+            if gold is not None and c == HIGH:
+                try:
+                    ref = gold[i][k] if k in gold[i] else empty_field(k)
+                    rows[k]["agree"] += same(k, fields[k], ref)
+                except (TypeError, ValueError, KeyError):
+                    pass
+    df = pd.DataFrame(rows.values())
+    n = max(1, len(notes))
+    df["coverage"] = df["high"] / n
+    df["agree_when_high"] = (df["agree"] / df["high"]).where(df["high"] > 0)
+    if gold is None:
+        df = df.drop(columns=["agree", "agree_when_high"])
+    print(f"\n=== Rule pre-extraction coverage ({len(notes)} notes, {rules_ms:.2f} ms/note) ===")
+    print(df.to_string(index=False))
+    return df
+
+
+def compare_hybrid(notes: List[str], extractor, gold_consensus: List[Dict] = None):
+    """
+    Single-shot LLM vs hybrid (rules + LLM for the rest) on the same notes:
+    per-note latency, output/input tokens and run_evaluation accuracy.
+    """
+    import pandas as pd
+
+    hybrid = HybridExtractor(extractor)
+    rows, data = [], []
+    for i, note in enumerate(notes):
+        start = time.perf_counter()
+        single_raw = extractor.extract_clinical_information(note)
+        single_ms = (time.perf_counter() - start) * 1000.0
+        single_usage = extractor.last_usage or {}
+
+        start = time.perf_counter()
+        hybrid_out = hybrid.extract_fields(note)
+        hybrid_ms = (time.perf_counter() - start) * 1000.0
+        hybrid_usage = hybrid.last_usage or {}
+
+        try:
+            single_out = json.loads(single_raw)
+        except ValueError:
+            single_out = {}
+        data.append({"single_shot": single_out, "hybrid": hybrid_out})
+        rows.append(
+            {
+                "note_idx": i,
+                "single_ms": single_ms,
+                "hybrid_ms": hybrid_ms,
+                "llm_fields": sum(v == "llm" for v in hybrid.last_confidence.values()),
+                "single_tokens_in": single_usage.get("tokens_in") or 0,
+                "hybrid_tokens_in": hybrid_usage.get("tokens_in") or 0,
+                "single_tokens_out": single_usage.get("tokens_out") or 0,
+                "hybrid_tokens_out": hybrid_usage.get("tokens_out") or 0,
+            }
+        )
+    df = pd.DataFrame(rows)
+    print("\n=== Single-shot vs hybrid (rules + LLM) extraction ===")
+    print(
+        f"Per-note latency: single-shot mean {df['single_ms'].mean():.0f} ms, hybrid mean "
+        f"{df['hybrid_ms'].mean():.0f} ms, speedup "
+        f"{df['single_ms'].sum() / max(df['hybrid_ms'].sum(), 1e-9):.2f}x"
+    )
+    print(
+        f"Fields left to the LLM: {df['llm_fields'].mean():.1f} of {len(SCHEMA_KEYS)} per note; "
+        f"tokens in {df['single_tokens_in'].sum()} -> {df['hybrid_tokens_in'].sum()}, "
+        f"out {df['single_tokens_out'].sum()} -> {df['hybrid_tokens_out'].sum()}"
+    )
+    summary = None
+    if gold_consensus is not None:
+        from discharge_agent.evaluation.evaluate_accuracy import run_evaluation
+
+        summary = run_evaluation(data, gold_consensus[: len(data)])
+        cols = ["model", "scalar_exact_acc", "scalar_soft_acc", "all_lists_f1"]
+        print(summary[cols].to_string(index=False))
+    return df, summary
@@ -0,0 +1,170 @@
+"""
+Record/replay ("cassette") layer for LLM calls.
+
+Wraps discharge_checker.chat and MedicalDataExtractor so evaluation runs can
+be recorded once and replayed offline, deterministically:
+
+    cas = Cassette("data/cassettes/tool_eval.jsonl", mode="record")
+    run_tool_eval(path, chat_fn=cas.wrap_chat(chat))          # live, persisted
+
+    cas = Cassette("data/cassettes/tool_eval.jsonl", mode="replay")
+    run_tool_eval(path, chat_fn=cas.wrap_chat(chat))          # no network
+
+Modes:
+    record  - always call the backend and persist request/response pairs
+    replay  - serve from the cassette only; a miss raises CassetteMiss
+    auto    - replay on hit, record on miss
+
+Requests are keyed by a SHA-256 of the canonical JSON payload. By default the
+content of role="tool" messages is left out of the key, so recorded LLM turns
+still replay after a tool implementation changes (tool-only benchmarking).
+Set ignore_tool_results=False for strict matching.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from discharge_agent.monitoring.metrics import REGISTRY
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def canonical_key(payload: Dict[str, Any], ignore_tool_results: bool = True) -> str:
+    if ignore_tool_results and payload.get("messages"):
+        payload = dict(payload)
+        payload["messages"] = [
+            dict(m, content="") if m.get("role") == "tool" else m
+            for m in payload["messages"]
+        ]
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(
+        self,
+        path: str,
+        mode: str = "auto",
+        simulate_latency: bool = False,
+        latency_scale: float = 1.0,
+        ignore_tool_results: bool = True,
+    ):
+        if mode not in ("record", "replay", "auto"):
+            raise ValueError(f"unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self.latency_scale = latency_scale
+        self.ignore_tool_results = ignore_tool_results
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        e = json.loads(line)
+                        self.entries[e["key"]] = e
+
+    def _append(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.entries[entry["key"]] = entry
+            self.stats["recorded"] += 1
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def call(self, kind: str, payload: Dict[str, Any], fn: Callable[[], Any]) -> Any:
+        """Serve payload from the cassette or call fn() and record the result."""
+        key = canonical_key(dict(payload, _kind=kind), self.ignore_tool_results)
+        with self._lock:
+            entry = self.entries.get(key) if self.mode != "record" else None
+            self.stats["hits" if entry is not None else "misses"] += 1
+        if entry is not None:
+            REGISTRY.inc("cache_hits_total", cache="cassette")
+            if self.simulate_latency:
+                time.sleep(entry.get("latency_s", 0.0) * self.latency_scale)
+            return entry["response"]
+        REGISTRY.inc("cache_misses_total", cache="cassette")
+        if self.mode == "replay":
+            raise CassetteMiss(f"no recorded {kind} response for key {key[:12]}")
+        start = time.perf_counter()
+        response = fn()
+        self._append(
+            {
+                "key": key,
+                "kind": kind,
+                "request": payload,
+                "response": response,
+                "latency_s": time.perf_counter() - start,
+            }
+        )
+        return response
+
+    def wrap_chat(self, chat: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """chat(payload) -> response, recorded/replayed."""
+
+        def cassette_chat(payload):
+            return self.call("chat", payload, lambda: chat(payload))
+
+        return cassette_chat
+
+    def wrap_extractor(self, extractor) -> "CassetteExtractor":
+        return CassetteExtractor(extractor, self)
+
+
+class CassetteExtractor:
+    """
+    MedicalDataExtractor proxy whose extract_clinical_information and
+    complete (used by the grouped, hybrid and compact extractors) go through
+    a cassette.
+    """
+
+    def __init__(self, extractor, cassette: Cassette):
+        self.extractor = extractor
+        self.cassette = cassette
+
+    def __getattr__(self, name):
+        return getattr(self.extractor, name)
+
+    def extract_clinical_information(self, note: str, temperature: float = 0.1) -> str:
+        payload = {
+            "provider": self.extractor.provider.value,
+            "model": self.extractor.model,
+            "system": self.extractor._get_system_prompt(),
+            "user": self.extractor._get_user_prompt(note),
+            "temperature": temperature,
+        }
+        # replayed calls have no usage; don't report the previous call's
+        self.extractor._tls.last = None
+        return self.cassette.call(
+            "extract",
+            payload,
+            lambda: self.extractor.extract_clinical_information(note, temperature),
+        )
+
+    def complete(
+        self, system_prompt: str, user_prompt: str, temperature: float = 0.1, stage: str = None
+    ) -> str:
+        payload = {
+            "provider": self.extractor.provider.value,
+            "model": self.extractor.model,
+            "system": system_prompt,
+            "user": user_prompt,
+            "temperature": temperature,
+            "stage": stage,
+        }
+        self.extractor._tls.last = None
+        return self.cassette.call(
+            "complete",
+            payload,
+            lambda: self.extractor.complete(system_prompt, user_prompt, temperature, stage=stage),
+        )
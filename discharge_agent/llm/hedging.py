@@ -0,0 +1,310 @@
+"""
+Hedged LLM requests.
+
+A call that hasn't finished by a percentile of recent latency (p95 by
+default) is most likely a stalled generation, and waiting on it is what
+drives the p99. A hedged call sends the request to its primary backend, and
+if no valid response has arrived by that point sends a duplicate to a backup
+backend (another Ollama host, or another provider). The first valid response
+wins; the other request is abandoned and its result dropped. A primary that
+fails or returns an invalid response before the hedge delay triggers the
+backup immediately.
+
+Each request of a hedged call runs on its own thread rather than a shared
+pool, so a backup never queues behind other callers' stalled primaries, the
+hedge delay counts from when the primary actually starts, and an abandoned
+request only ties up its own thread until the provider timeout.
+
+The delay tracks a sliding window of primary latencies, so it adapts to the
+model and note size. max_hedge_rate caps the share of calls that hedge,
+which stops a backend that is slow across the board from doubling its own
+load.
+
+    hedged = HedgedExtractor(
+        MedicalDataExtractor(LLMProvider.LOCAL, api_url="http://gpu-a:11434/api/chat", model="gpt-oss:20b"),
+        [MedicalDataExtractor(LLMProvider.LOCAL, api_url="http://gpu-b:11434/api/chat", model="gpt-oss:20b")],
+    )
+    hedged.extract_clinical_information(note)   # drop-in for MedicalDataExtractor
+
+    chat = hedged_chat([make_chat(API_A), make_chat(API_B)])
+    check_discharge_safety(messages, chat, MODEL, TOOLS)
+
+benchmark_hedging runs the same notes with and without hedging and reports
+the hedge rate and p50/p95/p99.
+"""
+
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, List
+
+from discharge_agent.monitoring.metrics import REGISTRY, Histogram
+
+
+class LatencyTracker:
+    """Sliding window of latencies; the hedge delay is a percentile of it."""
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        window: int = 200,
+        min_samples: int = 20,
+        initial_ms: float = 30000.0,
+        min_delay_ms: float = 50.0,
+    ):
+        """
+        initial_ms: delay used until min_samples latencies have been seen
+        min_delay_ms: floor, so a run of very fast calls can't make every call hedge
+        """
+        self.percentile = percentile
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.initial_ms = initial_ms
+        self.min_delay_ms = min_delay_ms
+        self._lock = threading.Lock()
+
+    def record(self, ms: float):
+        with self._lock:
+            self.samples.append(ms)
+
+    def delay_ms(self) -> float:
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return self.initial_ms
+            ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay_ms, ordered[idx])
+
+
+class Hedger:
+    def __init__(
+        self,
+        tracker: LatencyTracker = None,
+        max_hedge_rate: float = 0.2,
+        name: str = "llm",
+    ):
+        """
+        max_hedge_rate: upper bound on hedged / total calls (over the calls
+                        seen so far); past it, calls wait on the primary only
+        name: label on the hedge metrics
+        """
+        self.tracker = tracker or LatencyTracker()
+        self.max_hedge_rate = max_hedge_rate
+        self.name = name
+        self.calls = 0
+        self.hedged = 0
+        self.backup_wins = 0
+        self._lock = threading.Lock()
+
+    def _timed(self, fn, args, primary):
+        start = time.perf_counter()
+        try:
+            return fn(*args), None
+        except Exception as e:
+            return None, e
+        finally:
+            if primary:
+                self.tracker.record((time.perf_counter() - start) * 1000.0)
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            return self.hedged < self.max_hedge_rate * self.calls
+
+    def _start(self, fn, args, tag: str, results: queue.Queue, primary: bool):
+        """Run fn(*args) on a dedicated daemon thread; returns once it has started."""
+        started = threading.Event()
+
+        def run():
+            started.set()
+            out, err = self._timed(fn, args, primary)
+            results.put((tag, out, err))
+
+        threading.Thread(target=run, name=f"hedge-{self.name}-{tag}", daemon=True).start()
+        started.wait()
+
+    def call(self, primary: Callable, backup: Callable, args=(), valid: Callable = None):
+        """
+        primary(*args) with backup(*args) as the hedge; returns the first
+        result for which valid(result) is true. If neither is valid, the
+        primary's result is returned (or its exception raised).
+        """
+        valid = valid or (lambda r: True)
+        with self._lock:
+            self.calls += 1
+        delay = self.tracker.delay_ms() / 1000.0
+        results = queue.Queue()
+        self._start(primary, args, "primary", results, True)
+        hedge_at = time.perf_counter() + delay
+        pending, sent_backup = 1, False
+        can_hedge = backup is not None
+        first = None  # primary's (out, err)
+        winner = None
+
+        while winner is None and pending:
+            timeout = None
+            if not sent_backup and can_hedge:
+                timeout = max(0.0, hedge_at - time.perf_counter())
+            try:
+                tag, out, err = results.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                pending -= 1
+                if tag == "primary":
+                    first = (out, err)
+                if err is None and valid(out):
+                    winner = tag
+                    break
+            if not sent_backup and backup is not None:
+                # primary failed/invalid, or slow past the delay: send the duplicate
+                if first is not None or (can_hedge and self._may_hedge()):
+                    with self._lock:
+                        self.hedged += 1
+                    REGISTRY.inc("hedges_total", kind=self.name)
+                    self._start(backup, args, "backup", results, False)
+                    sent_backup = True
+                    pending += 1
+                else:
+                    can_hedge = False
+
+        if winner is None:
+            out, err = first
+            if err is not None:
+                raise err
+            return out
+        if winner == "backup":
+            with self._lock:
+                self.backup_wins += 1
+            REGISTRY.inc("hedge_wins_total", kind=self.name)
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+                "backup_wins": self.backup_wins,
+                "delay_ms": self.tracker.delay_ms(),
+            }
+
+
+def _valid_json(text) -> bool:
+    try:
+        return isinstance(json.loads(text), dict)
+    except (TypeError, ValueError):
+        return False
+
+
+class HedgedExtractor:
+    def __init__(self, extractor, backups: List, hedger: Hedger = None, **hedger_kwargs):
+        """
+        extractor: primary MedicalDataExtractor
+        backups: extractors tried as hedges, round-robin (other hosts/providers)
+        """
+        self.extractor = extractor
+        self.backups = backups
+        self.hedger = hedger or Hedger(name="extract", **hedger_kwargs)
+        self._next = itertools.count()
+        self._tls = threading.local()
+
+    def __getattr__(self, name):
+        return getattr(self.extractor, name)
+
+    @property
+    def last_usage(self):
+        return getattr(self._tls, "usage", None)
+
+    def _backup(self):
+        if not self.backups:
+            return None
+        return self.backups[next(self._next) % len(self.backups)]
+
+    def complete(
+        self, system_prompt: str, user_prompt: str, temperature: float = 0.1, stage: str = None
+    ) -> str:
+        def run(ex):
+            # usage is thread-local on the extractor: read it in the worker
+            def fn():
+                return ex.complete(system_prompt, user_prompt, temperature, stage=stage), ex.last_usage
+
+            return fn
+
+        backup = self._backup()
+        text, usage = self.hedger.call(
+            run(self.extractor),
+            run(backup) if backup is not None else None,
+            valid=lambda r: _valid_json(r[0]),
+        )
+        self._tls.usage = usage
+        return text
+
+    def extract_clinical_information(self, note: str, temperature: float = 0.1) -> str:
+        return self.complete(
+            self.extractor._get_system_prompt(), self.extractor._get_user_prompt(note), temperature
+        )
+
+
+def hedged_chat(chats: List[Callable], hedger: Hedger = None, **hedger_kwargs) -> Callable:
+    """
+    chat(payload) for check_discharge_safety that hedges chats[0] with the
+    others (round-robin). A response is valid when it carries a message.
+    """
+    hedger = hedger or Hedger(name="agent", **hedger_kwargs)
+    primary, backups = chats[0], chats[1:]
+    counter = itertools.count()
+
+    def valid(resp):
+        return isinstance(resp, dict) and isinstance(resp.get("message"), dict)
+
+    def chat(payload):
+        backup = None
+        if backups:
+            backup = backups[next(counter) % len(backups)]
+        return hedger.call(primary, backup, (payload,), valid)
+
+    chat.hedger = hedger
+    return chat
+
+
+def _quantiles(ms: List[float]) -> dict:
+    hist = Histogram()
+    for v in ms:
+        hist.record(v)
+    return {q: hist.quantile(p) for q, p in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+
+
+def benchmark_hedging(notes: List[str], extractor, backups: List, **hedger_kwargs) -> dict:
+    """
+    Per-note extraction latency without and with hedging over the same notes
+    (notes may repeat to get enough samples for a p99). The unhedged pass
+    seeds the latency window the hedge delay is taken from.
+    """
+    plain = []
+    for note in notes:
+        start = time.perf_counter()
+        extractor.extract_clinical_information(note)
+        plain.append((time.perf_counter() - start) * 1000.0)
+
+    hedged = HedgedExtractor(extractor, backups, **hedger_kwargs)
+    for ms in plain:
+        hedged.hedger.tracker.record(ms)
+    with_hedge = []
+    for note in notes:
+        start = time.perf_counter()
+        hedged.extract_clinical_information(note)
+        with_hedge.append((time.perf_counter() - start) * 1000.0)
+
+    before, after = _quantiles(plain), _quantiles(with_hedge)
+    stats = hedged.hedger.stats()
+    print("\n=== Hedged extraction ===")
+    print(
+        f"Calls: {stats['calls']}, hedged: {stats['hedged']} ({100 * stats['hedge_rate']:.1f}%), "
+        f"backup won: {stats['backup_wins']}, final hedge delay {stats['delay_ms']:.0f} ms"
+    )
+    for q in ("p50", "p95", "p99"):
+        print(f"{q}: {before[q]:.0f} ms -> {after[q]:.0f} ms")
+    return {"plain": before, "hedged": after, **stats}
@@ -1,47 +1,107 @@
-import requests
-import openai
-import anthropic
+import threading
+import time
 from enum import Enum
+from discharge_agent.config import env
 from discharge_agent.extractions.prompts import get_user_prompt, system_prompt
+from discharge_agent.monitoring.metrics import REGISTRY
+from discharge_agent.monitoring.usage import (
+    USAGE,
+    usage_from_anthropic,
+    usage_from_ollama,
+    usage_from_openai,
+)
 
 
 class LLMProvider(Enum):
     LOCAL = "local"
     OPENAI = "openai"
     ANTHROPIC = "anthropic"
+    # local OpenAI-compatible server (vLLM, llama.cpp server, ...) at base_url
+    OPENAI_COMPAT = "openai_compat"
 
 
 class MedicalDataExtractor:
     def __init__(self, provider: LLMProvider, **kwargs):
         self.provider = provider
         self.config = kwargs
+        self.stage = kwargs.get("stage", "extract")
+        self._tls = threading.local()  # per-thread usage of the last call
         self._setup_client()
 
+    @property
+    def last_usage(self):
+        """Usage record of this thread's last call (see monitoring.usage)."""
+        return getattr(self._tls, "last", None)
+
     def _setup_client(self):
         """Initialize the appropriate client based on provider"""
         if self.provider == LLMProvider.LOCAL:
             self.api_url = self.config.get("api_url", "http://localhost:11434/api/chat")
             self.model = self.config.get("model", "gpt-oss")
+            # how long Ollama keeps the model loaded after this request
+            self.keep_alive = self.config.get("keep_alive", env("OLLAMA_KEEP_ALIVE"))
 
         elif self.provider == LLMProvider.OPENAI:
-            self.client = openai.OpenAI(api_key=self.config.get("api_key"))
+            import openai
+
+            self.client = openai.OpenAI(
+                api_key=self.config.get("api_key"), base_url=self.config.get("base_url")
+            )
             self.model = self.config.get("model", "gpt-4")
 
+        elif self.provider == LLMProvider.OPENAI_COMPAT:
+            self.base_url = self.config.get(
+                "base_url", env("OPENAI_COMPAT_BASE_URL") or "http://localhost:8000/v1"
+            ).rstrip("/")
+            self.model = self.config.get("model", "gpt-oss")
+            self.api_key = self.config.get("api_key", env("OPENAI_COMPAT_API_KEY"))
+
         elif self.provider == LLMProvider.ANTHROPIC:
+            import anthropic
+
             self.client = anthropic.Anthropic(api_key=self.config.get("api_key"))
             self.model = self.config.get("model", "claude-3-5-sonnet-20241022")
 
     def extract_clinical_information(self, note: str, temperature: float = 0.1) -> str:
         """Extract clinical information using the configured provider"""
-        system_prompt = self._get_system_prompt()
-        user_prompt = self._get_user_prompt(note)
+        return self.complete(
+            self._get_system_prompt(), self._get_user_prompt(note), temperature
+        )
 
-        if self.provider == LLMProvider.LOCAL:
-            return self._extract_local(system_prompt, user_prompt, temperature)
-        elif self.provider == LLMProvider.OPENAI:
-            return self._extract_openai(system_prompt, user_prompt, temperature)
-        elif self.provider == LLMProvider.ANTHROPIC:
-            return self._extract_anthropic(system_prompt, user_prompt, temperature)
+    def complete(
+        self, system_prompt: str, user_prompt: str, temperature: float = 0.1, stage: str = None
+    ) -> str:
+        """
+        One system + user completion on the configured provider, with metrics
+        and a usage record (stage defaults to the extractor's stage).
+        """
+        stage = stage or self.stage
+        labels = {"provider": self.provider.value, "model": self.model, "kind": "extract"}
+        self._tls.usage = None
+        start = time.perf_counter()
+        try:
+            with REGISTRY.timer("llm_call", **labels):
+                if self.provider == LLMProvider.LOCAL:
+                    text = self._extract_local(system_prompt, user_prompt, temperature)
+                elif self.provider == LLMProvider.OPENAI:
+                    text = self._extract_openai(system_prompt, user_prompt, temperature)
+                elif self.provider == LLMProvider.OPENAI_COMPAT:
+                    text = self._extract_openai_compat(system_prompt, user_prompt, temperature)
+                elif self.provider == LLMProvider.ANTHROPIC:
+                    text = self._extract_anthropic(
+                        system_prompt, user_prompt, temperature
+                    )
+        except Exception:
+            REGISTRY.inc("llm_errors_total", **labels)
+            raise
+        self._tls.last = USAGE.record(
+            self.provider.value,
+            self.model,
+            stage,
+            (time.perf_counter() - start) * 1000.0,
+            self._tls.usage or {},
+        )
+        return text
 
     def _extract_local(
         self, system_prompt: str, user_prompt: str, temperature: float
@@ -56,8 +116,14 @@ class MedicalDataExtractor:
             "stream": False,
             # "options": {"temperature": temperature}
         }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        import requests
+
         r = requests.post(self.api_url, json=payload, timeout=120)
-        return r.json()["message"]["content"]
+        data = r.json()
+        self._tls.usage = usage_from_ollama(data)
+        return data["message"]["content"]
 
     def _extract_openai(
         self, system_prompt: str, user_prompt: str, temperature: float
@@ -72,8 +138,31 @@ class MedicalDataExtractor:
             # temperature=temperature,
             # max_completion_tokens=1500
         )
+        self._tls.usage = usage_from_openai(getattr(response, "usage", None))
         return response.choices[0].message.content
 
+    def _extract_openai_compat(
+        self, system_prompt: str, user_prompt: str, temperature: float
+    ) -> str:
+        """/v1/chat/completions on a local server, without the openai SDK"""
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "stream": False,
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        import requests
+
+        url = f"{self.base_url}/chat/completions"
+        r = requests.post(url, json=payload, headers=headers, timeout=120)
+        r.raise_for_status()
+        data = r.json()
+        self._tls.usage = usage_from_openai(data.get("usage"))
+        return data["choices"][0]["message"]["content"] or ""
+
     def _extract_anthropic(
         self, system_prompt: str, user_prompt: str, temperature: float
     ) -> str:
@@ -85,6 +174,7 @@ class MedicalDataExtractor:
             system=system_prompt,
             messages=[{"role": "user", "content": user_prompt}],
         )
+        self._tls.usage = usage_from_anthropic(getattr(response, "usage", None))
         return response.content[0].text
 
     def _get_system_prompt(self) -> str:
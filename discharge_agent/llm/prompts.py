@@ -1,5 +1,9 @@
 import json
 
+# Bump whenever get_messages (or the tool specs it relies on) changes in a way
+# that can change decisions: cached discharge decisions are keyed on it.
+PROMPT_VERSION = "1"
+
 
 def get_messages(result_json):
     SYSTEM = """
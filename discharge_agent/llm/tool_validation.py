@@ -0,0 +1,154 @@
+import json
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from discharge_agent.llm.tool_specs import TOOLS
+
+# A validator takes the raw `arguments` the model sent and returns
+# (clean_args, coercions, errors). clean_args is only safe to splat into the
+# tool when errors is empty.
+Validator = Callable[[Any], Tuple[Dict[str, Any], List[str], List[str]]]
+
+_PY_TYPES = {
+    "string": str,
+    "array": list,
+    "object": dict,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+}
+
+
+def _type_name(x: Any) -> str:
+    return type(x).__name__
+
+
+def _maybe_json(x: Any) -> Any:
+    """Decode a JSON-encoded string, otherwise return the input unchanged."""
+    if isinstance(x, str):
+        s = x.strip()
+        if s[:1] in ("[", "{", '"'):
+            try:
+                return json.loads(s)
+            except ValueError:
+                pass
+    return x
+
+
+def _compile_value(path: str, schema: Dict[str, Any]):
+    """Build a checker (value, coercions, errors) -> value for one schema node."""
+    typ = schema.get("type")
+    items = schema.get("items") if typ == "array" else None
+    item_check = _compile_value(f"{path}[]", items) if items else None
+
+    def check(v, coercions, errors):
+        if typ == "array":
+            decoded = _maybe_json(v)
+            if decoded is not v:
+                coercions.append(f"{path}: decoded JSON string")
+                v = decoded
+            if isinstance(v, (dict, str)) and not isinstance(v, list):
+                # a single object (or term) where a list was expected
+                coercions.append(f"{path}: wrapped single {_type_name(v)} in list")
+                v = [v]
+            if not isinstance(v, list):
+                errors.append(f"{path}: expected array, got {_type_name(v)}")
+                return v
+            if item_check is not None:
+                v = [item_check(x, coercions, errors) for x in v]
+            return v
+
+        if typ == "object":
+            decoded = _maybe_json(v)
+            if decoded is not v:
+                coercions.append(f"{path}: decoded JSON string")
+                v = decoded
+            if not isinstance(v, dict):
+                errors.append(f"{path}: expected object, got {_type_name(v)}")
+            return v
+
+        if typ == "string":
+            if isinstance(v, list) and len(v) == 1 and isinstance(v[0], str):
+                coercions.append(f"{path}: unwrapped single-item list")
+                return v[0]
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                coercions.append(f"{path}: converted {_type_name(v)} to string")
+                return str(v)
+            if not isinstance(v, str):
+                errors.append(f"{path}: expected string, got {_type_name(v)}")
+            return v
+
+        expected = _PY_TYPES.get(typ)
+        if expected is not None and not isinstance(v, expected):
+            errors.append(f"{path}: expected {typ}, got {_type_name(v)}")
+        return v
+
+    return check
+
+
+def _compile_tool(spec: Dict[str, Any]) -> Validator:
+    fn = spec["function"]
+    name = fn["name"]
+    params = fn.get("parameters") or {}
+    props = params.get("properties") or {}
+    required = list(params.get("required") or [])
+    checks = {k: _compile_value(f"{name}.{k}", s) for k, s in props.items()}
+
+    def validate(raw):
+        coercions: List[str] = []
+        errors: List[str] = []
+        args = raw if raw is not None else {}
+        decoded = _maybe_json(args)
+        if decoded is not args:
+            coercions.append(f"{name}: decoded JSON-encoded arguments")
+            args = decoded
+        if not isinstance(args, dict):
+            return {}, coercions, [f"{name}: arguments must be an object, got {_type_name(args)}"]
+
+        clean = {}
+        for k, v in args.items():
+            if k not in checks:
+                coercions.append(f"{name}: dropped unexpected argument '{k}'")
+                continue
+            clean[k] = checks[k](v, coercions, errors)
+        for k in required:
+            if k not in clean or clean[k] is None:
+                errors.append(f"{name}: missing required argument '{k}'")
+        return clean, coercions, errors
+
+    return validate
+
+
+def compile_validators(tools: List[Dict[str, Any]] = TOOLS) -> Dict[str, Validator]:
+    """Compile one validator per tool from the JSON schemas in TOOLS."""
+    return {t["function"]["name"]: _compile_tool(t) for t in tools}
+
+
+VALIDATORS = compile_validators()
+
+
+def validate_tool_args(name: str, args: Any, validators: Dict[str, Validator] = None):
+    """
+    Validate and coerce the arguments of a tool call.
+
+    Returns (clean_args, coercions, errors, elapsed_ms). Unknown tool names are
+    passed through untouched so the caller can report them as before.
+    """
+    validators = VALIDATORS if validators is None else validators
+    start = time.perf_counter()
+    validator = validators.get(name)
+    if validator is None:
+        clean, coercions, errors = (args or {}), [], []
+    else:
+        clean, coercions, errors = validator(args)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    return clean, coercions, errors, elapsed_ms
+
+
+def validation_error(name: str, errors: List[str]) -> Dict[str, Any]:
+    """Tool result returned to the model instead of raising a TypeError."""
+    return {
+        "error": f"invalid arguments for {name}",
+        "details": errors,
+        "hint": "Fix the arguments to match the tool schema and call the tool again.",
+    }
@@ -0,0 +1,181 @@
+"""
+Warm-up and keep-alive for local (Ollama) models.
+
+A cold model pays its full load (several seconds for gpt-oss:20b or
+mistral-small:22b) on the first request, and Ollama unloads a model after
+5 idle minutes by default, so bursty batch jobs keep paying it. warm_up
+loads the configured models before the first note, and each request then
+sends keep_alive (MedicalDataExtractor(keep_alive=...), make_chat(keep_alive=...),
+or OLLAMA_KEEP_ALIVE) so the model stays resident between bursts.
+
+With prime=True, each model also answers a one-token request carrying the
+static extraction system prompt, so that prefix is already in the KV cache
+when the first note arrives.
+
+    warm_up(["gpt-oss:20b", "mistral-small:22b"], "http://localhost:11434/api/chat", keep_alive="30m")
+    measure_cold_warm(MedicalDataExtractor(LLMProvider.LOCAL, model="gpt-oss:20b"), note)
+
+Every Ollama call is classified as cold or warm from its reported
+load_duration (monitoring.usage.COLD_LOAD_MS). The llm_call_cold and
+llm_call_warm histograms keep the two latency populations apart, and
+model_load records the load times.
+"""
+
+import re
+import time
+from typing import Dict, List
+
+from discharge_agent.extractions.prompts import system_prompt
+from discharge_agent.monitoring.metrics import REGISTRY
+from discharge_agent.monitoring.usage import USAGE, usage_from_ollama
+
+DEFAULT_KEEP_ALIVE = "30m"
+
+PRIME_PROMPT = "Reply with {}."
+
+
+def ollama_base(api_url: str) -> str:
+    """'http://host:11434/api/chat' -> 'http://host:11434'."""
+    return re.sub(r"/api/(chat|generate)/?$", "", api_url.rstrip("/"))
+
+
+def parse_keep_alive(value) -> float:
+    """Ollama keep_alive ('30m', '1h', '45s', 300, -1) -> seconds (inf = forever)."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    m = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*", str(value))
+    if not m:
+        raise ValueError(f"invalid keep_alive {value!r}")
+    n = float(m.group(1))
+    if n < 0:
+        return float("inf")
+    return n * {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[m.group(2)]
+
+
+def preload(model: str, api_url: str, keep_alive=DEFAULT_KEEP_ALIVE, timeout: int = 600) -> Dict:
+    """Load a model without generating (empty /api/generate request)."""
+    import requests
+
+    start = time.perf_counter()
+    r = requests.post(
+        ollama_base(api_url) + "/api/generate",
+        json={"model": model, "keep_alive": keep_alive},
+        timeout=timeout,
+    )
+    r.raise_for_status()
+    data = r.json()
+    load_ns = data.get("load_duration")
+    return {
+        "model": model,
+        "wall_ms": (time.perf_counter() - start) * 1000.0,
+        "load_ms": load_ns / 1e6 if load_ns is not None else None,
+    }
+
+
+def unload(model: str, api_url: str, timeout: int = 60):
+    """Ask Ollama to unload a model now (keep_alive=0)."""
+    import requests
+
+    r = requests.post(
+        ollama_base(api_url) + "/api/generate",
+        json={"model": model, "keep_alive": 0},
+        timeout=timeout,
+    )
+    r.raise_for_status()
+
+
+def loaded_models(api_url: str, timeout: int = 10) -> List[str]:
+    """Models currently resident (GET /api/ps)."""
+    import requests
+
+    r = requests.get(ollama_base(api_url) + "/api/ps", timeout=timeout)
+    r.raise_for_status()
+    return [m.get("name") or m.get("model") for m in r.json().get("models", [])]
+
+
+def prime(
+    model: str,
+    api_url: str,
+    keep_alive=DEFAULT_KEEP_ALIVE,
+    system: str = system_prompt,
+    timeout: int = 600,
+) -> Dict:
+    """One-token chat with the static system prompt, to get it into the KV cache."""
+    import requests
+
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": PRIME_PROMPT},
+        ],
+        "stream": False,
+        "keep_alive": keep_alive,
+        "options": {"num_predict": 1},
+    }
+    start = time.perf_counter()
+    r = requests.post(ollama_base(api_url) + "/api/chat", json=payload, timeout=timeout)
+    r.raise_for_status()
+    wall_ms = (time.perf_counter() - start) * 1000.0
+    return USAGE.record("local", model, "warmup", wall_ms, usage_from_ollama(r.json()))
+
+
+def warm_up(
+    models: List[str],
+    api_url: str,
+    keep_alive=DEFAULT_KEEP_ALIVE,
+    prime_prompt: bool = True,
+    system: str = system_prompt,
+) -> List[Dict]:
+    """
+    Preload (and optionally prime) each model; a model that fails to load is
+    reported and skipped rather than aborting the run.
+    """
+    results = []
+    for model in models:
+        try:
+            res = preload(model, api_url, keep_alive)
+            if prime_prompt:
+                res["prime_ms"] = prime(model, api_url, keep_alive, system)["wall_ms"]
+            res["error"] = None
+        except Exception as e:
+            res = {"model": model, "error": repr(e)}
+        REGISTRY.inc("warmups_total", model=model, ok=res["error"] is None)
+        results.append(res)
+
+    print("\n=== Model warm-up ===")
+    for res in results:
+        if res["error"]:
+            print(f"{res['model']}: FAILED {res['error']}")
+            continue
+        load = f"{res['load_ms']:.0f} ms load" if res.get("load_ms") is not None else "loaded"
+        primed = f", primed in {res['prime_ms']:.0f} ms" if "prime_ms" in res else ""
+        print(f"{res['model']}: {load} ({res['wall_ms']:.0f} ms wall){primed}, keep_alive={keep_alive}")
+    return results
+
+
+def measure_cold_warm(extractor, note: str, warm_runs: int = 3) -> Dict:
+    """
+    Latency of the first call after unloading the model vs the next calls.
+    extractor: LOCAL MedicalDataExtractor.
+    """
+    unload(extractor.model, extractor.api_url)
+    start = time.perf_counter()
+    extractor.extract_clinical_information(note)
+    cold_ms = (time.perf_counter() - start) * 1000.0
+    cold_load = (extractor.last_usage or {}).get("load_ms")
+
+    warm = []
+    for _ in range(warm_runs):
+        start = time.perf_counter()
+        extractor.extract_clinical_information(note)
+        warm.append((time.perf_counter() - start) * 1000.0)
+    warm_ms = sum(warm) / len(warm)
+
+    print("\n=== Cold vs warm ===")
+    print(f"Model: {extractor.model}")
+    print(f"Cold: {cold_ms:.0f} ms (load {cold_load or 0:.0f} ms)")
+    print(f"Warm: {warm_ms:.0f} ms mean over {warm_runs} calls")
+    return {"model": extractor.model, "cold_ms": cold_ms, "cold_load_ms": cold_load, "warm_ms": warm_ms}
@@ -0,0 +1,266 @@
+"""
+Pipeline-wide latency and counter metrics.
+
+Stages recorded by the pipeline (histograms, milliseconds):
+    llm_call      one provider request (labels: provider, model, kind)
+    ttft          time to first token when the provider reports or streams it
+    llm_call_cold / llm_call_warm
+                  Ollama calls that did / didn't load the model (monitoring.usage)
+    model_load    model load time reported by Ollama on cold calls
+    tool          one tool execution (labels: tool)
+    tool_validation
+                  validating/coercing one tool call's arguments (labels: tool)
+    json_parse    parsing/repairing one extraction response
+    note_e2e      end-to-end extraction of one note, retries included
+    service_queue_wait / service_e2e
+                  queueing and total time of a pipelines.service request
+
+Counters:
+    retries_total, llm_errors_total, tool_errors_total, tokens_in_total, tokens_out_total,
+    tokens_cached_total (token counters are fed by monitoring.usage.USAGE),
+    cache_hits_total / cache_misses_total (labels: cache; e.g. eval_gold, discharge_decision)
+    hedges_total / hedge_wins_total (labels: kind; see llm.hedging)
+    cold_starts_total, warmups_total (see llm.warmup)
+    incremental_checks_total, llm_calls_avoided_total, tool_calls_avoided_total
+                  (see pipelines.incremental)
+    service_requests_total, service_rejected_total, service_batches_total,
+    service_batched_jobs_total (see pipelines.service)
+
+Histograms are HDR-style: log2 exponent buckets split into linear
+sub-buckets, so quantiles carry a bounded relative error (~1/SUB_BUCKETS)
+with constant memory, instead of sorting raw samples.
+
+    from discharge_agent.monitoring.metrics import REGISTRY
+    with REGISTRY.timer("llm_call", provider="local", model="gpt-oss"):
+        ...
+    print(REGISTRY.to_prometheus())
+    REGISTRY.write_json("metrics.json")
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+SUB_BUCKETS = 64  # ~1.6% worst-case relative error on quantiles
+PROM_BOUNDS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+                  10000, 30000, 60000, 120000, 300000, 600000]
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+class Histogram:
+    """Log-linear bucketed histogram of non-negative values (HDR-style)."""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def _index(v: float) -> int:
+        if v <= 0:
+            return -(1 << 30)
+        m, e = math.frexp(v)  # v = m * 2**e, 0.5 <= m < 1
+        return e * SUB_BUCKETS + int((m - 0.5) * 2 * SUB_BUCKETS)
+
+    @staticmethod
+    def _value(idx: int) -> float:
+        """Midpoint of a bucket."""
+        if idx == -(1 << 30):
+            return 0.0
+        e, sub = divmod(idx, SUB_BUCKETS)
+        lo = math.ldexp(0.5 + sub / (2 * SUB_BUCKETS), e)
+        hi = math.ldexp(0.5 + (sub + 1) / (2 * SUB_BUCKETS), e)
+        return (lo + hi) / 2
+
+    def record(self, v: float, n: int = 1):
+        idx = self._index(v)
+        self.counts[idx] = self.counts.get(idx, 0) + n
+        self.count += n
+        self.total += v * n
+        self.min = min(self.min, v)
+        self.max = max(self.max, v)
+
+    def merge(self, other: "Histogram"):
+        for idx, c in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                # clamp to observed extremes so p0/p100 are exact
+                return min(max(self._value(idx), self.min), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def cumulative(self, bounds: Iterable[float]):
+        """[(le, count <= le)] for Prometheus-style export (bucket resolution)."""
+        items = sorted(self.counts.items())
+        out, seen, i = [], 0, 0
+        for b in bounds:
+            while i < len(items) and self._value(items[i][0]) <= b:
+                seen += items[i][1]
+                i += 1
+            out.append((b, seen))
+        return out
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "min": self.min if self.count else 0.0,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of labelled histograms and counters.
+
+    parent: optional registry that receives every observation too, so a run
+            can keep its own view (e.g. one extraction run) while the global
+            REGISTRY keeps the process-wide totals.
+    """
+
+    def __init__(self, parent: "MetricsRegistry" = None, prefix: str = "discharge_agent"):
+        self.parent = parent
+        self.prefix = prefix
+        self.histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, ms: float, **labels):
+        key = (stage, _label_key(labels))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+            h.record(ms)
+        if self.parent is not None:
+            self.parent.observe(stage, ms, **labels)
+
+    def inc(self, name: str, n: float = 1, **labels):
+        if not n:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+        if self.parent is not None:
+            self.parent.inc(name, n, **labels)
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - start) * 1000.0, **labels)
+
+    def histogram(self, stage: str, **labels) -> Histogram:
+        """Merged histogram of every series of `stage` matching the given labels."""
+        want = set(_label_key(labels))
+        out = Histogram()
+        with self._lock:
+            for (s, lk), h in self.histograms.items():
+                if s == stage and want <= set(lk):
+                    out.merge(h)
+        return out
+
+    def counter(self, name: str, **labels) -> float:
+        want = set(_label_key(labels))
+        with self._lock:
+            return sum(
+                v for (n, lk), v in self.counters.items() if n == name and want <= set(lk)
+            )
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    # ---- Export ----
+    def snapshot(self) -> Dict:
+        with self._lock:
+            hists = list(self.histograms.items())
+            counters = list(self.counters.items())
+        return {
+            "timestamp": time.time(),
+            "histograms_ms": [
+                {"stage": s, "labels": dict(lk), **h.summary()} for (s, lk), h in hists
+            ],
+            "counters": [
+                {"name": n, "labels": dict(lk), "value": v} for (n, lk), v in counters
+            ],
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def to_prometheus(self) -> str:
+        def fmt(lk, extra=()):
+            items = list(lk) + list(extra)
+            if not items:
+                return ""
+            esc = [(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items]
+            return "{" + ",".join(f'{k}="{v}"' for k, v in esc) + "}"
+
+        with self._lock:
+            hists = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        name = f"{self.prefix}_stage_latency_ms"
+        if hists:
+            lines.append(f"# TYPE {name} histogram")
+        for (stage, lk), h in hists:
+            lk = (("stage", stage),) + lk
+            for le, c in h.cumulative(PROM_BOUNDS_MS):
+                lines.append(f"{name}_bucket{fmt(lk, [('le', str(le))])} {c}")
+            lines.append(f"{name}_bucket{fmt(lk, [('le', '+Inf')])} {h.count}")
+            lines.append(f"{name}_sum{fmt(lk)} {h.total}")
+            lines.append(f"{name}_count{fmt(lk)} {h.count}")
+        typed = set()
+        for (cname, lk), v in counters:
+            full = f"{self.prefix}_{cname}"
+            if full not in typed:
+                lines.append(f"# TYPE {full} counter")
+                typed.add(full)
+            lines.append(f"{full}{fmt(lk)} {v}")
+        return "\n".join(lines) + "\n"
+
+
+def ollama_ttft_ms(data: dict):
+    """
+    Ollama's non-streaming responses report load + prompt-eval durations (ns);
+    together they are the time to first generated token.
+    """
+    if "prompt_eval_duration" not in data and "load_duration" not in data:
+        return None
+    ns = (data.get("load_duration") or 0) + (data.get("prompt_eval_duration") or 0)
+    return ns / 1e6
+
+
+REGISTRY = MetricsRegistry()
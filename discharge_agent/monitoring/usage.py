@@ -0,0 +1,207 @@
+"""
+Per-call token usage records and throughput accounting.
+
+Every LLM call (extraction or agent turn) produces one record:
+
+    provider, model, stage, wall_ms,
+    tokens_in, tokens_out, tokens_cached,
+    prompt_eval_ms, eval_ms, load_ms   # provider-reported (Ollama only)
+    decode_tok_s, effective_tok_s      # tokens_out / eval time, / wall time
+
+USAGE keeps running totals per provider, model and stage for every call, and
+only the most recent records (max_records) individually, so a long-running
+process (pipelines.service) doesn't grow without bound. throughput_report
+ranks models by effective throughput next to the accuracy summary from
+run_evaluation:
+
+    from discharge_agent.monitoring.usage import USAGE, throughput_report
+    summary = run_evaluation(data, gold)
+    throughput_report(summary, aliases={"gpt-5": "openai_gpt5"})
+"""
+
+import threading
+from collections import deque
+from typing import Dict, List
+
+from discharge_agent.monitoring.metrics import REGISTRY, ollama_ttft_ms
+
+# an Ollama call whose reported model load exceeds this counts as a cold start
+COLD_LOAD_MS = 250.0
+
+
+def _get(obj, name, default=None):
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def usage_from_ollama(data: Dict) -> Dict:
+    """Ollama /api/chat response -> usage fields (durations are in ns)."""
+    prompt_ns = data.get("prompt_eval_duration")
+    eval_ns = data.get("eval_duration")
+    load_ns = data.get("load_duration")
+    return {
+        "tokens_in": data.get("prompt_eval_count") or 0,
+        "tokens_out": data.get("eval_count") or 0,
+        "tokens_cached": 0,
+        "prompt_eval_ms": prompt_ns / 1e6 if prompt_ns is not None else None,
+        "eval_ms": eval_ns / 1e6 if eval_ns is not None else None,
+        "load_ms": load_ns / 1e6 if load_ns is not None else None,
+        "ttft_ms": ollama_ttft_ms(data),
+    }
+
+
+def usage_from_openai(usage) -> Dict:
+    """OpenAI chat-completions `usage` (object or dict) -> usage fields."""
+    details = _get(usage, "prompt_tokens_details")
+    return {
+        "tokens_in": _get(usage, "prompt_tokens") or 0,
+        "tokens_out": _get(usage, "completion_tokens") or 0,
+        "tokens_cached": _get(details, "cached_tokens") or 0,
+        "prompt_eval_ms": None,
+        "eval_ms": None,
+        "ttft_ms": None,
+    }
+
+
+def usage_from_anthropic(usage) -> Dict:
+    """Anthropic messages `usage` -> usage fields (cache reads count as cached)."""
+    return {
+        "tokens_in": (_get(usage, "input_tokens") or 0)
+        + (_get(usage, "cache_read_input_tokens") or 0),
+        "tokens_out": _get(usage, "output_tokens") or 0,
+        "tokens_cached": _get(usage, "cache_read_input_tokens") or 0,
+        "prompt_eval_ms": None,
+        "eval_ms": None,
+        "ttft_ms": None,
+    }
+
+
+TOTAL_FIELDS = (
+    "calls", "tokens_in", "tokens_out", "tokens_cached", "wall_ms", "eval_ms", "eval_calls",
+)
+
+
+class UsageLog:
+    """
+    Thread-safe usage accounting; also feeds the token counters in REGISTRY.
+    max_records: recent per-call records kept (None = all); totals cover every call
+    """
+
+    def __init__(self, registry=REGISTRY, max_records: int = 10000):
+        self.registry = registry
+        self._records = deque(maxlen=max_records)
+        self._totals: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, stage: str, wall_ms: float, usage: Dict) -> Dict:
+        rec = {"provider": provider, "model": model, "stage": stage, "wall_ms": wall_ms}
+        rec.update(usage)
+        out = rec.get("tokens_out") or 0
+        rec["decode_tok_s"] = 1000.0 * out / rec["eval_ms"] if rec.get("eval_ms") else None
+        rec["effective_tok_s"] = 1000.0 * out / wall_ms if wall_ms else None
+        with self._lock:
+            self._records.append(rec)
+            t = self._totals.get((provider, model, stage))
+            if t is None:
+                t = self._totals[(provider, model, stage)] = dict.fromkeys(TOTAL_FIELDS, 0)
+            t["calls"] += 1
+            t["tokens_in"] += rec.get("tokens_in") or 0
+            t["tokens_out"] += out
+            t["tokens_cached"] += rec.get("tokens_cached") or 0
+            t["wall_ms"] += wall_ms
+            if rec.get("eval_ms") is not None:
+                t["eval_ms"] += rec["eval_ms"]
+                t["eval_calls"] += 1
+
+        if self.registry is not None:
+            labels = {"provider": provider, "model": model}
+            self.registry.inc("tokens_in_total", rec.get("tokens_in") or 0, **labels)
+            self.registry.inc("tokens_out_total", out, **labels)
+            self.registry.inc("tokens_cached_total", rec.get("tokens_cached") or 0, **labels)
+            if rec.get("ttft_ms") is not None:
+                self.registry.observe("ttft", rec["ttft_ms"], **labels)
+            if rec.get("load_ms") is not None:
+                # cold and warm calls are different populations: keep them apart
+                cold = rec["load_ms"] >= COLD_LOAD_MS
+                self.registry.observe(
+                    "llm_call_cold" if cold else "llm_call_warm", wall_ms, **labels
+                )
+                if cold:
+                    self.registry.observe("model_load", rec["load_ms"], **labels)
+                    self.registry.inc("cold_starts_total", **labels)
+        return rec
+
+    @property
+    def records(self) -> List[Dict]:
+        """The most recent per-call records (up to max_records)."""
+        with self._lock:
+            return list(self._records)
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+            self._totals.clear()
+
+    def to_frame(self):
+        import pandas as pd  # only needed for reporting
+
+        return pd.DataFrame(self.records)
+
+    def aggregate(self, by=("provider", "model", "stage")):
+        """Totals and derived tokens/sec per group, over every call recorded."""
+        import pandas as pd
+
+        with self._lock:
+            rows = [
+                {"provider": p, "model": m, "stage": st, **t}
+                for (p, m, st), t in self._totals.items()
+            ]
+        if not rows:
+            return pd.DataFrame()
+        g = pd.DataFrame(rows).groupby(list(by), dropna=False)
+        agg = g[list(TOTAL_FIELDS)].sum().reset_index()
+        agg["wall_s"] = agg["wall_ms"] / 1000.0
+        agg["eval_s"] = (agg["eval_ms"] / 1000.0).where(agg["eval_calls"] > 0)
+        agg["mean_wall_ms"] = agg["wall_ms"] / agg["calls"]
+        agg["effective_tok_s"] = agg["tokens_out"] / agg["wall_s"]
+        agg["decode_tok_s"] = agg["tokens_out"] / agg["eval_s"]
+        agg["cached_frac"] = agg["tokens_cached"] / agg["tokens_in"].where(agg["tokens_in"] > 0)
+        return agg.drop(columns=["wall_ms", "eval_ms", "eval_calls"])
+
+
+USAGE = UsageLog()
+
+
+def throughput_report(
+    summary=None,
+    usage: UsageLog = USAGE,
+    stage: str = "extract",
+    aliases: Dict[str, str] = None,
+    accuracy_cols=("all_lists_f1", "scalar_soft_acc"),
+):
+    """
+    Models ranked by effective throughput (output tokens per wall-clock second)
+    for one stage, with accuracy columns from a run_evaluation summary.
+
+    aliases: maps the provider model id (e.g. "claude-sonnet-4-20250514") to
+             the model key used in the evaluation data (e.g. "claude_sonnet").
+    """
+    agg = usage.aggregate(by=("provider", "model", "stage"))
+    if agg.empty:
+        return agg
+    agg = agg[agg["stage"] == stage].drop(columns="stage")
+    agg["eval_model"] = agg["model"].map(lambda m: (aliases or {}).get(m, m))
+    cols = [
+        "provider", "model", "eval_model", "calls", "tokens_in", "tokens_out",
+        "tokens_cached", "mean_wall_ms", "effective_tok_s", "decode_tok_s",
+    ]
+    report = agg[cols]
+    if summary is not None:
+        acc = summary[["model"] + [c for c in accuracy_cols if c in summary.columns]]
+        report = report.merge(
+            acc.rename(columns={"model": "eval_model"}), on="eval_model", how="left"
+        )
+    return report.sort_values("effective_tok_s", ascending=False).reset_index(drop=True)
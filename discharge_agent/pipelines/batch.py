@@ -0,0 +1,379 @@
+"""
+Batch extraction + discharge checking with checkpointing.
+
+Each finished note is appended to a JSONL file as soon as it completes:
+
+    {"noteid": ..., "provider": ..., "model": ..., "extraction": {...} | null,
+     "discharge": {...} | null, "error": null | "...", "attempts": n, "latency_ms": ...}
+
+On restart, notes whose noteid already has an error-free line are skipped,
+so a crash only loses the notes that were in flight. Failed notes are
+retried on the next run; read_results keeps the last line per noteid.
+
+    python -m discharge_agent run --input data/synthetic_notes.csv \\
+        --out runs/gpt-oss.jsonl --provider local --model gpt-oss:20b --discharge
+
+Sharding: --shard i/N (0 <= i < N) keeps only the notes whose sha1(noteid)
+mod N is i, so N machines can split a corpus with no coordinator. Each shard
+writes runs/gpt-oss.shard-i-of-N.jsonl plus a .metrics.json next to it;
+`python -m discharge_agent merge` combines shard (and per-model) outputs into
+the {model: extraction}-per-line format used by consensus_gold_all and
+run_evaluation.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import pandas as pd
+from discharge_agent.config import env
+
+from discharge_agent.llm.llm_utils import MedicalDataExtractor
+from discharge_agent.monitoring.metrics import REGISTRY
+from discharge_agent.monitoring.usage import USAGE
+
+
+def load_notes(path: str, id_col: str = "noteid", text_col: str = "note_text") -> List[Dict]:
+    """Notes from a CSV or JSONL file as [{"noteid", "note_text"}] (ids as strings)."""
+    if path.endswith(".jsonl"):
+        df = pd.read_json(path, lines=True)
+    else:
+        df = pd.read_csv(path)
+    if id_col not in df.columns:
+        raise ValueError(f"{path} has no {id_col!r} column")
+    return [
+        {"noteid": str(nid), "note_text": text}
+        for nid, text in zip(df[id_col], df[text_col])
+    ]
+
+
+def read_results(path: str) -> Dict[str, Dict]:
+    """{noteid: last record}; a truncated final line (crash mid-write) is ignored."""
+    out = {}
+    if not os.path.exists(path):
+        return out
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            out[rec["noteid"]] = rec
+    return out
+
+
+def completed_ids(path: str) -> set:
+    return {nid for nid, rec in read_results(path).items() if not rec.get("error")}
+
+
+class Progress:
+    """One-line progress with throughput and ETA, redrawn in place."""
+
+    def __init__(self, total: int, skipped: int = 0, stream=sys.stderr):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.stream = stream
+
+    def update(self, ok: bool):
+        self.done += 1
+        self.failed += not ok
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        left = self.total - self.done
+        eta = left / rate if rate > 0 else 0.0
+        self.stream.write(
+            f"\r[{self.done}/{self.total}] {rate:.2f} notes/s "
+            f"ETA {eta:6.0f}s failed={self.failed} skipped={self.skipped}   "
+        )
+        self.stream.flush()
+
+    def close(self):
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+def process_note(
+    note: Dict,
+    extractor: MedicalDataExtractor,
+    discharge_fn: Callable[[Dict], str] = None,
+    max_retries: int = 3,
+) -> Dict:
+    """Extraction (retrying until the output parses) and optional discharge check."""
+    rec = {
+        "noteid": note["noteid"],
+        "provider": extractor.provider.value,
+        "model": extractor.model,
+        "extraction": None,
+        "discharge": None,
+        "error": None,
+        "attempts": 0,
+    }
+    start = time.perf_counter()
+    try:
+        for attempt in range(max_retries):
+            rec["attempts"] = attempt + 1
+            raw = extractor.extract_clinical_information(note["note_text"])
+            try:
+                rec["extraction"] = json.loads(raw)
+                break
+            except ValueError:
+                continue
+        if rec["extraction"] is None:
+            rec["error"] = f"invalid JSON after {max_retries} attempts"
+        elif discharge_fn is not None:
+            final = discharge_fn(rec["extraction"])
+            try:
+                rec["discharge"] = json.loads(final)
+            except ValueError:
+                rec["discharge"] = {"raw": final}
+    except Exception as e:
+        rec["error"] = repr(e)
+    rec["latency_ms"] = (time.perf_counter() - start) * 1000.0
+    return rec
+
+
+def run_batch(
+    notes: Iterable[Dict],
+    extractor: MedicalDataExtractor,
+    out_path: str,
+    discharge_fn: Callable[[Dict], str] = None,
+    max_retries: int = 3,
+    workers: int = 1,
+    progress: bool = True,
+) -> Dict:
+    """
+    Process every note not already completed in out_path, appending one JSONL
+    line per note as it finishes.
+
+    Returns a summary dict: total, skipped, processed, failed, wall_s, notes_per_s.
+    """
+    notes = list(notes)
+    done = completed_ids(out_path)
+    todo = [n for n in notes if n["noteid"] not in done]
+    skipped = len(notes) - len(todo)
+
+    d = os.path.dirname(out_path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    bar = Progress(len(todo), skipped) if progress else None
+    lock = threading.Lock()
+    failed = 0
+    start = time.perf_counter()
+
+    with open(out_path, "a") as out:
+
+        def one(note):
+            nonlocal failed
+            rec = process_note(note, extractor, discharge_fn, max_retries)
+            with lock:
+                out.write(json.dumps(rec) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                failed += bool(rec["error"])
+                if bar:
+                    bar.update(not rec["error"])
+
+        if workers <= 1:
+            for note in todo:
+                one(note)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(one, todo))
+
+    if bar:
+        bar.close()
+    wall_s = time.perf_counter() - start
+    summary = {
+        "total": len(notes),
+        "skipped": skipped,
+        "processed": len(todo),
+        "failed": failed,
+        "wall_s": wall_s,
+        "notes_per_s": len(todo) / wall_s if wall_s > 0 else 0.0,
+    }
+    print(
+        f"Processed {summary['processed']} notes ({summary['skipped']} already done, "
+        f"{summary['failed']} failed) in {wall_s:.1f}s, "
+        f"{summary['notes_per_s']:.2f} notes/s -> {out_path}"
+    )
+    return summary
+
+
+def make_discharge_fn(
+    api_url: str, model: str, keep_alive=None, cache=None, openai_compat: bool = False
+) -> Callable[[Dict], str]:
+    """
+    check_discharge_safety bound to an Ollama-compatible chat endpoint.
+    cache: optional decision_cache.DecisionCache; unchanged extractions reuse
+           the cached decision instead of re-running the agent
+    openai_compat: api_url is the /v1 base URL of an OpenAI-compatible server
+                   (vLLM, llama.cpp server) instead of Ollama's /api/chat
+    """
+    from discharge_agent.llm.prompts import get_messages
+    from discharge_agent.llm.tool_specs import TOOLS
+    from discharge_agent.pipelines.discharge_checker import (
+        check_discharge_safety,
+        make_chat,
+        make_openai_chat,
+    )
+
+    if openai_compat:
+        chat = make_openai_chat(api_url, api_key=env("OPENAI_COMPAT_API_KEY"))
+    else:
+        chat = make_chat(api_url, keep_alive=keep_alive)
+
+    def discharge(extraction):
+        if cache is not None:
+            from discharge_agent.pipelines.decision_cache import check_discharge_cached
+
+            return check_discharge_cached(extraction, chat, model, TOOLS, cache=cache)
+        return check_discharge_safety(
+            get_messages(extraction), chat=chat, MODEL=model, TOOLS=TOOLS
+        )
+
+    return discharge
+
+
+# ---- Sharding ----
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'i/N' -> (i, N) with 0 <= i < N."""
+    try:
+        i, n = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"shard spec must be i/N, got {spec!r}")
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"shard index out of range in {spec!r} (0 <= i < N)")
+    return i, n
+
+
+def shard_of(noteid: str, n_shards: int) -> int:
+    """Stable across machines and Python runs (unlike hash())."""
+    digest = hashlib.sha1(str(noteid).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % n_shards
+
+
+def select_shard(notes: Iterable[Dict], index: int, n_shards: int) -> List[Dict]:
+    return [n for n in notes if shard_of(n["noteid"], n_shards) == index]
+
+
+def shard_path(out_path: str, index: int, n_shards: int) -> str:
+    root, ext = os.path.splitext(out_path)
+    return f"{root}.shard-{index}-of-{n_shards}{ext or '.jsonl'}"
+
+
+def metrics_path(out_path: str) -> str:
+    return os.path.splitext(out_path)[0] + ".metrics.json"
+
+
+def write_run_metrics(out_path: str, summary: Dict, shard: str = None) -> str:
+    """
+    Append this run's summary, per-model usage and metrics snapshot to the
+    .metrics.json next to out_path (resumed runs add an entry, not overwrite).
+    """
+    path = metrics_path(out_path)
+    runs = []
+    if os.path.exists(path):
+        with open(path) as f:
+            runs = json.load(f).get("runs", [])
+    agg = USAGE.aggregate()
+    runs.append(
+        {
+            "summary": summary,
+            "usage": agg.to_dict(orient="records") if not agg.empty else [],
+            "metrics": REGISTRY.snapshot(),
+        }
+    )
+    with open(path, "w") as f:
+        json.dump({"shard": shard, "runs": runs}, f, indent=2, default=str)
+    return path
+
+
+# ---- Merge ----
+def _sort_key(noteid: str):
+    return (0, int(noteid), "") if noteid.isdigit() else (1, 0, noteid)
+
+
+def merge_results(paths: Iterable[str], model_names: Dict[str, str] = None) -> Dict[str, Dict[str, Dict]]:
+    """
+    {noteid: {model: extraction}} over every shard/run file. Only error-free
+    records count; the last one wins if a note appears twice for a model.
+
+    model_names: optional {model id in the records: name used for evaluation}.
+    """
+    merged: Dict[str, Dict[str, Dict]] = {}
+    for path in paths:
+        for nid, rec in read_results(path).items():
+            if rec.get("error") or rec.get("extraction") is None:
+                continue
+            model = (model_names or {}).get(rec["model"], rec["model"])
+            merged.setdefault(nid, {})[model] = rec["extraction"]
+    return merged
+
+
+def evaluation_data(merged: Dict[str, Dict[str, Dict]]) -> Tuple[List[str], List[Dict[str, Dict]]]:
+    """(note_keys, data) in noteid order, ready for consensus_gold_all/run_evaluation."""
+    keys = sorted(merged, key=_sort_key)
+    return keys, [merged[k] for k in keys]
+
+
+def merge_metrics(paths: Iterable[str]) -> Dict:
+    """
+    Sum run summaries over shards. A shard's wall time is the sum of its runs;
+    aggregate throughput is over the slowest shard, since shards run in parallel.
+    """
+    total = {"shards": 0, "total": 0, "processed": 0, "failed": 0, "wall_s": 0.0}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            runs = [r["summary"] for r in json.load(f).get("runs", [])]
+        if not runs:
+            continue
+        total["shards"] += 1
+        total["total"] += runs[-1].get("total", 0)
+        for s in runs:
+            total["processed"] += s.get("processed", 0)
+        total["failed"] += runs[-1].get("failed", 0)
+        total["wall_s"] = max(total["wall_s"], sum(s.get("wall_s", 0.0) for s in runs))
+    total["notes_per_s"] = total["processed"] / total["wall_s"] if total["wall_s"] else 0.0
+    return total
+
+
+def merge_shards(patterns: Iterable[str], out_path: str, model_names: Dict[str, str] = None):
+    """Merge run/shard files (globs allowed) and write one {model: extraction} line per note."""
+    paths = sorted({p for pat in patterns for p in (glob.glob(pat) or [pat])})
+    merged = merge_results(paths, model_names)
+    keys, data = evaluation_data(merged)
+    d = os.path.dirname(out_path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(out_path, "w") as f:
+        for row in data:
+            f.write(json.dumps(row) + "\n")
+    with open(os.path.splitext(out_path)[0] + ".noteids.json", "w") as f:
+        json.dump(keys, f)
+
+    models = sorted({m for row in data for m in row})
+    print(f"Merged {len(paths)} files: {len(keys)} notes, models {models} -> {out_path}")
+    incomplete = [k for k, row in zip(keys, data) if len(row) < len(models)]
+    if incomplete:
+        print(f"  {len(incomplete)} notes missing at least one model, e.g. {incomplete[:5]}")
+    stats = merge_metrics(metrics_path(p) for p in paths)
+    if stats["shards"]:
+        print(
+            f"  {stats['shards']} metrics files: {stats['processed']} processed, "
+            f"{stats['failed']} failed in the last runs, "
+            f"{stats['notes_per_s']:.2f} notes/s aggregate"
+        )
+    return keys, data
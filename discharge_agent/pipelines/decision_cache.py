@@ -0,0 +1,159 @@
+"""
+Decision cache in front of check_discharge_safety.
+
+A chart refresh re-runs the discharge check even when the extraction hasn't
+changed, paying the whole multi-turn agent loop again. DecisionCache keeps
+the final decision keyed on
+
+    sha256(canonical extraction JSON, llm.prompts.PROMPT_VERSION, model, tool specs)
+
+so an unchanged patient returns immediately, while a new prompt version, a
+different model or edited tool specs produce a different key. The extraction
+is canonicalized by sorting keys and stripping surrounding whitespace from
+strings, so re-serialization or key order don't cause misses.
+
+Entries are LRU-bounded (max_size) and expire after ttl_s; invalidate()
+drops one extraction's decisions (without needing the tool specs), every
+entry for a model, or everything. Lookups feed
+cache_hits_total / cache_misses_total (cache="discharge_decision").
+
+    cache = DecisionCache(max_size=10000, ttl_s=6 * 3600)
+    final = check_discharge_cached(extraction, chat, MODEL, TOOLS, cache=cache)
+    cache.stats, cache.hit_rate
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from discharge_agent.llm.prompts import PROMPT_VERSION, get_messages
+from discharge_agent.monitoring.metrics import REGISTRY
+from discharge_agent.pipelines.discharge_checker import check_discharge_safety
+
+
+def canonical(obj):
+    if isinstance(obj, dict):
+        return {str(k): canonical(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [canonical(v) for v in obj]
+    if isinstance(obj, str):
+        return obj.strip()
+    return obj
+
+
+def _digest(obj) -> str:
+    raw = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def extraction_digest(extraction: Dict) -> str:
+    return _digest(canonical(extraction))
+
+
+def decision_key(extraction: Dict, model: str, tools=None, prompt_version: str = PROMPT_VERSION) -> str:
+    return _digest([canonical(extraction), prompt_version, model, tools])
+
+
+class DecisionCache:
+    def __init__(self, max_size: int = 4096, ttl_s: float = 3600.0, clock=time.monotonic):
+        """
+        max_size: entries kept (least recently used evicted first)
+        ttl_s: seconds a decision stays valid (None = no expiry)
+        """
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.clock = clock
+        # key -> (value, model, expires, extraction digest)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= self.clock():
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+            else:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+        REGISTRY.inc("cache_hits_total" if entry else "cache_misses_total", cache="discharge_decision")
+        return entry[0] if entry else None
+
+    def put(self, key: str, value: str, model: str = None, extraction: Dict = None):
+        """extraction: lets invalidate(extraction) find the entry without the tool specs"""
+        expires = self.clock() + self.ttl_s if self.ttl_s is not None else None
+        digest = extraction_digest(extraction) if extraction is not None else None
+        with self._lock:
+            self._entries[key] = (value, model, expires, digest)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def invalidate(self, extraction: Dict = None, model: str = None, tools=None) -> int:
+        """
+        Drop cached decisions; returns how many.
+        extraction: its decisions (for model, if given); extraction + model +
+        tools: the one entry with that key; model only: all of the model's;
+        neither: everything.
+        """
+        if tools is not None and (extraction is None or model is None):
+            # entries are keyed on the tool specs but not indexed by them
+            raise ValueError("invalidate(tools=...) needs both extraction and model")
+        digest = extraction_digest(extraction) if extraction is not None else None
+        with self._lock:
+            if tools is not None:
+                keys = [decision_key(extraction, model, tools)]
+            elif extraction is not None:
+                keys = [
+                    k
+                    for k, e in self._entries.items()
+                    if e[3] == digest and (model is None or e[1] == model)
+                ]
+            elif model is not None:
+                keys = [k for k, e in self._entries.items() if e[1] == model]
+            else:
+                keys = list(self._entries)
+            n = sum(self._entries.pop(k, None) is not None for k in keys)
+            self.stats["invalidated"] += n
+        return n
+
+
+DECISIONS = DecisionCache()
+
+
+def check_discharge_cached(
+    extraction: Dict,
+    chat,
+    MODEL,
+    TOOLS,
+    cache: DecisionCache = DECISIONS,
+    tool_runner=None,
+    max_iters: int = 5,
+) -> str:
+    """check_discharge_safety on get_messages(extraction), answered from cache when possible."""
+    key = decision_key(extraction, MODEL, TOOLS)
+    final = cache.get(key)
+    if final is not None:
+        return final
+    start = time.perf_counter()
+    final = check_discharge_safety(get_messages(extraction), chat, MODEL, TOOLS, tool_runner, max_iters)
+    REGISTRY.observe("discharge_check", (time.perf_counter() - start) * 1000.0, model=MODEL)
+    if final:  # an empty answer (loop ran out of turns) isn't worth keeping
+        cache.put(key, final, MODEL, extraction)
+    return final
@@ -1,22 +1,184 @@
-import requests
 import json
+import time
 from discharge_agent.tools.labs import flag_labs
 from discharge_agent.tools.followup import followup_gap
 from discharge_agent.tools.umls_client import normalize_terms_to_cui
 from discharge_agent.llm.tool_specs import TOOLS
-from dotenv import load_dotenv
-import os
+from discharge_agent.llm.tool_validation import validate_tool_args, validation_error
+from discharge_agent.monitoring.metrics import REGISTRY
+from discharge_agent.monitoring.usage import USAGE, usage_from_ollama, usage_from_openai
+from discharge_agent.config import env, module_settings
 
-load_dotenv()
+# API / MODEL are resolved from the environment (.env) on first access
+__getattr__ = module_settings(__name__, {"API": "LLM_API", "MODEL": "MODEL"})
 
-API = os.getenv("LLM_API")
-MODEL = os.getenv("MODEL")
+
+def make_chat(api_url, timeout=120, keep_alive=None):
+    """
+    chat(payload) bound to a given Ollama-compatible /api/chat endpoint.
+    keep_alive: sent with every request that doesn't set its own
+    """
+    import requests
+
+    def chat(payload):
+        if keep_alive is not None and "keep_alive" not in payload:
+            payload = dict(payload, keep_alive=keep_alive)
+        labels = {"provider": "local", "model": payload.get("model")}
+        start = time.perf_counter()
+        try:
+            with REGISTRY.timer("llm_call", kind="agent", **labels):
+                r = requests.post(api_url, json=payload, timeout=timeout)
+                r.raise_for_status()
+                data = r.json()
+        except Exception:
+            REGISTRY.inc("llm_errors_total", kind="agent", **labels)
+            raise
+        USAGE.record(
+            "local",
+            payload.get("model"),
+            "agent",
+            (time.perf_counter() - start) * 1000.0,
+            usage_from_ollama(data),
+        )
+        return data
+
+    return chat
+
+
+def to_openai_messages(messages):
+    """
+    Ollama-shape history -> OpenAI chat messages: tool-call arguments become
+    JSON strings and each tool result gets the tool_call_id of its call
+    (matched in order, since Ollama's tool messages only carry the name).
+    """
+    out, pending = [], []
+    for i, m in enumerate(messages):
+        if m.get("role") == "assistant" and m.get("tool_calls"):
+            calls = []
+            for j, call in enumerate(m["tool_calls"]):
+                fn = call["function"]
+                args = fn.get("arguments") or {}
+                calls.append(
+                    {
+                        "id": call.get("id") or f"call_{i}_{j}",
+                        "type": "function",
+                        "function": {
+                            "name": fn["name"],
+                            "arguments": args if isinstance(args, str) else json.dumps(args),
+                        },
+                    }
+                )
+            pending = list(calls)
+            out.append(
+                {"role": "assistant", "content": m.get("content") or None, "tool_calls": calls}
+            )
+        elif m.get("role") == "tool":
+            names = [c["function"]["name"] for c in pending]
+            idx = names.index(m.get("name")) if m.get("name") in names else 0
+            call = pending.pop(idx) if pending else {"id": f"call_{i}"}
+            out.append(
+                {"role": "tool", "tool_call_id": call["id"], "content": m.get("content") or ""}
+            )
+        else:
+            out.append({"role": m["role"], "content": m.get("content") or ""})
+    return out
+
+
+def from_openai_response(data):
+    """OpenAI chat completion -> the Ollama /api/chat shape check_discharge_safety reads."""
+    msg = (data.get("choices") or [{}])[0].get("message") or {}
+    out = {"role": "assistant", "content": msg.get("content") or ""}
+    calls = []
+    for call in msg.get("tool_calls") or []:
+        args = call["function"].get("arguments") or "{}"
+        try:
+            args = json.loads(args) if isinstance(args, str) else args
+        except ValueError:
+            pass  # left as text; validate_tool_args reports it
+        name = call["function"]["name"]
+        calls.append({"id": call.get("id"), "function": {"name": name, "arguments": args}})
+    if calls:
+        out["tool_calls"] = calls
+    return {"model": data.get("model"), "message": out, "done": True}
+
+
+def make_openai_chat(base_url, timeout=120, api_key=None):
+    """
+    chat(payload) for an OpenAI-compatible server (vLLM, llama.cpp server):
+    takes and returns the Ollama shape, so check_discharge_safety runs unchanged.
+    base_url: e.g. http://localhost:8000/v1
+    """
+    import requests
+
+    url = base_url.rstrip("/") + "/chat/completions"
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    def chat(payload):
+        body = {
+            "model": payload.get("model"),
+            "messages": to_openai_messages(payload.get("messages") or []),
+            "stream": False,
+        }
+        if payload.get("tools"):
+            body["tools"] = payload["tools"]
+        labels = {"provider": "openai_compat", "model": payload.get("model")}
+        start = time.perf_counter()
+        try:
+            with REGISTRY.timer("llm_call", kind="agent", **labels):
+                r = requests.post(url, json=body, headers=headers, timeout=timeout)
+                r.raise_for_status()
+                data = r.json()
+        except Exception:
+            REGISTRY.inc("llm_errors_total", kind="agent", **labels)
+            raise
+        USAGE.record(
+            "openai_compat",
+            payload.get("model"),
+            "agent",
+            (time.perf_counter() - start) * 1000.0,
+            usage_from_openai(data.get("usage")),
+        )
+        return from_openai_response(data)
+
+    return chat
 
 
 def chat(payload):
-    r = requests.post(API, json=payload, timeout=120)
-    r.raise_for_status()
-    return r.json()
+    return make_chat(env("LLM_API"))(payload)
+
+
+def run_tool(fn, args, info=None):
+    """
+    Validate the arguments and execute one agent tool. Invalid arguments and
+    tool exceptions (e.g. a date the tool can't parse) come back as an error
+    result for the model instead of aborting the agent loop.
+    info: optional dict filled with coercions, arg_errors, validation_ms, error
+    """
+    args, coercions, errors, validation_ms = validate_tool_args(fn, args)
+    REGISTRY.observe("tool_validation", validation_ms, tool=fn)
+    error = None
+    with REGISTRY.timer("tool", tool=fn):
+        try:
+            if errors:
+                error = "; ".join(errors)
+                out = validation_error(fn, errors)
+            elif fn == "flag_labs":
+                out = flag_labs(**args)
+            elif fn == "followup_gap":
+                out = followup_gap(**args)
+            elif fn == "umls_normalize":
+                out = normalize_terms_to_cui(**args)
+            else:
+                error = f"unknown tool {fn}"
+                out = {"error": error}
+        except Exception as e:
+            error = f"{fn} failed: {e}"
+            out = {"error": error}
+    if error is not None:
+        REGISTRY.inc("tool_errors_total", tool=fn)
+    if info is not None:
+        info.update(coercions=coercions, arg_errors=errors, validation_ms=validation_ms, error=error)
+    return out
 
 
 def check_discharge_safety(messages, chat, MODEL, TOOLS, tool_runner=None, max_iters=5):
@@ -45,14 +207,7 @@ def check_discharge_safety(messages, chat, MODEL, TOOLS, tool_runner=None, max_i
                 if tool_runner is not None:
                     result = tool_runner(fn, args)  # <-- evaluation hook
                 else:
-                    if fn == "flag_labs":
-                        result = flag_labs(**args)
-                    elif fn == "followup_gap":
-                        result = followup_gap(**args)
-                    elif fn == "umls_normalize":
-                        result = normalize_terms_to_cui(**args)
-                    else:
-                        result = {"error": f"unknown tool {fn}"}
+                    result = run_tool(fn, args)
                 messages.append(
                     {"role": "tool", "name": fn, "content": json.dumps(result)}
                 )
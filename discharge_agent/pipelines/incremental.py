@@ -0,0 +1,191 @@
+"""
+Incremental discharge re-check when a patient's note changes.
+
+When new labs arrive, re-running the whole agent loop repeats every tool
+call and every tool-selection turn. IncrementalChecker keeps, per patient,
+the last extraction and the tool calls/results of its check. On an update it
+diffs the new extraction per field and:
+
+- reuses a prior tool result when none of the tool's input fields changed
+  (flag_labs: labs; followup_gap: discharge date + appointments;
+  umls_normalize: primary diagnosis)
+- re-runs flag_labs / followup_gap directly when their inputs changed (their
+  arguments come straight from the extraction)
+- leaves umls_normalize to the model when the diagnosis changed, because the
+  model cleans and splits the diagnosis text into terms first
+
+The reused and re-run results are placed in the conversation as if the model
+had already called them, so the final decision usually takes one LLM turn
+instead of the full loop. A tool the model calls again with the same
+arguments is answered from those results. An unchanged extraction returns
+the previous decision with no calls at all.
+
+    checker = IncrementalChecker(chat, MODEL, TOOLS)
+    checker.check("patient-17", extraction)        # first time: full agent loop
+    checker.check("patient-17", updated_extraction)
+    checker.last_report  # {"changed": [...], "tool_calls_avoided": 2, "llm_calls_avoided": 1, ...}
+    checker.summary()
+"""
+
+import json
+import threading
+from typing import Dict, List
+
+from discharge_agent.extractions.prompts import SCHEMA_KEYS
+from discharge_agent.llm.prompts import get_messages
+from discharge_agent.monitoring.metrics import REGISTRY
+from discharge_agent.pipelines.decision_cache import canonical
+from discharge_agent.pipelines.discharge_checker import check_discharge_safety, run_tool
+
+# extraction fields each tool reads
+TOOL_FIELDS = {
+    "flag_labs": ("most_recent_labs",),
+    "followup_gap": ("discharge_date", "follow_up_appointments"),
+    "umls_normalize": ("primary_discharge_diagnosis",),
+}
+
+
+def tool_args(fn: str, extraction: Dict):
+    """Arguments for tools fed directly from the extraction; None for the others."""
+    if fn == "flag_labs":
+        return {"labs": extraction.get("most_recent_labs") or []}
+    if fn == "followup_gap":
+        return {
+            "discharge_date": extraction.get("discharge_date") or "",
+            "appts": extraction.get("follow_up_appointments") or [],
+        }
+    return None
+
+
+def changed_fields(old: Dict, new: Dict) -> List[str]:
+    keys = list(SCHEMA_KEYS) + [k for k in list(old) + list(new) if k not in SCHEMA_KEYS]
+    return [k for k in dict.fromkeys(keys) if canonical(old.get(k)) != canonical(new.get(k))]
+
+
+def _same_args(a, b) -> bool:
+    return json.dumps(canonical(a), sort_keys=True) == json.dumps(canonical(b), sort_keys=True)
+
+
+class IncrementalChecker:
+    def __init__(self, chat, MODEL, TOOLS, max_iters: int = 5):
+        self.chat = chat
+        self.MODEL = MODEL
+        self.TOOLS = TOOLS
+        self.max_iters = max_iters
+        self.states: Dict[str, Dict] = {}
+        self.totals = {"checks": 0, "full": 0, "incremental": 0, "unchanged": 0, "llm_calls": 0,
+                       "tool_calls": 0, "llm_calls_avoided": 0, "tool_calls_avoided": 0}
+        self._tls = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def last_report(self) -> Dict:
+        return getattr(self._tls, "report", None)
+
+    def forget(self, patient_id: str):
+        self.states.pop(patient_id, None)
+
+    def _run(self, messages, known: Dict[str, Dict]):
+        """Agent loop counting LLM turns and real tool executions; `known` answers repeats."""
+        counts = {"llm": 0, "ran": [], "served": 0}
+        calls = dict(known)
+
+        def chat(payload):
+            counts["llm"] += 1
+            return self.chat(payload)
+
+        def runner(fn, args):
+            prev = calls.get(fn)
+            if prev is not None and _same_args(prev["args"], args):
+                counts["served"] += 1
+                return prev["result"]
+            counts["ran"].append(fn)
+            result = run_tool(fn, args)
+            calls[fn] = {"args": args, "result": result}
+            return result
+
+        final = check_discharge_safety(messages, chat, self.MODEL, self.TOOLS, runner, self.max_iters)
+        return final, calls, counts
+
+    def check(self, patient_id: str, extraction: Dict) -> str:
+        prev = self.states.get(patient_id)
+        if prev is None:
+            final, calls, counts = self._run(get_messages(extraction), {})
+            state = {
+                "extraction": extraction,
+                "tools": calls,
+                "final": final,
+                # what a full re-check costs, the baseline for "avoided"
+                "full_llm_calls": counts["llm"],
+                "full_tool_calls": len(counts["ran"]),
+            }
+            report = {"mode": "full", "changed": list(SCHEMA_KEYS), "llm_calls": counts["llm"],
+                      "tool_calls": len(counts["ran"]), "tools_reused": [], "tools_rerun": counts["ran"]}
+            self._finish(patient_id, state, report, state)
+            return final
+
+        changed = changed_fields(prev["extraction"], extraction)
+        if not changed:
+            report = {"mode": "unchanged", "changed": [], "llm_calls": 0, "tool_calls": 0,
+                      "tools_reused": list(prev["tools"]), "tools_rerun": []}
+            self._finish(patient_id, dict(prev, extraction=extraction), report, prev)
+            return prev["final"]
+
+        known, reused, rerun = {}, [], []
+        for fn, rec in prev["tools"].items():
+            if not any(f in changed for f in TOOL_FIELDS.get(fn, ())):
+                known[fn] = rec
+                reused.append(fn)
+                continue
+            args = tool_args(fn, extraction)
+            if args is not None:
+                known[fn] = {"args": args, "result": run_tool(fn, args)}
+                rerun.append(fn)
+            # otherwise the model calls it again with its own arguments
+
+        messages = get_messages(extraction)
+        if known:
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": "",
+                    "tool_calls": [
+                        {"function": {"name": fn, "arguments": rec["args"]}} for fn, rec in known.items()
+                    ],
+                }
+            )
+            for fn, rec in known.items():
+                messages.append({"role": "tool", "name": fn, "content": json.dumps(rec["result"])})
+
+        final, calls, counts = self._run(messages, known)
+        rerun += counts["ran"]
+        state = dict(prev, extraction=extraction, tools=calls, final=final)
+        report = {"mode": "incremental", "changed": changed, "llm_calls": counts["llm"],
+                  "tool_calls": len(rerun), "tools_reused": reused, "tools_rerun": rerun}
+        self._finish(patient_id, state, report, prev)
+        return final
+
+    def _finish(self, patient_id, state, report, baseline):
+        report["llm_calls_avoided"] = max(0, baseline["full_llm_calls"] - report["llm_calls"])
+        report["tool_calls_avoided"] = max(0, baseline["full_tool_calls"] - report["tool_calls"])
+        self.states[patient_id] = state
+        self._tls.report = report
+        with self._lock:
+            self.totals["checks"] += 1
+            self.totals[report["mode"]] += 1
+            for k in ("llm_calls", "tool_calls", "llm_calls_avoided", "tool_calls_avoided"):
+                self.totals[k] += report[k]
+        REGISTRY.inc("incremental_checks_total", mode=report["mode"])
+        REGISTRY.inc("llm_calls_avoided_total", report["llm_calls_avoided"], kind="agent")
+        REGISTRY.inc("tool_calls_avoided_total", report["tool_calls_avoided"])
+
+    def summary(self) -> Dict:
+        t = dict(self.totals)
+        print("\n=== Incremental discharge checks ===")
+        print(
+            f"Checks: {t['checks']} ({t['full']} full, {t['incremental']} incremental, "
+            f"{t['unchanged']} unchanged)"
+        )
+        print(f"LLM calls: {t['llm_calls']} made, {t['llm_calls_avoided']} avoided")
+        print(f"Tool calls: {t['tool_calls']} made, {t['tool_calls_avoided']} avoided")
+        return t
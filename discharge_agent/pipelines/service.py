@@ -0,0 +1,378 @@
+"""
+Long-running HTTP service for extraction and discharge checks (stdlib only).
+
+    python -m discharge_agent serve --port 8080 --provider local --model gpt-oss:20b \\
+        --concurrency 4 --max-queue urgent=256,normal=128,backfill=64
+
+    POST /extract  {"note": "...", "priority": "urgent", "deadline_ms": 60000}
+                   -> {"id", "extraction", "queue_ms", "latency_ms"}
+    POST /check    {"extraction": {...}, "priority": "normal"}
+                   -> {"id", "decision", "queue_ms", "latency_ms"}
+    GET  /metrics  Prometheus text (pipeline metrics + queue depth / in flight)
+    GET  /health
+
+Scheduling:
+- priority queue: "urgent" (same-day discharges) before "normal" before
+  "backfill"; within a priority, earliest deadline first
+- admission control: each priority has a queue-length limit; a full queue
+  answers 429 with Retry-After instead of growing without bound
+- deadlines: a request waits at most deadline_ms (default --deadline-ms);
+  past it the caller gets 504, and a job whose deadline passed before a
+  worker picked it up is dropped without calling the model
+- micro-batching: when a backend slot frees up, the dispatcher takes up to
+  batch_size queued jobs at once, waiting at most batch_wait_ms for more to
+  arrive (never for urgent jobs). It sends them to the backend concurrently
+  (Ollama batches parallel requests, OLLAMA_NUM_PARALLEL), and identical
+  requests in a batch share one call. Jobs stay in the priority queue until
+  a slot is free, so a backfill flood can't get ahead of a later urgent job.
+
+Discharge checks go through decision_cache, so an unchanged extraction is
+answered without running the agent again.
+"""
+
+import hashlib
+import heapq
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from discharge_agent.llm.tool_specs import TOOLS
+from discharge_agent.monitoring.metrics import REGISTRY
+from discharge_agent.pipelines.decision_cache import DECISIONS, check_discharge_cached
+
+PRIORITIES = {"urgent": 0, "normal": 1, "backfill": 2}
+DEFAULT_LIMITS = {"urgent": 256, "normal": 128, "backfill": 64}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, payload: Dict, priority: str, deadline: float = None):
+        self.id = hashlib.sha1(f"{time.time_ns()}-{id(self)}".encode()).hexdigest()[:12]
+        self.kind = kind
+        self.payload = payload
+        self.priority = priority
+        self.deadline = deadline  # time.monotonic() value, or None
+        self.enqueued = time.monotonic()
+        self.started = None
+        self.cancelled = False
+        self.status = None
+        self.body = None
+        self.done = threading.Event()
+
+    @property
+    def dedupe_key(self) -> str:
+        raw = json.dumps([self.kind, self.payload], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def expired(self, now: float = None) -> bool:
+        return self.deadline is not None and (now or time.monotonic()) >= self.deadline
+
+    def finish(self, status: int, body: Dict):
+        self.status, self.body = status, body
+        self.done.set()
+
+
+class JobQueue:
+    """Priority + earliest-deadline queue with per-priority length limits."""
+
+    def __init__(self, limits: Dict[str, int] = None):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.depth = {p: 0 for p in PRIORITIES}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def put(self, job: Job):
+        with self._cond:
+            if self.depth[job.priority] >= self.limits[job.priority]:
+                raise QueueFull(job.priority)
+            deadline = job.deadline if job.deadline is not None else float("inf")
+            heapq.heappush(self._heap, (PRIORITIES[job.priority], deadline, next(self._seq), job))
+            self.depth[job.priority] += 1
+            self._cond.notify()
+
+    def _pop(self) -> Job:
+        job = heapq.heappop(self._heap)[-1]
+        self.depth[job.priority] -= 1
+        return job
+
+    def get_batch(self, max_n: int, wait_s: float) -> List[Job]:
+        """Block for one job, then collect up to max_n, waiting at most wait_s for more."""
+        with self._cond:
+            while not self._heap:
+                self._cond.wait()
+            batch = [self._pop()]
+            if batch[0].priority == "urgent":
+                wait_s = 0.0
+            end = time.monotonic() + wait_s
+            while len(batch) < max_n:
+                if self._heap:
+                    batch.append(self._pop())
+                    continue
+                left = end - time.monotonic()
+                if left <= 0 or not self._cond.wait(left):
+                    break
+            return batch
+
+
+class DischargeService:
+    def __init__(
+        self,
+        extractor,
+        chat=None,
+        model: str = None,
+        tools=TOOLS,
+        concurrency: int = 4,
+        batch_size: int = 8,
+        batch_wait_ms: float = 20.0,
+        limits: Dict[str, int] = None,
+        default_deadline_ms: float = None,
+        attempts: int = 3,
+        decision_cache=DECISIONS,
+    ):
+        """
+        extractor: MedicalDataExtractor (or drop-in) for /extract
+        chat, model, tools: check_discharge_safety arguments for /check
+        concurrency: backend requests in flight at once
+        attempts: tries per request; invalid extraction JSON and backend
+                  errors are retried while the deadline allows
+        decision_cache: DecisionCache answering unchanged /check extractions
+        """
+        self.extractor = extractor
+        self.chat = chat
+        self.model = model
+        self.tools = tools
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batch_wait_s = batch_wait_ms / 1000.0
+        self.default_deadline_ms = default_deadline_ms
+        self.attempts = max(1, attempts)
+        self.decision_cache = decision_cache
+        self.queue = JobQueue(limits)
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self._free = concurrency
+        self._slots = threading.Condition()
+        self._dispatcher = None
+
+    # ---- Intake ----
+    def submit(
+        self, kind: str, payload: Dict, priority: str = "normal", deadline_ms: float = None
+    ) -> Job:
+        """
+        Queue a job; raises ValueError for a bad priority or deadline and
+        QueueFull when its priority is at its limit.
+        """
+        if not isinstance(priority, str) or priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {list(PRIORITIES)}")
+        number = isinstance(deadline_ms, (int, float)) and not isinstance(deadline_ms, bool)
+        if deadline_ms is not None and (not number or deadline_ms <= 0):
+            raise ValueError("deadline_ms must be a positive number")
+        deadline_ms = deadline_ms if deadline_ms is not None else self.default_deadline_ms
+        deadline = time.monotonic() + deadline_ms / 1000.0 if deadline_ms else None
+        job = Job(kind, payload, priority, deadline)
+        try:
+            self.queue.put(job)
+        except QueueFull:
+            REGISTRY.inc("service_rejected_total", reason="queue_full", priority=priority)
+            raise
+        return job
+
+    # ---- Dispatch ----
+    def start(self):
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+        return self
+
+    def _dispatch_loop(self):
+        while True:
+            with self._slots:
+                while self._free == 0:
+                    self._slots.wait()
+                n = min(self.batch_size, self._free)
+            batch = self.queue.get_batch(n, self.batch_wait_s)
+            REGISTRY.inc("service_batches_total")
+            REGISTRY.inc("service_batched_jobs_total", len(batch))
+            groups: Dict[str, List[Job]] = {}
+            for job in batch:
+                groups.setdefault(job.dedupe_key, []).append(job)
+            with self._slots:
+                self._free -= len(groups)
+            for jobs in groups.values():
+                self.pool.submit(self._run_group, jobs)
+
+    def _run_group(self, jobs: List[Job]):
+        try:
+            now = time.monotonic()
+            live = [j for j in jobs if not j.cancelled and not j.expired(now)]
+            for j in jobs:
+                if j not in live:
+                    REGISTRY.inc("service_rejected_total", reason="deadline", priority=j.priority)
+                    j.finish(504, {"id": j.id, "error": "deadline exceeded before start"})
+            if not live:
+                return
+            lead = live[0]
+            for j in live:
+                j.started = now
+                REGISTRY.observe("service_queue_wait", (now - j.enqueued) * 1000.0, priority=j.priority)
+            try:
+                status, body = self._execute(lead)
+            except Exception as e:
+                status, body = 500, {"error": repr(e)}
+            done = time.monotonic()
+            for j in live:
+                out = dict(body, id=j.id, queue_ms=(j.started - j.enqueued) * 1000.0,
+                           latency_ms=(done - j.enqueued) * 1000.0)
+                REGISTRY.observe("service_e2e", out["latency_ms"], kind=j.kind, priority=j.priority)
+                REGISTRY.inc("service_requests_total", kind=j.kind, priority=j.priority, status=status)
+                j.finish(status, out)
+        finally:
+            with self._slots:
+                self._free += 1
+                self._slots.notify()
+
+    def _execute(self, job: Job):
+        error = None
+        for attempt in range(self.attempts):
+            if attempt:
+                if job.expired():
+                    break
+                REGISTRY.inc("retries_total", kind=job.kind)
+            try:
+                if job.kind == "extract":
+                    raw = self.extractor.extract_clinical_information(job.payload["note"])
+                    try:
+                        return 200, {"extraction": json.loads(raw)}
+                    except ValueError:
+                        msg = f"invalid JSON after {attempt + 1} attempts"
+                        error = (422, {"error": msg, "raw": raw})
+                        continue
+                final = check_discharge_cached(
+                    job.payload["extraction"],
+                    self.chat,
+                    self.model,
+                    self.tools,
+                    cache=self.decision_cache,
+                )
+                try:
+                    return 200, {"decision": json.loads(final)}
+                except ValueError:
+                    return 200, {"decision": {"raw": final}}
+            except Exception as e:
+                # connection errors, timeouts, 5xx: try again
+                error = (500, {"error": repr(e)})
+        return error or (504, {"error": "deadline exceeded"})
+
+    # ---- Introspection ----
+    def metrics_text(self) -> str:
+        with self._slots:
+            in_flight = self.concurrency - self._free
+        lines = [REGISTRY.to_prometheus().rstrip("\n")]
+        lines.append(f"# TYPE {REGISTRY.prefix}_service_queue_depth gauge")
+        for p, d in self.queue.depth.items():
+            lines.append(f'{REGISTRY.prefix}_service_queue_depth{{priority="{p}"}} {d}')
+        lines.append(f"# TYPE {REGISTRY.prefix}_service_in_flight gauge")
+        lines.append(f"{REGISTRY.prefix}_service_in_flight {in_flight}")
+        return "\n".join(lines) + "\n"
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "DischargeAgent/1.0"
+    service: DischargeService = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code: int, body, content_type="application/json", headers: Dict = None):
+        raw = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, self.service.metrics_text(), "text/plain; version=0.0.4")
+        elif self.path == "/health":
+            self._send(200, {"status": "ok", "queued": len(self.service.queue)})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        kind = {"/extract": "extract", "/check": "check"}.get(self.path)
+        if kind is None:
+            return self._send(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send(400, {"error": "invalid JSON body"})
+        if not isinstance(req, dict):
+            return self._send(400, {"error": "body must be a JSON object"})
+        field, ftype = ("note", str) if kind == "extract" else ("extraction", dict)
+        if not req.get(field):
+            return self._send(400, {"error": f"missing {field!r}"})
+        if not isinstance(req[field], ftype):
+            return self._send(400, {"error": f"{field!r} must be a {ftype.__name__}"})
+        if kind == "check" and self.service.chat is None:
+            return self._send(503, {"error": "discharge checks are not configured"})
+
+        try:
+            job = self.service.submit(
+                kind,
+                {field: req[field]},
+                req.get("priority", "normal"),
+                req.get("deadline_ms"),
+            )
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+        except QueueFull:
+            return self._send(429, {"error": "queue full"}, headers={"Retry-After": "5"})
+
+        timeout = max(0.0, job.deadline - time.monotonic()) if job.deadline is not None else None
+        if not job.done.wait(timeout):
+            job.cancelled = True  # dropped if no worker has started it yet
+            REGISTRY.inc("service_rejected_total", reason="deadline", priority=job.priority)
+            return self._send(504, {"id": job.id, "error": "deadline exceeded"})
+        self._send(job.status, job.body)
+
+
+def start_service(
+    service: DischargeService, host: str = "127.0.0.1", port: int = 8080, background: bool = True
+):
+    """
+    Start the dispatcher and bind the HTTP server; returns (server, base_url).
+    background: also run serve_forever in a daemon thread (otherwise the
+                caller runs it)
+    """
+    service.start()
+    handler = type("BoundServiceHandler", (ServiceHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """'urgent=256,normal=128,backfill=64' -> {priority: limit}."""
+    limits = {}
+    for part in filter(None, (spec or "").split(",")):
+        name, _, n = part.partition("=")
+        if name not in PRIORITIES:
+            raise ValueError(f"unknown priority {name!r}")
+        limits[name] = int(n)
+    return limits
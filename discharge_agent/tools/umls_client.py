@@ -1,10 +1,10 @@
-import requests
 from typing import List, Dict
 from functools import lru_cache
-import os
+from discharge_agent.config import env, module_settings
 
-UMLS_BASE = os.getenv("UMLS_BASE")
-UMLS_API_KEY = os.getenv("UMLS_API_KEY")
+__getattr__ = module_settings(
+    __name__, {"UMLS_BASE": "UMLS_BASE", "UMLS_API_KEY": "UMLS_API_KEY"}
+)
 
 _DEMO_CUI = {
     "upper gastrointestinal bleeding": {
@@ -42,7 +42,9 @@ _DEMO_CUI = {
 
 def _get(url, params=None):
     params = params or {}
-    params["apiKey"] = UMLS_API_KEY
+    import requests
+
+    params["apiKey"] = env("UMLS_API_KEY")
     r = requests.get(url, params=params, timeout=20)
     r.raise_for_status()
     return r.json().get("result", {})
@@ -61,7 +63,7 @@ def umls_search_cui(term: str, sabs=None, max_hits=5):
     }
     if sabs:
         params["sabs"] = sabs
-    res = _get(f"{UMLS_BASE}/search/current", params)
+    res = _get(f"{env('UMLS_BASE')}/search/current", params)
     out = []
     for row in res.get("results", []):
         if row.get("ui") and row["ui"] != "NONE":
@@ -78,7 +80,7 @@ def umls_search_cui(term: str, sabs=None, max_hits=5):
 @lru_cache(maxsize=4096)
 def umls_cui_info(cui: str):
     """CUI -> preferred name, semantic types"""
-    res = _get(f"{UMLS_BASE}/content/current/CUI/{cui}")
+    res = _get(f"{env('UMLS_BASE')}/content/current/CUI/{cui}")
     name = res.get("name")
     stys = [st["name"] for st in res.get("semanticTypes", [])]
     return {"cui": cui, "name": name, "semantic_types": stys}
@@ -110,7 +112,7 @@ def normalize_terms_to_cui(terms, prefer_sabs=None):
 
 
 def umls_normalize(terms: List[str]) -> List[Dict]:
-    if UMLS_API_KEY:
+    if env("UMLS_API_KEY"):
         # Use real API-backed normalization
         return normalize_terms_to_cui(terms, prefer_sabs="SNOMEDCT_US")
     else: